@@ -0,0 +1,10 @@
+"""End-to-end load test for the contract lifecycle.
+
+Runs the real backend (uvicorn subprocess, real MongoDB) against local stubs of
+every external provider and drives the full landlord/signer flow:
+
+    POST /contracts -> approve-for-signing -> GET /sign/{id} -> update-signer-info
+    -> upload-document -> request-otp -> verify-otp -> approve -> download-pdf
+
+See run.py for usage.
+"""
@@ -0,0 +1,312 @@
+"""Contract lifecycle load test.
+
+Starts the provider stubs, launches the backend with uvicorn against a
+throw-away MongoDB database, seeds one landlord per virtual user and runs the
+lifecycle concurrently. Reports p50/p95/p99 per step, requests/s and completed
+lifecycles/s; --output writes the same numbers as JSON so runs can be compared
+across commits (--compare baseline.json fails on p95 regressions).
+
+Requires a reachable MongoDB (MONGO_URL, default mongodb://localhost:27017).
+
+Usage (from backend/):
+    python benchmarks/lifecycle_load/run.py [--users 10] [--iterations 5] [--workers 1]
+        [--provider-latency-ms 0] [--payment] [--output run.json] [--compare base.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+BACKEND_DIR = HERE.parent.parent
+sys.path.insert(0, str(HERE))
+
+import bcrypt  # noqa: E402
+import httpx  # noqa: E402
+from motor.motor_asyncio import AsyncIOMotorClient  # noqa: E402
+
+from scenario import PAYMENT_STEP, STEPS, LifecycleScenario, StepFailed, sample_id_document  # noqa: E402
+from stubs import ProviderStubs, free_port  # noqa: E402
+
+SEED_PASSWORD = 'loadtest-password'
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, errors: int) -> dict:
+    values = sorted(v * 1000 for v in latencies)
+    return {
+        'count': len(values),
+        'errors': errors,
+        'p50_ms': round(percentile(values, 50), 2),
+        'p95_ms': round(percentile(values, 95), 2),
+        'p99_ms': round(percentile(values, 99), 2),
+        'mean_ms': round(statistics.fmean(values), 2) if values else 0.0,
+        'max_ms': round(values[-1], 2) if values else 0.0,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or 'unknown'
+    except Exception:
+        return 'unknown'
+
+
+async def seed_landlords(db, count: int) -> list:
+    password_hash = bcrypt.hashpw(SEED_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=4)).decode('utf-8')
+    users = []
+    for index in range(count):
+        users.append({
+            'id': str(uuid.uuid4()),
+            'email': f'landlord{index}@loadtest.2tick.local',
+            'password': password_hash,
+            'full_name': f'Наймодатель {index}',
+            'phone': f'+7702{index:07d}',
+            'role': 'creator',
+            'language': 'ru',
+            'iin': f'{900000000000 + index}',
+            'company_name': f'ТОО Нагрузка {index}',
+            'legal_address': 'г. Алматы',
+            'contract_limit': 1000000,
+            'is_active': True,
+            'created_at': datetime.now(timezone.utc).isoformat(),
+        })
+    await db.users.insert_many(users)
+    return users
+
+
+async def wait_until_up(client: httpx.AsyncClient, process, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'backend exited with code {process.returncode}')
+        try:
+            await client.get('/api/auth/me')
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError('backend did not start in time')
+
+
+def start_backend(port: int, workers: int, env: dict):
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'server:app', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--log-level', 'warning', '--no-access-log'],
+        cwd=BACKEND_DIR, env={**os.environ, **env},
+    )
+
+
+async def check_mongo(mongo_url: str):
+    """Fail before anything is started when MongoDB is not reachable"""
+    client = AsyncIOMotorClient(mongo_url, serverSelectionTimeoutMS=3000)
+    try:
+        await client.admin.command('ping')
+    except Exception as e:
+        raise SystemExit(f'MongoDB is not reachable at {mongo_url}: {e.__class__.__name__}. '
+                         f'Start one (e.g. docker run -p 27017:27017 mongo:7) or pass --mongo-url.')
+    finally:
+        client.close()
+
+
+async def run_load(args) -> dict:
+    await check_mongo(args.mongo_url)
+    stubs = ProviderStubs(latency_ms=args.provider_latency_ms)
+    await stubs.start()
+
+    db_name = args.db_name or f"twotick_loadtest_{int(time.time())}"
+    mongo = AsyncIOMotorClient(args.mongo_url)
+    db = mongo[db_name]
+
+    port = free_port()
+    backend = None
+    if not args.base_url:
+        backend = start_backend(port, args.workers, {
+            **stubs.env(),
+            'MONGO_URL': args.mongo_url,
+            'DB_NAME': db_name,
+            'BCRYPT_ROUNDS': '4',
+            'METRICS_PORT': '0',
+            'LOG_LEVEL': 'WARNING',
+        })
+    base_url = args.base_url or f'http://127.0.0.1:{port}'
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    statuses = defaultdict(lambda: defaultdict(int))
+    failures = []
+    lifecycle_latencies = []
+    measuring = False
+
+    def record(step: str, seconds: float, status):
+        if not measuring:
+            return
+        statuses[step][str(status)] += 1
+        if status is None or status >= 400:
+            errors[step] += 1
+        else:
+            latencies[step].append(seconds)
+
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    try:
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+            await wait_until_up(client, backend)
+            landlords = await seed_landlords(db, args.users)
+            tokens = []
+            for landlord in landlords:
+                response = await client.post('/api/auth/login', json={'email': landlord['email'], 'password': SEED_PASSWORD})
+                response.raise_for_status()
+                tokens.append(response.json()['token'])
+
+            document = sample_id_document()
+            scenarios = [
+                LifecycleScenario(client, stubs, tokens[i], i, document, with_payment=args.payment)
+                for i in range(args.users)
+            ]
+
+            async def virtual_user(scenario: LifecycleScenario, iterations: int, offset: int):
+                for iteration in range(iterations):
+                    start = time.perf_counter()
+                    try:
+                        await scenario.run(record, offset + iteration)
+                    except StepFailed as e:
+                        if measuring and len(failures) < 20:
+                            failures.append(str(e))
+                        continue
+                    if measuring:
+                        lifecycle_latencies.append(time.perf_counter() - start)
+
+            if args.warmup:
+                await asyncio.gather(*(virtual_user(s, args.warmup, 0) for s in scenarios))
+
+            measuring = True
+            started = time.perf_counter()
+            await asyncio.gather(*(virtual_user(s, args.iterations, args.warmup) for s in scenarios))
+            elapsed = time.perf_counter() - started
+            measuring = False
+            # Let background SMTP threads drain before reading the stub counters
+            await asyncio.sleep(0.5)
+    finally:
+        if backend is not None:
+            backend.terminate()
+            try:
+                backend.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                backend.kill()
+        if not args.keep_db and not args.db_name:
+            await mongo.drop_database(db_name)
+        mongo.close()
+        await stubs.stop()
+
+    step_names = STEPS + ([PAYMENT_STEP] if args.payment else [])
+    total_requests = sum(len(latencies[s]) + errors[s] for s in step_names)
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'users': args.users,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'workers': args.workers,
+            'provider_latency_ms': args.provider_latency_ms,
+            'base_url': args.base_url or 'spawned',
+        },
+        'duration_s': round(elapsed, 3),
+        'requests': total_requests,
+        'requests_per_s': round(total_requests / elapsed, 2) if elapsed else 0.0,
+        'lifecycles': len(lifecycle_latencies),
+        'lifecycles_per_s': round(len(lifecycle_latencies) / elapsed, 3) if elapsed else 0.0,
+        'lifecycle': summarize(lifecycle_latencies, args.users * args.iterations - len(lifecycle_latencies)),
+        'steps': {s: {**summarize(latencies[s], errors[s]), 'statuses': dict(statuses[s])} for s in step_names},
+        'providers': stubs.snapshot(),
+        'failures': failures,
+    }
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> list:
+    """Steps whose p95 grew by more than threshold (fraction) against a saved run"""
+    baseline = json.loads(Path(baseline_path).read_text())
+    regressions = []
+    for step, current in list(results['steps'].items()) + [('lifecycle', results['lifecycle'])]:
+        previous = baseline['lifecycle'] if step == 'lifecycle' else baseline.get('steps', {}).get(step)
+        if not previous or not previous.get('p95_ms'):
+            continue
+        change = current['p95_ms'] / previous['p95_ms'] - 1
+        current['p95_change'] = round(change, 3)
+        if change > threshold:
+            regressions.append(f"{step}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms (+{change:.0%})")
+    return regressions
+
+
+def print_report(results: dict):
+    meta = results['meta']
+    print(f"rev {meta['revision']}  {meta['users']} users x {meta['iterations']} lifecycles, "
+          f"{meta['workers']} worker(s), provider latency {meta['provider_latency_ms']} ms")
+    print(f"{'step':22s} {'count':>6s} {'err':>4s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'max':>9s}")
+    for step, s in list(results['steps'].items()) + [('LIFECYCLE', results['lifecycle'])]:
+        change = f"  {s['p95_change']:+.0%}" if 'p95_change' in s else ''
+        print(f"{step:22s} {s['count']:6d} {s['errors']:4d} {s['p50_ms']:9.1f} {s['p95_ms']:9.1f} "
+              f"{s['p99_ms']:9.1f} {s['max_ms']:9.1f}{change}")
+    print(f"{results['requests']} requests in {results['duration_s']} s: {results['requests_per_s']} req/s, "
+          f"{results['lifecycles_per_s']} lifecycles/s")
+    print(f"providers: {results['providers']}")
+    for failure in results['failures'][:5]:
+        print(f"  ! {failure}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users (default 10)')
+    parser.add_argument('--iterations', type=int, default=5, help='measured lifecycles per user (default 5)')
+    parser.add_argument('--warmup', type=int, default=1, help='unmeasured lifecycles per user first (default 1)')
+    parser.add_argument('--workers', type=int, default=1, help='uvicorn workers for the spawned backend')
+    parser.add_argument('--provider-latency-ms', type=float, default=0.0, help='latency added by every stub')
+    parser.add_argument('--payment', action='store_true', help='also create a FreedomPay payment per lifecycle')
+    parser.add_argument('--mongo-url', default=os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    parser.add_argument('--db-name', help='use (and keep) this database instead of a throw-away one')
+    parser.add_argument('--keep-db', action='store_true', help='do not drop the throw-away database')
+    parser.add_argument('--base-url', help='target an already running backend instead of spawning one '
+                                           '(it must be configured with the stub env itself)')
+    parser.add_argument('--timeout', type=float, default=60.0, help='per-request timeout, seconds')
+    parser.add_argument('--output', help='write results JSON to this file')
+    parser.add_argument('--compare', help='baseline results JSON; exit 1 if a p95 regresses')
+    parser.add_argument('--threshold', type=float, default=0.20, help='allowed p95 growth vs baseline (default 0.20)')
+    parser.add_argument('--json', action='store_true', help='print results JSON instead of the table')
+    args = parser.parse_args()
+
+    results = await run_load(args)
+    regressions = compare(results, args.compare, args.threshold) if args.compare else []
+    results['regressions'] = regressions
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.json:
+        print(json.dumps(results, indent=2, ensure_ascii=False))
+    else:
+        print_report(results)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
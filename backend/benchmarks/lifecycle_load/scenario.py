@@ -0,0 +1,129 @@
+"""The scripted contract lifecycle, one virtual user (landlord + signer) at a time"""
+import time
+from io import BytesIO
+
+import httpx
+
+STEPS = [
+    'create_contract',
+    'approve_for_signing',
+    'open_sign_page',
+    'update_signer_info',
+    'upload_document',
+    'request_otp',
+    'verify_otp',
+    'approve',
+    'download_pdf',
+]
+PAYMENT_STEP = 'create_payment'
+
+CONTRACT_CONTENT = (
+    "ДОГОВОР АРЕНДЫ № {n}\n\n"
+    "г. Алматы\n\n"
+    "1. ПРЕДМЕТ ДОГОВОРА\n"
+    "1.1. Наймодатель передает, а Наниматель принимает во временное пользование квартиру "
+    "по адресу: г. Алматы, пр. Абая, д. 10, кв. {n}.\n"
+    "1.2. Срок найма: с 01.06.2025 по 31.05.2026.\n\n"
+    "2. ПЛАТА ЗА ПОЛЬЗОВАНИЕ\n"
+    "2.1. Ежемесячная плата составляет 250 000 тенге.\n"
+) * 3
+
+
+def sample_id_document() -> bytes:
+    """Small JPEG standing in for the signer's ID photo"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new('RGB', (900, 600), (236, 240, 245))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 40, 300, 360), fill=(180, 190, 205))
+    for row in range(8):
+        draw.rectangle((340, 60 + row * 55, 840, 80 + row * 55), fill=(90, 100, 120))
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def sms_recipient(phone: str) -> str:
+    """Same normalisation the backend applies before calling KazInfoTech"""
+    digits = ''.join(ch for ch in phone if ch.isdigit())
+    return '7' + digits[1:] if digits.startswith('8') else digits
+
+
+class StepFailed(Exception):
+    pass
+
+
+class LifecycleScenario:
+    """Runs the full flow for one landlord; the signer uses a phone unique to this user"""
+
+    def __init__(self, client: httpx.AsyncClient, stubs, token: str, user_index: int,
+                 document: bytes, with_payment: bool = False):
+        self.client = client
+        self.stubs = stubs
+        self.auth = {'Authorization': f'Bearer {token}'}
+        self.phone = f"+7701{user_index:07d}"
+        self.email = f"signer{user_index}@loadtest.2tick.local"
+        self.user_index = user_index
+        self.document = document
+        self.with_payment = with_payment
+
+    async def _call(self, record, step: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            record(step, time.perf_counter() - start, None)
+            raise StepFailed(f"{step}: {e.__class__.__name__}: {e}")
+        record(step, time.perf_counter() - start, response.status_code)
+        if response.status_code >= 400:
+            raise StepFailed(f"{step}: HTTP {response.status_code} {response.text[:200]}")
+        return response
+
+    async def run(self, record, iteration: int):
+        n = self.user_index * 100000 + iteration
+        response = await self._call(record, 'create_contract', 'POST', '/api/contracts', headers=self.auth, json={
+            'title': f'Договор аренды {n}',
+            'content': CONTRACT_CONTENT.format(n=n),
+            'content_type': 'plain',
+            'signer_name': 'Нагрузочный Тест',
+            'signer_phone': self.phone,
+            'signer_email': self.email,
+            'property_address': f'г. Алматы, пр. Абая, д. 10, кв. {n}',
+            'rent_amount': '250000',
+        })
+        contract_id = response.json()['id']
+
+        await self._call(record, 'approve_for_signing', 'POST',
+                         f'/api/contracts/{contract_id}/approve-for-signing', headers=self.auth)
+        await self._call(record, 'open_sign_page', 'GET', f'/api/sign/{contract_id}')
+        await self._call(record, 'update_signer_info', 'POST', f'/api/sign/{contract_id}/update-signer-info', json={
+            'signer_name': 'Нагрузочный Тест',
+            'signer_phone': self.phone,
+            'signer_email': self.email,
+        })
+        await self._call(record, 'upload_document', 'POST', f'/api/sign/{contract_id}/upload-document',
+                         files={'file': ('id_card.jpg', self.document, 'image/jpeg')})
+
+        recipient = sms_recipient(self.phone)
+        self.stubs.sms_codes.pop(recipient, None)
+        await self._call(record, 'request_otp', 'POST', f'/api/sign/{contract_id}/request-otp', params={'method': 'sms'})
+        code = self.stubs.sms_codes.get(recipient)
+        if not code:
+            raise StepFailed('request_otp: no SMS reached the KazInfoTech stub')
+
+        await self._call(record, 'verify_otp', 'POST', f'/api/sign/{contract_id}/verify-otp', json={
+            'contract_id': contract_id,
+            'phone': self.phone,
+            'otp_code': code,
+        })
+        await self._call(record, 'approve', 'POST', f'/api/contracts/{contract_id}/approve', headers=self.auth)
+        response = await self._call(record, 'download_pdf', 'GET',
+                                    f'/api/contracts/{contract_id}/download-pdf', headers=self.auth)
+        if not response.content.startswith(b'%PDF'):
+            raise StepFailed('download_pdf: response is not a PDF')
+
+        if self.with_payment:
+            await self._call(record, PAYMENT_STEP, 'POST', '/api/payment/create', headers=self.auth, json={
+                'plan_id': 'start',
+                'amount': 0,
+            })
@@ -0,0 +1,196 @@
+"""Local stand-ins for the providers the contract lifecycle talks to.
+
+KazInfoTech (SMS), FreedomPay (payments) and the Telegram Bot API are small
+FastAPI apps served by uvicorn on 127.0.0.1; SMTP is a minimal asyncio relay that
+accepts and discards messages. Everything runs on the load driver's event loop.
+Each stub counts calls and can add a fixed latency to imitate a slow provider.
+"""
+import asyncio
+import re
+import socket
+import time
+from collections import Counter
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ProviderStubs:
+    """Starts every provider stub and exposes the env the backend needs to use them"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+        self.sms_codes = {}
+        self.smtp_bytes = 0
+        self.ports = {}
+        self._servers = []
+        self._tasks = []
+        self._smtp_server = None
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    # ---- KazInfoTech HTTP API -------------------------------------------------
+    def _kazinfotech_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/api")
+        async def send_message(request: Request):
+            await self._delay()
+            self.calls['kazinfotech'] += 1
+            params = request.query_params
+            code = re.search(r'(\d{6})', params.get('messagedata', ''))
+            if code:
+                self.sms_codes[params.get('recipient', '')] = code.group(1)
+            body = (
+                "<response><action>sendmessage</action><data><acceptreport>"
+                "<statuscode>0</statuscode><statusmessage>Message accepted for delivery</statusmessage>"
+                f"<messageid>stub-{self.calls['kazinfotech']}</messageid>"
+                "</acceptreport></data></response>"
+            )
+            return Response(body, media_type="application/xml")
+
+        return app
+
+    # ---- FreedomPay -----------------------------------------------------------
+    def _freedompay_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/init_payment.php")
+        async def init_payment(request: Request):
+            await self._delay()
+            self.calls['freedompay'] += 1
+            form = await request.form()
+            payment_id = 100000 + self.calls['freedompay']
+            body = (
+                "<?xml version=\"1.0\" encoding=\"utf-8\"?><response>"
+                "<pg_status>ok</pg_status>"
+                f"<pg_payment_id>{payment_id}</pg_payment_id>"
+                f"<pg_redirect_url>http://127.0.0.1/stub-pay/{form.get('pg_order_id', '')}</pg_redirect_url>"
+                "<pg_salt>stub</pg_salt><pg_sig>stub</pg_sig></response>"
+            )
+            return Response(body, media_type="application/xml")
+
+        return app
+
+    # ---- Telegram Bot API -----------------------------------------------------
+    def _telegram_app(self) -> FastAPI:
+        app = FastAPI()
+
+        @app.post("/bot{token}/{method}")
+        async def bot_method(token: str, method: str, request: Request):
+            await self._delay()
+            self.calls['telegram'] += 1
+            if method == 'getMe':
+                result = {"id": 1, "is_bot": True, "first_name": "2tick stub", "username": "twotick_bot"}
+            elif method == 'sendMessage':
+                form = await request.form() if 'form' in request.headers.get('content-type', '') else await request.json()
+                result = {
+                    "message_id": self.calls['telegram'],
+                    "date": int(time.time()),
+                    "chat": {"id": int(form.get('chat_id', 0) or 0), "type": "private"},
+                    "text": form.get('text', '')
+                }
+            else:
+                result = True
+            return JSONResponse({"ok": True, "result": result})
+
+        return app
+
+    # ---- SMTP -----------------------------------------------------------------
+    async def _smtp_session(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        def reply(line: str):
+            writer.write((line + "\r\n").encode())
+
+        try:
+            reply("220 stub.2tick.local ESMTP")
+            await writer.drain()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode('utf-8', errors='replace').strip().upper()
+                if command.startswith(('EHLO', 'HELO')):
+                    reply("250-stub.2tick.local")
+                    reply("250-AUTH PLAIN LOGIN")
+                    reply("250 SIZE 52428800")
+                elif command.startswith('AUTH'):
+                    reply("235 2.7.0 Authentication successful")
+                elif command.startswith('DATA'):
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    await self._delay()
+                    while True:
+                        data = await reader.readline()
+                        if not data or data in (b".\r\n", b".\n"):
+                            break
+                        self.smtp_bytes += len(data)
+                    self.calls['smtp'] += 1
+                    reply("250 2.0.0 Ok: queued")
+                elif command.startswith('QUIT'):
+                    reply("221 2.0.0 Bye")
+                    await writer.drain()
+                    break
+                else:
+                    reply("250 2.0.0 Ok")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ---- lifecycle ------------------------------------------------------------
+    async def start(self):
+        for name, app in (
+            ('kazinfotech', self._kazinfotech_app()),
+            ('freedompay', self._freedompay_app()),
+            ('telegram', self._telegram_app()),
+        ):
+            port = free_port()
+            server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning', lifespan='off'))
+            # The driver owns Ctrl+C
+            server.install_signal_handlers = lambda: None
+            self._servers.append(server)
+            self._tasks.append(asyncio.create_task(server.serve()))
+            self.ports[name] = port
+        self.ports['smtp'] = free_port()
+        self._smtp_server = await asyncio.start_server(self._smtp_session, '127.0.0.1', self.ports['smtp'])
+        while not all(server.started for server in self._servers):
+            await asyncio.sleep(0.01)
+
+    async def stop(self):
+        for server in self._servers:
+            server.should_exit = True
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._smtp_server is not None:
+            self._smtp_server.close()
+            await self._smtp_server.wait_closed()
+
+    def env(self) -> dict:
+        """Backend environment pointing every provider at the stubs"""
+        return {
+            'KAZINFOTECH_API_URL': f"http://127.0.0.1:{self.ports['kazinfotech']}/api",
+            'KAZINFOTECH_USERNAME': 'stub',
+            'KAZINFOTECH_PASSWORD': 'stub',
+            'FREEDOMPAY_API_URL': f"http://127.0.0.1:{self.ports['freedompay']}",
+            'TELEGRAM_BOT_TOKEN': '123456:stub',
+            'TELEGRAM_API_URL': f"http://127.0.0.1:{self.ports['telegram']}/bot",
+            'USE_SMTP': 'true',
+            'SMTP_HOST': '127.0.0.1',
+            'SMTP_PORT': str(self.ports['smtp']),
+            'SMTP_SUBMISSION_PORT': str(self.ports['smtp']),
+            'SMTP_STARTTLS': 'false',
+            'SMTP_PASSWORD': 'stub',
+        }
+
+    def snapshot(self) -> dict:
+        return {**dict(self.calls), 'smtp_bytes': self.smtp_bytes}
@@ -0,0 +1,216 @@
+"""Serialisation cost of the large list endpoints.
+
+Builds synthetic documents shaped like the ones Mongo returns (aware datetimes,
+multilingual contract texts) and times turning them into the response body:
+
+    default   FastAPI's path: response_model validation (contracts only),
+              jsonable_encoder and JSONResponse
+    fast      construct_rows + FastJSONResponse (orjson when installed)
+    summary   the ?summary=true rows (Mongo projection emulated here)
+
+No database is needed. Prints best-of-N milliseconds and body size for 1k and
+10k records.
+
+Usage (from backend/):
+    python benchmarks/list_serialization.py [--sizes 1000 10000] [--repeat 5]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'list_serialization')
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.utils import create_response_field  # noqa: E402
+
+import server  # noqa: E402
+
+CONTENT = (
+    "ДОГОВОР АРЕНДЫ № {n}\n\n1. ПРЕДМЕТ ДОГОВОРА\n1.1. Наймодатель передает, а Наниматель принимает "
+    "во временное пользование квартиру по адресу: г. Алматы, пр. Абая, д. 10, кв. {n}.\n"
+    "2. ПЛАТА\n2.1. Ежемесячная плата составляет 250 000 тенге.\n"
+) * 4
+STATUSES = ('draft', 'sent', 'pending-signature', 'signed')
+
+
+def contract_docs(count: int) -> list:
+    base = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    docs = []
+    for n in range(count):
+        created = base + timedelta(minutes=n)
+        docs.append({
+            'id': str(uuid.uuid4()),
+            'title': f'Договор аренды {n}',
+            'content': CONTENT.format(n=n),
+            'content_kk': CONTENT.format(n=n),
+            'content_en': CONTENT.format(n=n),
+            'content_type': 'plain',
+            'creator_id': '1000000001',
+            'landlord_id': '1000000001',
+            'source_type': 'template',
+            'template_id': 'tpl-rent',
+            'template_version': 3,
+            'placeholder_values': {'ADDRESS': f'пр. Абая, д. 10, кв. {n}', 'RENT': '250000', 'TENANT_NAME': 'Тест'},
+            'contract_number': f'0{n + 1}',
+            'contract_code': f'ABC-{n:04d}',
+            'signer_name': 'Нагрузочный Тест',
+            'signer_phone': '+77010000000',
+            'signer_email': 'signer@example.kz',
+            'property_address': f'г. Алматы, пр. Абая, д. 10, кв. {n}',
+            'status': STATUSES[n % len(STATUSES)],
+            'approved': n % 2 == 0,
+            'approved_at': created if n % 2 == 0 else None,
+            'contract_language': 'ru',
+            'deleted': False,
+            'created_at': created,
+            'updated_at': created,
+        })
+    return docs
+
+
+def user_docs(count: int) -> list:
+    base = datetime(2024, 6, 1, tzinfo=timezone.utc)
+    return [{
+        'id': str(1000000000 + n),
+        'email': f'user{n}@example.kz',
+        'full_name': f'Пользователь {n}',
+        'phone': f'+7702{n:07d}',
+        'role': 'creator',
+        'language': 'ru',
+        'iin': f'{900000000000 + n}',
+        'company_name': f'ТОО Компания {n}',
+        'legal_address': 'г. Алматы',
+        'contract_limit': 10,
+        'is_admin': False,
+        'favorite_templates': ['tpl-rent', 'tpl-service'],
+        'viewed_notifications': [],
+        'created_at': base + timedelta(hours=n),
+    } for n in range(count)]
+
+
+def audit_docs(count: int) -> list:
+    base = datetime(2025, 3, 1, tzinfo=timezone.utc)
+    return [{
+        'id': str(uuid.uuid4()),
+        'contract_id': str(uuid.uuid4()),
+        'action': 'contract_signed',
+        'details': f'Contract {n} signed via SMS',
+        'ip_address': '10.0.0.1',
+        'timestamp': base + timedelta(seconds=n),
+    } for n in range(count)]
+
+
+def template_docs(count: int) -> list:
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [{
+        'id': str(uuid.uuid4()),
+        'title': f'Шаблон {n}',
+        'description': 'Договор аренды квартиры',
+        'category': 'real_estate',
+        'content': CONTENT.format(n='{{CONTRACT_NUMBER}}'),
+        'content_kk': CONTENT.format(n='{{CONTRACT_NUMBER}}'),
+        'content_en': CONTENT.format(n='{{CONTRACT_NUMBER}}'),
+        'placeholders': {
+            'ADDRESS': {'label': 'Адрес', 'type': 'text', 'owner': 'landlord', 'required': True},
+            'RENT': {'label': 'Сумма', 'type': 'number', 'owner': 'landlord', 'required': True},
+        },
+        'is_active': True,
+        'version': 3,
+        'created_at': base + timedelta(days=n),
+        'updated_at': base + timedelta(days=n),
+    } for n in range(count)]
+
+
+def normalize(body: bytes):
+    return json.loads(body.replace(b'+00:00"', b'Z"'))
+
+
+def best_of(fn, repeat: int):
+    timings = []
+    body = b''
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, best is reported')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    contract_field = create_response_field(name='Response_Get_Contracts', type_=List[server.Contract])
+
+    def fastapi_default(docs, field=None):
+        def render():
+            content = docs
+            if field is not None:
+                content = loop.run_until_complete(
+                    serialize_response(field=field, response_content=docs, is_coroutine=True))
+            return JSONResponse(jsonable_encoder(content)).body
+        return render
+
+    def fast(docs, model=None):
+        return lambda: server.FastJSONResponse(server.construct_rows(model, docs) if model else docs).body
+
+    def project(docs, projection):
+        return [{k: v for k, v in doc.items() if k in projection} for doc in docs]
+
+    print(f"orjson: {'yes' if server.ORJSON_AVAILABLE else 'no (standard encoder fallback)'}")
+    print(f"{'endpoint':16s} {'records':>8s} {'path':8s} {'ms':>9s} {'KB':>9s} {'speedup':>8s}")
+    for size in args.sizes:
+        contracts = contract_docs(size)
+        users = user_docs(size)
+        logs = audit_docs(size)
+        templates = template_docs(size)
+        cases = {
+            'contracts': [
+                ('default', fastapi_default(contracts, contract_field)),
+                ('fast', fast(contracts, server.Contract)),
+                ('summary', fast(project(contracts, server.CONTRACT_SUMMARY_PROJECTION), server.ContractSummary)),
+            ],
+            'admin/users': [
+                ('default', fastapi_default(users)),
+                ('fast', fast(users)),
+                ('summary', fast(project(users, server.USER_SUMMARY_PROJECTION))),
+            ],
+            'audit-logs': [
+                ('default', fastapi_default(logs)),
+                ('fast', fast(logs)),
+            ],
+            'admin/templates': [
+                ('default', fastapi_default(templates)),
+                ('fast', fast(templates)),
+            ],
+        }
+        for endpoint, paths in cases.items():
+            baseline = None
+            bodies = {}
+            for path, render in paths:
+                ms, body = best_of(render, args.repeat)
+                bodies[path] = body
+                baseline = baseline or ms
+                print(f"{endpoint:16s} {size:8d} {path:8s} {ms:9.1f} {len(body) / 1024:9.1f} {baseline / ms:7.1f}x")
+            # Without a response_model FastAPI writes UTC as +00:00, orjson (like pydantic) as Z
+            if normalize(bodies['default']) != normalize(bodies['fast']):
+                print(f"  ! {endpoint}: fast body differs from the default one")
+    loop.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Event-loop latency under a login storm.
+
+Fires N concurrent password checks at once while a probe task measures how late
+a 10 ms asyncio.sleep wakes up (event-loop lag). Runs twice:
+
+  inline  - bcrypt.checkpw called directly in the coroutine (old behaviour)
+  pool    - server.verify_password (dedicated bcrypt thread pool)
+
+Usage (from backend/):
+    python benchmarks/login_load.py [--logins 20] [--rounds 12] [--json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'login_load')
+
+import bcrypt  # noqa: E402
+import server  # noqa: E402
+
+
+async def _probe(lags: list, stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append((time.perf_counter() - start - interval) * 1000)
+
+
+async def _inline_check(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+async def run_storm(check, logins: int, hashed: str) -> dict:
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    await asyncio.sleep(0.05)
+    
+    start = time.perf_counter()
+    results = await asyncio.gather(*(check('correct horse battery', hashed) for _ in range(logins)), return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    
+    stop.set()
+    await probe
+    lags.sort()
+    return {
+        'logins': logins,
+        'ok': sum(1 for r in results if r is True),
+        'rejected': sum(1 for r in results if isinstance(r, Exception)),
+        'wall_s': round(elapsed, 3),
+        'logins_per_s': round(logins / elapsed, 1),
+        'loop_lag_ms': {
+            'p50': round(statistics.median(lags), 2),
+            'p99': round(lags[int(len(lags) * 0.99) - 1], 2),
+            'max': round(lags[-1], 2),
+            'samples': len(lags),
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--logins', type=int, default=20, help='concurrent logins per storm (default 20)')
+    parser.add_argument('--rounds', type=int, default=server.BCRYPT_ROUNDS, help='bcrypt cost factor')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+    
+    server.BCRYPT_ROUNDS = args.rounds
+    hashed = server._hash_password_sync('correct horse battery')
+    
+    results = {
+        'rounds': args.rounds,
+        'pool_workers': server.PASSWORD_HASH_WORKERS,
+        'inline': await run_storm(_inline_check, args.logins, hashed),
+        'pool': await run_storm(server.verify_password, args.logins, hashed),
+    }
+    
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"bcrypt cost {args.rounds}, {args.logins} concurrent logins, pool of {server.PASSWORD_HASH_WORKERS} threads")
+    for mode in ('inline', 'pool'):
+        r = results[mode]
+        lag = r['loop_lag_ms']
+        print(f"  {mode:6s} wall {r['wall_s']:6.2f}s  {r['logins_per_s']:6.1f} logins/s  "
+              f"loop lag p50 {lag['p50']:7.2f} ms  p99 {lag['p99']:8.2f} ms  max {lag['max']:8.2f} ms  "
+              f"({lag['samples']} samples, {r['rejected']} rejected)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
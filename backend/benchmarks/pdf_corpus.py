@@ -0,0 +1,352 @@
+"""PDF rendering micro-benchmark over the shipped contract templates.
+
+Builds a fixture corpus from the long bilingual templates generated by
+create_contracts_full.py, create_contracts_final.py, create_short_term_new.py and
+the .docx files in frontend/public (duplicates removed), then renders every
+template as RU+KK and RU+KK+EN, with and without an ID photo, as plain text and
+as HTML. For each fixture it records the median time spent in
+html_to_text_for_pdf, replace_placeholders_in_content, draw_content_section and
+the whole generate_contract_pdf call, the peak RSS during the render and the
+page count.
+
+Two gates, because absolute timings are only comparable on one machine:
+  * page counts are checked against the committed golden/pdf_corpus.json
+    (when the rendering environment matches) - a layout change fails the run;
+  * timings and peak RSS are checked only against a baseline saved earlier on
+    the same machine with --save (e.g. on the merge base), median of --repeat runs.
+
+Usage (from backend/):
+    python benchmarks/pdf_corpus.py                          # page counts vs golden
+    python benchmarks/pdf_corpus.py --update                 # re-record the page counts
+    git stash; python benchmarks/pdf_corpus.py --save /tmp/base.json; git stash pop
+    python benchmarks/pdf_corpus.py --baseline /tmp/base.json  # + timing/RSS vs that run
+    python benchmarks/pdf_corpus.py --list                   # show the corpus only
+    python benchmarks/pdf_corpus.py --filter service --repeat 7 --json
+"""
+import argparse
+import ast
+import hashlib
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import threading
+import time
+import zipfile
+from io import BytesIO
+from pathlib import Path
+
+# The server's INFO JSON lines would interleave with the table
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+import pdf_golden  # noqa: E402
+from pdf_golden import server  # noqa: E402
+
+BACKEND_DIR = pdf_golden.BACKEND_DIR
+PUBLIC_DIR = BACKEND_DIR.parent / 'frontend' / 'public'
+TEMPLATE_SCRIPTS = ['create_contracts_full.py', 'create_contracts_final.py', 'create_short_term_new.py']
+BASELINE_FILE = Path(__file__).resolve().parent / 'golden' / 'pdf_corpus.json'
+
+KAZAKH_LETTERS = set('әғқңөұүһіӘҒҚҢӨҰҮҺІ')
+PLACEHOLDER_RE = re.compile(r'\{\{\s*([A-Za-z0-9_]+)\s*\}\}')
+STAGES = ('html_to_text_for_pdf', 'replace_placeholders_in_content', 'draw_content_section')
+
+
+# ---- corpus -----------------------------------------------------------------
+
+def _script_paragraphs(path: Path) -> list:
+    """String arguments of the add_title/add_heading/add_text calls, in order"""
+    paragraphs = []
+    for node in ast.parse(path.read_text(encoding='utf-8')).body:
+        call = node.value if isinstance(node, ast.Expr) else None
+        if not isinstance(call, ast.Call) or getattr(call.func, 'id', None) not in ('add_title', 'add_heading', 'add_text'):
+            continue
+        if call.args and isinstance(call.args[0], ast.Constant) and isinstance(call.args[0].value, str):
+            paragraphs.append((call.func.id != 'add_text', call.args[0].value))
+    return paragraphs
+
+
+def _docx_paragraphs(path: Path) -> list:
+    xml = zipfile.ZipFile(path).read('word/document.xml').decode('utf-8')
+    paragraphs = []
+    for block in re.findall(r'<w:p[ >].*?</w:p>', xml, flags=re.S):
+        text = ''.join(re.findall(r'<w:t[^>]*>([^<]*)</w:t>', block))
+        text = text.replace('&amp;', '&').replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"')
+        if text.strip():
+            paragraphs.append(('<w:b/>' in block and len(text) < 120, text))
+    return paragraphs
+
+
+def _language(text: str):
+    letters = PLACEHOLDER_RE.sub('', text)
+    cyrillic = sum(1 for ch in letters if 'Ѐ' <= ch <= 'ӿ')
+    latin = sum(1 for ch in letters if ch.isascii() and ch.isalpha())
+    if cyrillic + latin < 20:
+        return None
+    if cyrillic > latin:
+        return 'kk' if any(ch in KAZAKH_LETTERS for ch in letters) else 'ru'
+    return 'en'
+
+
+def _split_templates(paragraphs: list) -> list:
+    """Group paragraphs into language blocks; a new template starts at each Russian block"""
+    templates, current, language = [], None, None
+    for heading, text in paragraphs:
+        detected = _language(text) or language
+        if detected != language:
+            language = detected
+            if language == 'ru' or current is None:
+                current = {}
+                templates.append(current)
+        current.setdefault(language or 'ru', []).append((heading, text))
+    return [t for t in templates if 'ru' in t and 'kk' in t]
+
+
+def build_corpus() -> dict:
+    sources = [(name, _script_paragraphs(BACKEND_DIR / name)) for name in TEMPLATE_SCRIPTS]
+    sources += [(path.name, _docx_paragraphs(path)) for path in sorted(PUBLIC_DIR.glob('*.docx'))]
+    corpus, seen = {}, set()
+    for source, paragraphs in sources:
+        for index, template in enumerate(_split_templates(paragraphs), 1):
+            # Letters and digits only: the .docx exports add flag emoji and spacing to the same text
+            digest = hashlib.sha1(re.sub(r'\W+', '', ''.join(t for _, t in template['ru'])).encode()).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            corpus[f"{Path(source).stem}#{index}"] = template
+    return corpus
+
+
+def _plain(blocks: list) -> str:
+    return "\n\n".join(text for _, text in blocks)
+
+
+def _html(blocks: list) -> str:
+    parts = []
+    for heading, text in blocks:
+        body = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;').replace('\n', '<br>')
+        parts.append(f"<p><strong>{body}</strong></p>" if heading else f"<p>{body}</p>")
+    return "".join(parts)
+
+
+def build_fixtures(corpus: dict) -> dict:
+    id_document = pdf_golden._id_document()
+    fixtures = {}
+    for name, template in corpus.items():
+        keys = sorted({k for blocks in template.values() for _, text in blocks for k in PLACEHOLDER_RE.findall(text)})
+        placeholder_values = {key: f"Значение {key.lower()}" for key in keys}
+        template_doc = {'placeholders': {key: {'label': key.lower(), 'showInContent': True} for key in keys}}
+        for languages in ('ru_kk', 'ru_kk_en'):
+            if languages == 'ru_kk_en' and 'en' not in template:
+                continue
+            for content_type in ('plain', 'html'):
+                render_text = _html if content_type == 'html' else _plain
+                contract = {
+                    'id': f'corpus-{hashlib.md5(name.encode()).hexdigest()[:12]}',
+                    'contract_code': 'BENCH-0001',
+                    'title': template['ru'][0][1][:120],
+                    'content': render_text(template['ru']),
+                    'content_kk': render_text(template['kk']),
+                    'content_en': render_text(template['en']) if 'en' in template else None,
+                    'content_type': content_type,
+                    'contract_language': 'en' if languages == 'ru_kk_en' else 'ru',
+                    'placeholder_values': placeholder_values,
+                    'signer_name': 'Иванов Иван Иванович',
+                    'signer_phone': '+77000000000',
+                    'signer_email': 'tenant@example.com',
+                    'landlord_name': 'ТОО «Пример»',
+                    'created_at': '2026-01-27T09:00:00+00:00',
+                    'approved_at': '2026-01-28T12:30:00+00:00',
+                    'status': 'signed',
+                }
+                for with_id in (False, True):
+                    signature = {'signer_name': 'Иванов Иван Иванович', 'signature_hash': 'a' * 64,
+                                 'signed_at': '2026-01-28T10:00:00+00:00'}
+                    if with_id:
+                        signature['document_upload'] = id_document
+                    key = f"{name}/{languages}/{content_type}/{'id' if with_id else 'noid'}"
+                    fixtures[key] = (contract, signature, template_doc)
+    return fixtures
+
+
+# ---- measurement --------------------------------------------------------------
+
+class StageTimer:
+    """Wraps the server's stage functions and accumulates time spent in each per render"""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+        for stage in STAGES:
+            setattr(server, stage, self._wrap(stage, getattr(server, stage)))
+
+    def _wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.totals[stage] += time.perf_counter() - start
+        return timed
+
+    def reset(self):
+        self.totals = dict.fromkeys(STAGES, 0.0)
+
+
+class PeakRSS:
+    """Samples this process's RSS in a thread while a render runs"""
+
+    def __init__(self, interval: float = 0.001):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current() -> int:
+        if server.PSUTIL_AVAILABLE:
+            return server.psutil.Process().memory_info().rss
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def __enter__(self):
+        self.peak = self.current()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.current())
+
+
+def measure(stage_timer: StageTimer, contract, signature, template, repeat: int) -> dict:
+    from PyPDF2 import PdfReader
+
+    server.generate_contract_pdf(contract, signature, None, None, template, deterministic=True)  # warm-up
+    samples = []
+    for _ in range(repeat):
+        stage_timer.reset()
+        start = time.perf_counter()
+        pdf = server.generate_contract_pdf(contract, signature, None, None, template, deterministic=True)
+        total = time.perf_counter() - start
+        samples.append({'total': total, **stage_timer.totals})
+    with PeakRSS() as rss:
+        server.generate_contract_pdf(contract, signature, None, None, template, deterministic=True)
+
+    result = {f"{key}_ms": round(statistics.median(s[key] for s in samples) * 1000, 2)
+              for key in ('total',) + STAGES}
+    result['other_ms'] = round(result['total_ms'] - sum(result[f"{s}_ms"] for s in STAGES), 2)
+    result['peak_rss_mb'] = round(rss.peak / (1024 * 1024), 1)
+    result['pages'] = len(PdfReader(BytesIO(pdf)).pages)
+    result['size'] = len(pdf)
+    return result
+
+
+def check_pages(result: dict, expected: dict) -> str:
+    if expected is None:
+        return "no golden (run --update)"
+    if result['pages'] != expected['pages']:
+        return f"PAGES CHANGED ({expected['pages']} -> {result['pages']})"
+    return "ok"
+
+
+def check_timing(result: dict, expected: dict, threshold: float) -> str:
+    """Medians against a same-machine baseline; absolute slack keeps short stages from flapping"""
+    if expected is None:
+        return "not in baseline"
+    if result['total_ms'] > expected['total_ms'] * (1 + threshold) + 20:
+        return f"SLOWER ({expected['total_ms']} -> {result['total_ms']} ms)"
+    for stage in STAGES:
+        key = f"{stage}_ms"
+        if result[key] > expected.get(key, 0) * (1 + threshold) + 8:
+            return f"SLOWER {stage} ({expected.get(key)} -> {result[key]} ms)"
+    if result['peak_rss_mb'] > expected['peak_rss_mb'] * (1 + threshold) + 16:
+        return f"MORE MEMORY ({expected['peak_rss_mb']} -> {result['peak_rss_mb']} MB)"
+    return "ok"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--update', action='store_true', help='re-record the golden page counts')
+    parser.add_argument('--save', metavar='PATH', help='write this run as a timing baseline for --baseline')
+    parser.add_argument('--baseline', metavar='PATH', help='timing/RSS baseline saved on this machine with --save')
+    parser.add_argument('--threshold', type=float, default=0.35,
+                        help='allowed relative growth of time / peak RSS against --baseline (default 0.35)')
+    parser.add_argument('--repeat', type=int, default=5, help='timed renders per fixture, median is kept (default 5)')
+    parser.add_argument('--filter', default='', help='only fixtures whose name contains this')
+    parser.add_argument('--list', action='store_true', help='print the corpus and exit')
+    parser.add_argument('--json', action='store_true', help='print machine-readable results')
+    args = parser.parse_args()
+
+    server.PDF_RENDER_WORKERS = 0
+    corpus = build_corpus()
+    if args.list:
+        for name, template in corpus.items():
+            sizes = ", ".join(f"{lang} {sum(len(t) for _, t in blocks)} chars" for lang, blocks in template.items())
+            print(f"{name:60s} {sizes}")
+        return 0
+
+    fixtures = {k: v for k, v in build_fixtures(corpus).items() if args.filter in k}
+    golden = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {'environment': None, 'fixtures': {}}
+    environment = pdf_golden.environment_fingerprint()
+    host = {'node': platform.node(), 'machine': platform.machine(), 'python': platform.python_version(),
+            'cpu_count': os.cpu_count()}
+    compare_pages = golden.get('environment') == environment
+    if not args.update and not compare_pages:
+        print("⚠️  Golden page counts were recorded in a different environment - informational only")
+    timing_baseline = None
+    if args.baseline:
+        timing_baseline = json.loads(Path(args.baseline).read_text())
+        if timing_baseline.get('host') != host or timing_baseline.get('environment') != environment:
+            print("⚠️  Timing baseline comes from another machine or environment - timings are informational only")
+            timing_baseline = None
+
+    stage_timer = StageTimer()
+    results, failures = {}, []
+    if not args.json:
+        print(f"{'fixture':62s} {'total':>8s} {'html':>7s} {'placeh':>7s} {'layout':>7s} {'other':>7s} "
+              f"{'rss MB':>7s} {'pages':>5s}  status")
+    for name, (contract, signature, template) in fixtures.items():
+        result = measure(stage_timer, contract, signature, template, args.repeat)
+        results[name] = result
+        if args.update:
+            golden['fixtures'][name] = {'pages': result['pages'], 'size': result['size']}
+            status = "recorded"
+        else:
+            status = check_pages(result, golden['fixtures'].get(name))
+            if status != "ok" and compare_pages:
+                failures.append(name)
+            if status == "ok" and timing_baseline is not None:
+                status = check_timing(result, timing_baseline['fixtures'].get(name), args.threshold)
+                if status not in ("ok", "not in baseline"):
+                    failures.append(name)
+        result['status'] = status
+        if not args.json:
+            print(f"{name:62s} {result['total_ms']:8.1f} {result['html_to_text_for_pdf_ms']:7.1f} "
+                  f"{result['replace_placeholders_in_content_ms']:7.1f} {result['draw_content_section_ms']:7.1f} "
+                  f"{result['other_ms']:7.1f} {result['peak_rss_mb']:7.1f} {result['pages']:5d}  {status}")
+
+    if args.update:
+        golden['environment'] = environment
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_FILE.write_text(json.dumps(golden, indent=2, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"Golden page counts written to {BASELINE_FILE}")
+    if args.save:
+        Path(args.save).write_text(json.dumps({'environment': environment, 'host': host, 'repeat': args.repeat,
+                                               'fixtures': results}, indent=2, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"Timing baseline written to {args.save}")
+    if args.json:
+        print(json.dumps({'environment': environment, 'fixtures': results, 'failures': failures},
+                         indent=2, ensure_ascii=False))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
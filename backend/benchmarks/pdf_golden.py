@@ -0,0 +1,197 @@
+"""Golden-file regression check for deterministic contract PDFs.
+
+Renders a fixed set of fixture contracts with generate_contract_pdf(deterministic=True)
+and compares each output byte-for-byte (sha256) and by render time against
+golden/pdf_golden.json.
+
+Usage (from backend/):
+    python benchmarks/pdf_golden.py             # compare against the golden set
+    python benchmarks/pdf_golden.py --update    # re-record the golden set
+
+The golden set depends on the rendering environment (ReportLab/PyPDF2 versions,
+the DejaVu font files, whether /app/logo.png exists). It stores a fingerprint of
+that environment; when it does not match, byte comparison is skipped and only
+reproducibility (two renders -> identical bytes) is checked. Re-record with
+--update after an intentional change.
+"""
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault('MONGO_URL', 'mongodb://localhost:27017')
+os.environ.setdefault('DB_NAME', 'pdf_golden')
+
+import server  # noqa: E402
+
+GOLDEN_FILE = Path(__file__).resolve().parent / 'golden' / 'pdf_golden.json'
+
+CONTENT_RU = "\n".join(
+    f"{i}. Арендодатель {{{{PARTY_A_NAME}}}} передаёт Арендатору помещение по адресу {{{{ADDRESS}}}} "
+    f"на условиях настоящего договора, пункт {i}."
+    for i in range(1, 80)
+)
+CONTENT_KK = "\n".join(
+    f"{i}. Жалға беруші {{{{PARTY_A_NAME}}}} Жалға алушыға {{{{ADDRESS}}}} мекенжайы бойынша үй-жайды береді, {i}-тармақ."
+    for i in range(1, 80)
+)
+CONTENT_EN_HTML = "".join(
+    f"<p><b>{i}.</b> The Landlord {{{{PARTY_A_NAME}}}} leases the premises at {{{{ADDRESS}}}} to the Tenant, clause {i}.</p>"
+    for i in range(1, 80)
+)
+
+
+def _id_document() -> str:
+    """Small deterministic JPEG standing in for an uploaded ID photo"""
+    from PIL import Image, ImageDraw
+    
+    img = Image.new('RGB', (640, 400), '#e2e8f0')
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([40, 40, 200, 240], fill='#94a3b8')
+    draw.text((240, 60), "ID 000000000000", fill='#1e293b')
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=85)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def build_fixtures(tmp_dir: str) -> dict:
+    base = {
+        'id': '00000000-0000-4000-8000-000000000001',
+        'contract_code': 'GOLD-0001',
+        'title': 'Договор аренды от 2026-01-27',
+        'content': CONTENT_RU,
+        'content_kk': CONTENT_KK,
+        'content_type': 'plain',
+        'placeholder_values': {'PARTY_A_NAME': 'ТОО «Пример»', 'ADDRESS': 'г. Алматы, ул. Абая, 1'},
+        'signer_name': 'Иванов Иван',
+        'signer_phone': '+77000000000',
+        'signer_email': 'tenant@example.com',
+        'landlord_name': 'ТОО «Пример»',
+        'created_at': '2026-01-27T09:00:00+00:00',
+        'approved_at': '2026-01-28T12:30:00+00:00',
+        'status': 'signed',
+    }
+    signature = {'signer_name': 'Иванов Иван', 'signature_hash': 'a' * 64, 'signed_at': '2026-01-28T10:00:00+00:00'}
+    landlord = {'full_name': 'Петров Пётр', 'company_name': 'ТОО «Пример»', 'email': 'landlord@example.com'}
+    
+    fixtures = {
+        'ru_kk_plain': (dict(base), dict(signature), landlord),
+        'trilingual_html': (
+            dict(base, contract_language='en', content_type='html',
+                 content="".join(f"<p>{line}</p>" for line in CONTENT_RU.split("\n")),
+                 content_kk="".join(f"<p>{line}</p>" for line in CONTENT_KK.split("\n")),
+                 content_en=CONTENT_EN_HTML),
+            dict(signature), landlord,
+        ),
+        'with_id_document': (dict(base), dict(signature, document_upload=_id_document()), landlord),
+    }
+    
+    # Uploaded-PDF fixture: the source file is itself a deterministic render
+    source_path = os.path.join(tmp_dir, 'uploaded_source.pdf')
+    with open(source_path, 'wb') as f:
+        f.write(server.generate_contract_pdf(dict(base), None, None, landlord, deterministic=True))
+    fixtures['uploaded_pdf'] = (
+        dict(base, source_type='uploaded_pdf', uploaded_pdf_path=source_path, content=''),
+        dict(signature), landlord,
+    )
+    return fixtures
+
+
+def environment_fingerprint() -> dict:
+    import PyPDF2
+    import reportlab
+    
+    server._register_pdf_fonts()
+    from reportlab.pdfbase import pdfmetrics
+    try:
+        font_file = pdfmetrics.getFont('DejaVu').face.filename
+        with open(font_file, 'rb') as f:
+            font_md5 = hashlib.md5(f.read()).hexdigest()
+    except Exception:
+        font_md5 = None
+    return {
+        'reportlab': reportlab.Version,
+        'PyPDF2': PyPDF2.__version__,
+        'font_md5': font_md5,
+        'logo': os.path.exists('/app/logo.png'),
+    }
+
+
+def render(contract, signature, landlord):
+    start = time.perf_counter()
+    pdf = server.generate_contract_pdf(contract, signature, None, landlord, deterministic=True)
+    return pdf, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--update', action='store_true', help='re-record the golden set')
+    parser.add_argument('--time-tolerance', type=float, default=2.0,
+                        help='fail if a render is slower than golden time x this factor (default 2.0)')
+    parser.add_argument('--workers', type=int, default=0,
+                        help='PDF_RENDER_WORKERS for this run (parallel outputs are recorded separately)')
+    args = parser.parse_args()
+    
+    server.PDF_RENDER_WORKERS = args.workers
+    suffix = f"@parallel{args.workers}" if args.workers else ""
+    
+    golden = json.loads(GOLDEN_FILE.read_text()) if GOLDEN_FILE.exists() else {'environment': None, 'fixtures': {}}
+    environment = environment_fingerprint()
+    same_environment = golden.get('environment') == environment
+    if not args.update and not same_environment:
+        print("⚠️  Golden set was recorded in a different environment - checking reproducibility only")
+    
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, (contract, signature, landlord) in build_fixtures(tmp_dir).items():
+            key = name + suffix
+            render(contract, signature, landlord)  # warm-up (fonts, QR, pools)
+            first, elapsed_ms = render(contract, signature, landlord)
+            second, _ = render(contract, signature, landlord)
+            digest = hashlib.sha256(first).hexdigest()
+            result = {'sha256': digest, 'size': len(first), 'render_ms': round(elapsed_ms, 1)}
+            
+            status, failed = "ok", True
+            if first != second:
+                status = "NOT REPRODUCIBLE"
+            elif args.update:
+                golden['fixtures'][key] = result
+                status, failed = "recorded", False
+            elif not same_environment:
+                failed = False
+            else:
+                expected = golden['fixtures'].get(key)
+                if expected is None:
+                    status = "no golden (run --update)"
+                elif expected['sha256'] != digest:
+                    status = f"BYTES CHANGED ({expected['size']} -> {len(first)} bytes)"
+                elif elapsed_ms > expected['render_ms'] * args.time_tolerance + 50:
+                    status = f"SLOWER ({expected['render_ms']} -> {elapsed_ms:.1f} ms)"
+                else:
+                    failed = False
+            
+            if failed:
+                failures.append(key)
+            print(f"{key:32s} {len(first):>9d} B {elapsed_ms:>8.1f} ms  {digest[:16]}  {status}")
+    
+    if args.update:
+        golden['environment'] = environment
+        GOLDEN_FILE.parent.mkdir(parents=True, exist_ok=True)
+        GOLDEN_FILE.write_text(json.dumps(golden, indent=2, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"Golden set written to {GOLDEN_FILE}")
+    
+    if server._pdf_section_pool is not None:
+        server._pdf_section_pool.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
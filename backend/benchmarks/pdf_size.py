@@ -0,0 +1,91 @@
+"""Output-size regression benchmark for contract PDFs.
+
+Renders the pdf_golden fixtures plus a contract with a 12 MP ID photo and prints
+bytes per component (fonts, images, content, forms, structure) from
+server.pdf_size_report. Totals are compared against golden/pdf_size.json.
+
+Usage (from backend/):
+    python benchmarks/pdf_size.py              # compare, fail if a PDF grew by more than --tolerance
+    python benchmarks/pdf_size.py --update     # re-record the baseline
+"""
+import argparse
+import base64
+import json
+import sys
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+import pdf_golden
+from pdf_golden import server
+
+BASELINE_FILE = Path(__file__).resolve().parent / 'golden' / 'pdf_size.json'
+
+
+def _large_photo() -> str:
+    """Deterministic 4000x3000 JPEG, about the size of a phone camera shot"""
+    from PIL import Image
+    
+    gradient = Image.linear_gradient('L').resize((4000, 3000))
+    pattern = Image.radial_gradient('L').resize((4000, 3000))
+    img = Image.merge('RGB', (gradient, pattern, gradient.transpose(Image.FLIP_LEFT_RIGHT)))
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG', quality=92)
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--update', action='store_true', help='re-record the size baseline')
+    parser.add_argument('--tolerance', type=float, default=0.05,
+                        help='allowed relative growth of total size (default 0.05)')
+    parser.add_argument('--workers', type=int, default=0, help='PDF_RENDER_WORKERS for this run')
+    args = parser.parse_args()
+    
+    server.PDF_RENDER_WORKERS = args.workers
+    suffix = f"@parallel{args.workers}" if args.workers else ""
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    
+    failures = []
+    print(f"{'fixture':32s} {'total':>9s} {'fonts':>8s} {'images':>8s} {'content':>8s} {'forms':>7s} {'struct':>7s}  status")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        fixtures = pdf_golden.build_fixtures(tmp_dir)
+        contract, signature, landlord = fixtures['with_id_document']
+        fixtures['large_id_photo'] = (contract, dict(signature, document_upload=_large_photo()), landlord)
+        
+        for name, (contract, signature, landlord) in fixtures.items():
+            key = name + suffix
+            pdf = server.generate_contract_pdf(contract, signature, None, landlord, deterministic=True)
+            report = server.pdf_size_report(pdf)
+            components = report['components']
+            
+            status = "ok"
+            if report['uncompressed_bytes'] > 1024:
+                status = f"UNCOMPRESSED STREAMS ({report['uncompressed_streams']}, {report['uncompressed_bytes']} B)"
+                failures.append(key)
+            elif args.update:
+                baseline[key] = {'total_bytes': report['total_bytes'], 'components': components, 'fonts': report['fonts']}
+                status = "recorded"
+            elif key in baseline:
+                limit = baseline[key]['total_bytes'] * (1 + args.tolerance)
+                if report['total_bytes'] > limit:
+                    status = f"GREW {baseline[key]['total_bytes']} -> {report['total_bytes']} B"
+                    failures.append(key)
+            else:
+                status = "no baseline (run --update)"
+            
+            print(f"{key:32s} {report['total_bytes']:>9d} {components['fonts']:>8d} {components['images']:>8d} "
+                  f"{components['content']:>8d} {components['forms']:>7d} {components['structure']:>7d}  {status}")
+    
+    if args.update:
+        BASELINE_FILE.parent.mkdir(parents=True, exist_ok=True)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, ensure_ascii=False, sort_keys=True) + "\n")
+        print(f"Baseline written to {BASELINE_FILE}")
+    
+    if server._pdf_section_pool is not None:
+        server._pdf_section_pool.shutdown()
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -18,14 +18,17 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab import rl_config
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.platypus import Paragraph, Frame
 from fastapi.responses import StreamingResponse, Response
 import random
 import base64
 import hashlib
+import functools
 import time
 import httpx
+import zstandard
 
 # psutil for system metrics (optional - may not work in all environments)
 try:
@@ -35,12 +38,266 @@ except ImportError:
     PSUTIL_AVAILABLE = False
     psutil = None
 
+# orjson for large list responses (optional - falls back to the standard encoder)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+    orjson = None
+
+# brotli for response compression (optional - gzip only without it)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+    brotli = None
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ===== LOGGING =====
+# Records are formatted as JSON (LOG_FORMAT=json) or text and written by a
+# QueueListener thread, so request handlers never block on stdout. Use lazy
+# %-style arguments: with LOG_LEVEL=INFO, debug calls cost one level check.
+import contextvars
+import json
+import logging.handlers
+import queue
+
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json').lower()
+# Fraction of DEBUG records kept (high-volume placeholder / PDF diagnostics)
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '1.0'))
+
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request's correlation id (set by RequestIdMiddleware)"""
+    
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class DebugSamplingFilter(logging.Filter):
+    """Keep every INFO+ record and a LOG_DEBUG_SAMPLE_RATE fraction of DEBUG records"""
+    
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+    
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1.0 or random.random() < self.rate
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "msg": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """Like QueueHandler, but keeps the traceback out of the message so it stays a separate field"""
+    
+    def prepare(self, record):
+        import copy
+        
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+_log_listener = None
+
+def configure_logging():
+    """Route the root logger through a queue; the listener thread does formatting I/O"""
+    global _log_listener
+    if _log_listener is not None:
+        return
+    stream_handler = logging.StreamHandler()
+    if LOG_FORMAT == 'json':
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(
+            '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+        ))
+    log_queue = queue.SimpleQueue()
+    queue_handler = StructuredQueueHandler(log_queue)
+    queue_handler.addFilter(DebugSamplingFilter(LOG_DEBUG_SAMPLE_RATE))
+    queue_handler.addFilter(RequestContextFilter())
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(LOG_LEVEL)
+    _log_listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _log_listener.start()
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# ===== INSTRUMENTATION (Prometheus text format) =====
+import threading
+from pymongo import ReturnDocument, monitoring
+from pymongo.errors import DuplicateKeyError
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and histograms rendered in the Prometheus text format.
+    
+    Labels are passed as tuples of (name, value) pairs. Mongo command events arrive
+    on driver threads, hence the lock.
+    """
+    
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._meta = {}
+        self._values = {}
+        self._histograms = {}
+    
+    def describe(self, name: str, kind: str, help_text: str):
+        self._meta[name] = (kind, help_text)
+    
+    def inc(self, name: str, labels: tuple = (), amount: float = 1.0):
+        key = (name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def observe(self, name: str, value: float, labels: tuple = ()):
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+    
+    @staticmethod
+    def _labels(labels: tuple, extra: tuple = ()) -> str:
+        pairs = labels + extra
+        if not pairs:
+            return ""
+        escaped = (
+            '%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for k, v in pairs
+        )
+        return "{" + ",".join(escaped) + "}"
+    
+    def render(self) -> str:
+        with self._lock:
+            values = dict(self._values)
+            histograms = {k: ([*v[0]], v[1], v[2]) for k, v in self._histograms.items()}
+        by_name = {}
+        for (name, labels), value in sorted(values.items()):
+            by_name.setdefault(name, []).append(f"{name}{self._labels(labels)} {value:g}")
+        for (name, labels), (counts, total, count) in sorted(histograms.items()):
+            lines = by_name.setdefault(name, [])
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{name}_bucket{self._labels(labels, (('le', f'{bound:g}'),))} {bucket_count}")
+            lines.append(f"{name}_bucket{self._labels(labels, (('le', '+Inf'),))} {count}")
+            lines.append(f"{name}_sum{self._labels(labels)} {total:g}")
+            lines.append(f"{name}_count{self._labels(labels)} {count}")
+        output = []
+        for name in sorted(by_name):
+            kind, help_text = self._meta.get(name, ("untyped", ""))
+            output.append(f"# HELP {name} {help_text}")
+            output.append(f"# TYPE {name} {kind}")
+            output.extend(by_name[name])
+        return "\n".join(output) + "\n"
+
+metrics = MetricsRegistry()
+metrics.describe("http_requests_total", "counter", "HTTP requests by method, route template and status")
+metrics.describe("http_request_duration_seconds", "histogram", "HTTP request latency by method and route template")
+metrics.describe("http_requests_in_flight", "gauge", "HTTP requests currently being processed")
+metrics.describe("mongo_command_duration_seconds", "histogram", "MongoDB command latency by collection and command")
+metrics.describe("mongo_command_failures_total", "counter", "Failed MongoDB commands by collection and command")
+metrics.describe("operation_duration_seconds", "histogram", "Duration of PDF rendering, OTP and SMTP operations")
+metrics.describe("operation_failures_total", "counter", "Failed PDF rendering, OTP and SMTP operations")
+
+def timed(operation: str):
+    """Decorator: record the call duration of a sync or async function in operation_duration_seconds"""
+    import asyncio
+    
+    labels = (("operation", operation),)
+    
+    def decorator(func):
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                except Exception:
+                    metrics.inc("operation_failures_total", labels)
+                    raise
+                finally:
+                    metrics.observe("operation_duration_seconds", time.perf_counter() - start, labels)
+            return async_wrapper
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception:
+                metrics.inc("operation_failures_total", labels)
+                raise
+            finally:
+                metrics.observe("operation_duration_seconds", time.perf_counter() - start, labels)
+        return wrapper
+    return decorator
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Per-collection / per-command MongoDB timings from driver command events"""
+    
+    IGNORED_COMMANDS = {"hello", "ismaster", "isMaster", "saslStart", "saslContinue", "endSessions", "ping"}
+    
+    def __init__(self):
+        self._pending = {}
+    
+    def started(self, event):
+        if event.command_name in self.IGNORED_COMMANDS:
+            return
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        else:
+            collection = event.command.get(event.command_name)
+        self._pending[(event.connection_id, event.request_id)] = collection if isinstance(collection, str) else ""
+    
+    def _record(self, event, failed: bool):
+        collection = self._pending.pop((event.connection_id, event.request_id), None)
+        if collection is None:
+            return
+        labels = (("collection", collection), ("command", event.command_name))
+        metrics.observe("mongo_command_duration_seconds", event.duration_micros / 1e6, labels)
+        if failed:
+            metrics.inc("mongo_command_failures_total", labels)
+    
+    def succeeded(self, event):
+        self._record(event, failed=False)
+    
+    def failed(self, event):
+        self._record(event, failed=True)
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Codec: timestamps are native BSON dates, decoded as aware UTC datetimes
+client = AsyncIOMotorClient(mongo_url, event_listeners=[MongoCommandMetrics()], tz_aware=True, tzinfo=timezone.utc)
 db = client[os.environ['DB_NAME']]
 
 # Application URL
@@ -58,10 +315,83 @@ SMTP_HOST = os.environ.get('SMTP_HOST', 'mail.2tick.kz')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', '25'))
 SMTP_USER = os.environ.get('SMTP_USER', 'noreply@2tick.kz')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD', '')
+# Submission port tried first (with STARTTLS unless disabled, e.g. for a local relay)
+SMTP_SUBMISSION_PORT = int(os.environ.get('SMTP_SUBMISSION_PORT', '587'))
+SMTP_STARTTLS = os.environ.get('SMTP_STARTTLS', 'true').lower() == 'true'
+
+# Password hashing (bcrypt cost factor; existing hashes are upgraded on next login)
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', '12'))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', '64'))
+
+# Audit / user-action logs are buffered and written in batches
+LOG_SINK_BATCH_SIZE = int(os.environ.get('LOG_SINK_BATCH_SIZE', '200'))
+LOG_SINK_FLUSH_INTERVAL = float(os.environ.get('LOG_SINK_FLUSH_INTERVAL', '1.0'))
+LOG_SINK_MAX_PENDING = int(os.environ.get('LOG_SINK_MAX_PENDING', '10000'))
+
+# Prometheus metrics are served on a separate unauthenticated port (0 disables)
+METRICS_HOST = os.environ.get('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.environ.get('METRICS_PORT', '9100'))
+
+# On-demand request profiling (admin-armed or via a signed X-Profile-Token header)
+PROFILING_SAMPLE_INTERVAL_MS = float(os.environ.get('PROFILING_SAMPLE_INTERVAL_MS', '2'))
+PROFILING_REPORTS_MB = int(os.environ.get('PROFILING_REPORTS_MB', '16'))
+PROFILING_TOKEN_TTL = int(os.environ.get('PROFILING_TOKEN_TTL', '600'))
+
+# Cold contract archive: signed contracts untouched for ARCHIVE_SIGNED_AFTER_DAYS, any contract
+# untouched for ARCHIVE_STALE_AFTER_DAYS and deleted ones move their heavy fields to contracts_archive
+ARCHIVE_SIGNED_AFTER_DAYS = int(os.environ.get('ARCHIVE_SIGNED_AFTER_DAYS', '90'))
+ARCHIVE_STALE_AFTER_DAYS = int(os.environ.get('ARCHIVE_STALE_AFTER_DAYS', '180'))
+ARCHIVE_INTERVAL = float(os.environ.get('ARCHIVE_INTERVAL', '3600'))  # 0 disables the scheduled job
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '200'))
+ARCHIVE_ZSTD_LEVEL = int(os.environ.get('ARCHIVE_ZSTD_LEVEL', '19'))
+
+# Response compression: JSON/text bodies of at least COMPRESS_MIN_SIZE bytes, br preferred over gzip
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', '1024'))
+COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', '6'))
+COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', '4'))
+
+# Public QR verification: per-worker cache size and TTLs (signed contracts never change), browser max-age
+VERIFY_CACHE_SIZE = int(os.environ.get('VERIFY_CACHE_SIZE', '4096'))
+VERIFY_CACHE_TTL = float(os.environ.get('VERIFY_CACHE_TTL', '15'))
+VERIFY_CACHE_TTL_SIGNED = float(os.environ.get('VERIFY_CACHE_TTL_SIGNED', '3600'))
+VERIFY_BROWSER_MAX_AGE = int(os.environ.get('VERIFY_BROWSER_MAX_AGE', '300'))
+
+# Dashboard delta sync: hard-delete tombstone retention (older cursors get a full resync),
+# page size, and how far each final cursor steps back to cover writes committed out of order
+CONTRACT_TOMBSTONE_DAYS = int(os.environ.get('CONTRACT_TOMBSTONE_DAYS', '90'))
+CONTRACT_CHANGES_PAGE = int(os.environ.get('CONTRACT_CHANGES_PAGE', '500'))
+CONTRACT_CHANGES_OVERLAP = float(os.environ.get('CONTRACT_CHANGES_OVERLAP', '5'))
+
+# Bulk contract creation: rows per request and documents per insert_many
+BULK_CONTRACTS_MAX = int(os.environ.get('BULK_CONTRACTS_MAX', '1000'))
+BULK_INSERT_CHUNK = int(os.environ.get('BULK_INSERT_CHUNK', '100'))
+
+# Template catalog cache: entry lifetime when no change stream is available (standalone mongod)
+TEMPLATE_CACHE_TTL = float(os.environ.get('TEMPLATE_CACHE_TTL', '30'))
+
+# Presence tracker: how often each worker publishes newly seen users to db.presence
+PRESENCE_FLUSH_INTERVAL = float(os.environ.get('PRESENCE_FLUSH_INTERVAL', '30'))
+
+# Admin system metrics: background sample interval and ring-buffer history length
+METRICS_SAMPLE_INTERVAL = float(os.environ.get('METRICS_SAMPLE_INTERVAL', '10'))
+METRICS_HISTORY_SECONDS = int(os.environ.get('METRICS_HISTORY_SECONDS', '3600'))
+
+# PDF rendering: >0 renders language sections in parallel worker processes
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', '0'))
+# Byte-identical PDFs: header dates from contract fields, fixed metadata and /ID
+PDF_DETERMINISTIC = os.environ.get('PDF_DETERMINISTIC', 'false').lower() == 'true'
+# Embedded photos are downsampled to their printed size at this resolution
+PDF_IMAGE_DPI = int(os.environ.get('PDF_IMAGE_DPI', '150'))
+# Warn (with a per-component size report) when an emailed PDF is larger than this
+PDF_SIZE_BUDGET_KB = int(os.environ.get('PDF_SIZE_BUDGET_KB', '2048'))
+# Pre-renders of contracts that are never approved are dropped after this many days
+PDF_PRERENDER_TTL_DAYS = int(os.environ.get('PDF_PRERENDER_TTL_DAYS', '7'))
 
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
 TELEGRAM_BOT_USERNAME = os.environ.get('TELEGRAM_BOT_USERNAME', 'twotick_bot')
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org/bot')
 
 # KazInfoTech SMS Configuration (единственный SMS провайдер)
 KAZINFOTECH_API_URL = os.environ.get('KAZINFOTECH_API_URL', 'http://212.124.121.186:9507/api')
@@ -75,20 +405,302 @@ if KAZINFOTECH_USERNAME and KAZINFOTECH_PASSWORD:
 else:
     logging.warning("⚠️ KazInfoTech not configured - SMS will not work")
 
+# Embed images as raw binary streams: ReportLab's default ASCII85 wrapping adds ~25% to every image
+rl_config.useA85 = 0
+
 # Create the main app
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
+class FastJSONResponse(Response):
+    """JSON rendered by orjson: datetimes natively, no jsonable_encoder pass.
+    
+    Opt-in for large lists. Endpoints return it directly with plain dicts from
+    trusted DB reads, which also bypasses response_model validation.
+    """
+    media_type = "application/json"
+    
+    def render(self, content) -> bytes:
+        if ORJSON_AVAILABLE:
+            return orjson.dumps(content, default=str, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+        from fastapi.encoders import jsonable_encoder
+        return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def construct_rows(model, docs: list) -> list:
+    """DB documents -> rows shaped like `model` (defaults filled, unknown keys dropped), without validation"""
+    return [model.model_construct(**doc).model_dump() for doc in docs]
+
+def summary_projection(model) -> dict:
+    return {"_id": 0, **{name: 1 for name in model.model_fields}}
+
+# Bump when the JSON shape of an ETag'd endpoint changes, so clients drop old representations
+ETAG_SCHEMA = "1"
+
+class HttpCacheStats:
+    """Per-worker conditional GET and compression counters (also exported as Prometheus metrics)"""
+    
+    def __init__(self):
+        self.etag = {}  # route -> {"hit", "miss", "unconditional"}
+        self.compression = {}  # encoding -> {"responses", "bytes_in", "bytes_out"}
+    
+    def record_etag(self, route: str, result: str):
+        counts = self.etag.setdefault(route, {"hit": 0, "miss": 0, "unconditional": 0})
+        counts[result] += 1
+        metrics.inc("http_conditional_requests_total", (("route", route), ("result", result)))
+    
+    def record_compression(self, encoding: str, bytes_in: int, bytes_out: int):
+        counts = self.compression.setdefault(encoding, {"responses": 0, "bytes_in": 0, "bytes_out": 0})
+        counts["responses"] += 1
+        counts["bytes_in"] += bytes_in
+        counts["bytes_out"] += bytes_out
+        metrics.inc("http_compressed_responses_total", (("encoding", encoding),))
+        metrics.inc("http_compression_saved_bytes_total", (("encoding", encoding),), bytes_in - bytes_out)
+    
+    def snapshot(self) -> dict:
+        routes = {}
+        for route, counts in self.etag.items():
+            conditional = counts["hit"] + counts["miss"]
+            total = conditional + counts["unconditional"]
+            routes[route] = {
+                **counts,
+                # Share of revalidations answered with 304, and of all requests
+                "hit_ratio": round(counts["hit"] / conditional, 4) if conditional else None,
+                "hit_ratio_all": round(counts["hit"] / total, 4) if total else None,
+            }
+        encodings = {
+            encoding: {**counts, "ratio": round(counts["bytes_out"] / counts["bytes_in"], 4) if counts["bytes_in"] else None}
+            for encoding, counts in self.compression.items()
+        }
+        return {"etag": routes, "compression": encodings, "brotli_available": BROTLI_AVAILABLE,
+                "min_size": COMPRESS_MIN_SIZE}
+
+http_cache_stats = HttpCacheStats()
+metrics.describe("http_conditional_requests_total", "counter", "ETag'd GETs by route and result (hit = 304)")
+metrics.describe("http_compressed_responses_total", "counter", "Compressed responses by encoding")
+metrics.describe("http_compression_saved_bytes_total", "counter", "Bytes saved by response compression")
+
+def weak_etag(*parts) -> str:
+    """Weak validator from version fields: survives compression, changes with the document"""
+    digest = hashlib.blake2b("|".join(str(p) for p in (ETAG_SCHEMA,) + parts).encode('utf-8'), digest_size=12).hexdigest()
+    return f'W/"{digest}"'
+
+def version_stamp(doc: dict):
+    """Change marker of a stored document: its version and/or last update time"""
+    updated_at = as_utc(doc.get('updated_at') or doc.get('created_at'))
+    return f"{doc.get('version', '')}@{updated_at.timestamp() if isinstance(updated_at, datetime) else ''}"
+
+def conditional_get(request: Request, response: Response, route: str, etag: str,
+                    cache_control: str = "private, no-cache") -> Optional[Response]:
+    """304 when If-None-Match already holds etag (checked before any body is built), else tag the response"""
+    if_none_match = request.headers.get("if-none-match")
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if if_none_match is None:
+        http_cache_stats.record_etag(route, "unconditional")
+    elif if_none_match.strip() == "*" or etag[2:] in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        http_cache_stats.record_etag(route, "hit")
+        return Response(status_code=304, headers=headers)
+    else:
+        http_cache_stats.record_etag(route, "miss")
+    response.headers.update(headers)
+    return None
+
 # ===== HELPER FUNCTIONS =====
-async def generate_unique_user_id():
-    """Generate a unique random 10-digit user ID"""
-    while True:
-        user_id = str(random.randint(1000000000, 9999999999))
-        # Check if ID already exists in database
-        existing = await db.users.find_one({"id": user_id})
-        if not existing:
-            return user_id
+def as_utc(value):
+    """Aware UTC datetime from a stored timestamp (native date, or an ISO string not yet backfilled)"""
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if isinstance(value, datetime) and value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+def generate_unique_user_id():
+    """Random 10-digit user ID; uniqueness is enforced by the users.id index on insert"""
+    return str(random.randint(1000000000, 9999999999))
+
+
+UNIQUE_INSERT_ATTEMPTS = 8
+
+
+async def insert_with_unique_retry(collection, doc: dict, field: str, generate):
+    """Insert doc, regenerating doc[field] when the unique index on it rejects the value.
+    Replaces the find_one-per-candidate probe loops: a free value costs one round trip
+    and two concurrent inserts can never end up with the same value.
+    Where the unique index could not be built (see ensure_unique_indexes) the value is
+    probed first, so duplicates are still avoided outside of true races."""
+    for _ in range(UNIQUE_INSERT_ATTEMPTS):
+        if (collection.name, field) in _missing_unique_indexes:
+            if await collection.find_one({field: doc[field]}, {"_id": 1}):
+                doc[field] = generate()
+                continue
+        try:
+            await collection.insert_one(doc)
+            return doc[field]
+        except DuplicateKeyError as e:
+            # Only the generated field is retried; any other duplicate is a real conflict
+            if field not in ((e.details or {}).get('keyValue') or {}):
+                raise
+            logger.warning("⚠️ %s collision on %s.%s, regenerating", doc[field], collection.name, field)
+            doc[field] = generate()
+    raise HTTPException(status_code=503, detail=f"Could not allocate a unique {field}, please retry")
+
+
+class SequenceService:
+    """Monotonic counters in db.counters ({_id: "<name>:<scope>", seq}).
+
+    next() is a single find_one_and_update $inc. A counter that does not exist yet is
+    seeded once from the caller's current count, so numbering carries on from the
+    documents created before counters existed."""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def next(self, name: str, scope: str, seed=None) -> int:
+        return await self.reserve(name, scope, 1, seed)
+
+    async def reserve(self, name: str, scope: str, count: int, seed=None) -> int:
+        """First of `count` consecutive numbers taken in one atomic $inc"""
+        key = f"{name}:{scope}"
+        counter = await self.collection.find_one_and_update(
+            {"_id": key}, {"$inc": {"seq": count}}, return_document=ReturnDocument.AFTER
+        )
+        if counter is not None:
+            return counter["seq"] - count + 1
+        start = await seed() if seed is not None else 0
+        try:
+            # $max keeps a concurrent seeder from moving the counter backwards
+            await self.collection.update_one({"_id": key}, {"$max": {"seq": start}}, upsert=True)
+        except DuplicateKeyError:
+            pass  # another request created it first
+        counter = await self.collection.find_one_and_update(
+            {"_id": key}, {"$inc": {"seq": count}}, return_document=ReturnDocument.AFTER
+        )
+        return counter["seq"] - count + 1
+
+
+sequences = SequenceService(db.counters)
+
+
+# (collection, field) whose unique index is missing; insert_with_unique_retry probes for these
+_missing_unique_indexes = set()
+
+async def ensure_unique_indexes():
+    """Unique indexes that insert_with_unique_retry relies on.
+    A build that fails (typically legacy duplicates) does not stop startup, but the
+    field is switched to probe-before-insert until a later start manages to build it."""
+    for collection, field, options in (
+        (db.users, "id", {}),
+        # Legacy contracts may have no code; only real codes have to be unique
+        (db.contracts, "contract_code", {"partialFilterExpression": {"contract_code": {"$type": "string"}}}),
+    ):
+        try:
+            await collection.create_index(field, unique=True, **options)
+            _missing_unique_indexes.discard((collection.name, field))
+        except Exception as e:
+            _missing_unique_indexes.add((collection.name, field))
+            logging.error(f"❌ Unique index {collection.name}.{field} not created, falling back to probing "
+                          f"before insert (remove duplicate {field} values and restart): {str(e)}")
+
+# Timestamp fields that used to be written as ISO strings, per collection
+DATE_FIELDS = {
+    "users": ["created_at", "updated_at"],
+    "contracts": ["created_at", "updated_at", "approved_at", "signed_at", "archived_at"],
+    "signatures": ["created_at", "signed_at"],
+    "audit_logs": ["timestamp"],
+    "user_logs": ["timestamp"],
+    "registrations": ["created_at", "expires_at", "otp_requested_at"],
+    "verifications": ["created_at", "expires_at"],
+    "password_resets": ["created_at", "expires_at"],
+    "payments": ["created_at", "paid_at"],
+    "subscriptions": ["started_at", "expires_at", "updated_at"],
+    "custom_template_requests": ["created_at", "updated_at", "completed_at"],
+    "notifications": ["created_at", "updated_at"],
+    "contract_templates": ["created_at", "updated_at"],
+    "contracts_archive": ["archived_at"],
+}
+DATE_BACKFILL_BATCH = 500
+_date_backfill_task = None
+
+async def backfill_native_dates():
+    """One-off migration: ISO-string timestamps -> BSON dates.
+
+    Runs in the background after startup; until it finishes, readers cope with
+    both forms via as_utc(). Each update is conditional on the original string so
+    a concurrent write is never overwritten. Done once per database (db.migrations).
+    """
+    from pymongo import UpdateOne
+
+    if await db.migrations.find_one({"_id": "native_dates"}):
+        return
+    converted = 0
+    for name, fields in DATE_FIELDS.items():
+        collection = db[name]
+        query = {"$or": [{field: {"$type": "string"}} for field in fields]}
+        projection = {field: 1 for field in fields}
+        requests = []
+        async for doc in collection.find(query, projection):
+            update, match = {}, {"_id": doc["_id"]}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                try:
+                    update[field] = as_utc(value)
+                except ValueError:
+                    continue
+                match[field] = value
+            if update:
+                requests.append(UpdateOne(match, {"$set": update}))
+            if len(requests) >= DATE_BACKFILL_BATCH:
+                converted += (await collection.bulk_write(requests, ordered=False)).modified_count
+                requests = []
+        if requests:
+            converted += (await collection.bulk_write(requests, ordered=False)).modified_count
+    await db.migrations.update_one(
+        {"_id": "native_dates"},
+        {"$set": {"completed_at": datetime.now(timezone.utc), "converted": converted}},
+        upsert=True
+    )
+    logging.info(f"📅 Native date backfill finished: {converted} documents converted")
+
+async def ensure_date_indexes():
+    """Indexes over timestamp fields (range scans and sorts need BSON dates to be useful)"""
+    for collection, keys, options in (
+        (db.audit_logs, [("timestamp", -1)], {}),
+        (db.user_logs, [("user_id", 1), ("timestamp", -1)], {}),
+        (db.contracts, [("creator_id", 1), ("created_at", -1)], {}),
+        # Delta sync: (creator_id, updated_at) with id as the tie-breaker of the cursor
+        (db.contracts, [("creator_id", 1), ("updated_at", 1), ("id", 1)], {}),
+        (db.contract_tombstones, [("creator_id", 1), ("deleted_at", 1)], {}),
+        (db.contract_tombstones, [("deleted_at", 1)], {"expireAfterSeconds": CONTRACT_TOMBSTONE_DAYS * 86400}),
+        (db.contracts, [("created_at", -1)], {}),
+        # Expired registrations and reset links are kept a day for the "expired" message, then dropped
+        (db.registrations, [("expires_at", 1)], {"expireAfterSeconds": 86400}),
+        (db.password_resets, [("expires_at", 1)], {"expireAfterSeconds": 86400}),
+        # One pre-render per contract, looked up on approval; abandoned ones expire
+        (db.pdf_prerenders, [("contract_id", 1)], {"unique": True}),
+        (db.pdf_prerenders, [("created_at", 1)], {"expireAfterSeconds": PDF_PRERENDER_TTL_DAYS * 86400}),
+    ):
+        try:
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            logging.error(f"❌ Index {collection.name}.{keys} not created: {str(e)}")
+
+async def start_date_backfill():
+    import asyncio
+
+    global _date_backfill_task
+
+    async def run():
+        try:
+            await backfill_native_dates()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"❌ Native date backfill failed: {str(e)}")
+
+    if _date_backfill_task is None:
+        _date_backfill_task = asyncio.create_task(run())
 
 # ===== MODELS =====
 class User(BaseModel):
@@ -213,6 +825,7 @@ class Contract(BaseModel):
     landlord_full_name: Optional[str] = None
     source_type: str = "manual"  # "manual", "template", "uploaded_pdf"
     template_id: Optional[str] = None  # ID шаблона, если создан из шаблона
+    template_version: Optional[int] = None  # Версия шаблона, по которой создан договор (неизменяемая)
     placeholder_values: Optional[dict] = None  # Значения placeholders {key: value}
     uploaded_pdf_path: Optional[str] = None  # Путь к загруженному PDF
     contract_number: Optional[str] = None  # Sequential number: 01, 02, 010, 0110, etc.
@@ -259,6 +872,30 @@ class Contract(BaseModel):
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
+class ContractSummary(BaseModel):
+    """Row of the contracts list (?summary=true): no texts, files or signature data"""
+    model_config = ConfigDict(extra="ignore")
+    id: str
+    title: str = ""
+    status: str = "draft"
+    contract_code: Optional[str] = None
+    contract_number: Optional[str] = None
+    source_type: str = "manual"
+    template_id: Optional[str] = None
+    template_version: Optional[int] = None
+    signer_name: Optional[str] = None
+    signer_phone: Optional[str] = None
+    signer_email: Optional[str] = None
+    property_address: Optional[str] = None
+    approved: bool = False
+    approved_at: Optional[datetime] = None
+    contract_language: Optional[str] = None
+    deleted: bool = False
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+CONTRACT_SUMMARY_PROJECTION = summary_projection(ContractSummary)
+
 class ContractCreate(BaseModel):
     title: str
     content: str
@@ -266,6 +903,7 @@ class ContractCreate(BaseModel):
     content_en: Optional[str] = None  # Английская версия
     content_type: str = "plain"  # "plain" or "html"
     template_id: Optional[str] = None  # ID шаблона, если создан из шаблона
+    template_version: Optional[int] = None  # Версия шаблона, которую видел пользователь
     placeholder_values: Optional[dict] = None  # Значения placeholders {key: value}
     signer_name: Optional[str] = None  # Can be filled by signer
     signer_phone: Optional[str] = None  # Can be filled by signer
@@ -353,12 +991,46 @@ class NotificationCreate(BaseModel):
     image_url: Optional[str] = None
 
 
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+# ===== PASSWORD HASHING =====
+# bcrypt takes ~250 ms of CPU per call at cost 12. It runs on a small dedicated
+# thread pool (bcrypt releases the GIL) so logins never block the event loop;
+# calls beyond PASSWORD_HASH_MAX_PENDING are rejected with 503 instead of queueing.
+from concurrent.futures import ThreadPoolExecutor
+
+_password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_password_pending = 0
+
+async def _run_password_job(func, *args):
+    global _password_pending
+    if _password_pending >= PASSWORD_HASH_MAX_PENDING:
+        logging.warning(f"⚠️ Password hashing queue full ({_password_pending} pending)")
+        raise HTTPException(status_code=503, detail="Сервер перегружен, попробуйте через несколько секунд")
+    _password_pending += 1
+    try:
+        import asyncio
+        return await asyncio.get_running_loop().run_in_executor(_password_executor, func, *args)
+    finally:
+        _password_pending -= 1
+
+def _hash_password_sync(password: str) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
 
-def verify_password(password: str, hashed: str) -> bool:
+def _verify_password_sync(password: str, hashed: str) -> bool:
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+async def hash_password(password: str) -> str:
+    return await _run_password_job(_hash_password_sync, password)
+
+async def verify_password(password: str, hashed: str) -> bool:
+    return await _run_password_job(_verify_password_sync, password, hashed)
+
+def password_needs_rehash(hashed: str) -> bool:
+    """True if the hash was made with a different cost factor than BCRYPT_ROUNDS ($2b$<cost>$...)"""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
 # ===== MULTILANGUAGE HELPERS =====
 def get_content_by_language(obj: dict, field_base: str, language: str) -> str:
     """Get content in specified language with fallback to Russian"""
@@ -544,6 +1216,7 @@ async def send_sms_via_kazinfotech(phone: str, text: str) -> dict:
 
 # ============ UNIFIED OTP FUNCTIONS ============
 
+@timed("send_otp")
 async def send_otp(phone: str) -> dict:
     """Send OTP using KazInfoTech (единственный SMS провайдер)
     
@@ -715,11 +1388,11 @@ def send_sms(phone: str, message: str) -> bool:
     return True
 
 # Threading for background email sending
-import threading
 from queue import Queue
 
 email_queue = Queue()
 
+@timed("smtp_send")
 def _send_email_worker(to_email: str, subject: str, body: str, attachment: bytes = None, filename: str = None):
     """Worker function that actually sends email in background thread"""
     import smtplib
@@ -738,22 +1411,21 @@ def _send_email_worker(to_email: str, subject: str, body: str, attachment: bytes
             pdf_attachment = MIMEApplication(attachment, _subtype='pdf')
             pdf_attachment.add_header('Content-Disposition', 'attachment', filename=filename)
             msg.attach(pdf_attachment)
-            print(f"📎 [BG] PDF attached: {filename} ({len(attachment)} bytes)")
+            logger.debug("📎 [BG] PDF attached: %s (%s bytes)", filename, len(attachment))
         
-        server = smtplib.SMTP(SMTP_HOST, 587, timeout=60)
-        server.starttls()
+        server = smtplib.SMTP(SMTP_HOST, SMTP_SUBMISSION_PORT, timeout=60)
+        if SMTP_STARTTLS:
+            server.starttls()
         server.login(SMTP_USER, SMTP_PASSWORD)
         server.send_message(msg)
         server.quit()
-        print(f"✅ [BG] Email sent to {to_email}")
-        logging.info(f"✅ [BG] Email sent to {to_email}")
+        logger.info("✅ [BG] Email sent to %s", to_email)
     except Exception as e:
-        print(f"❌ [BG] Email error: {e}")
-        logging.error(f"❌ [BG] Email error to {to_email}: {e}")
+        logger.error("❌ [BG] Email error to %s: %s", to_email, e)
 
 def send_email_async(to_email: str, subject: str, body: str, attachment: bytes = None, filename: str = None):
     """Send email in background thread - returns immediately"""
-    print(f"⚡ Queuing email to {to_email} (background)")
+    logger.info("⚡ Queuing email to %s (background)", to_email)
     thread = threading.Thread(
         target=_send_email_worker,
         args=(to_email, subject, body, attachment, filename),
@@ -762,14 +1434,14 @@ def send_email_async(to_email: str, subject: str, body: str, attachment: bytes =
     thread.start()
     return True
 
+@timed("smtp_send")
 def send_email(to_email: str, subject: str, body: str, attachment: bytes = None, filename: str = None) -> bool:
     """Send email via SMTP only"""
-    print(f"🔥 DEBUG send_email: to={to_email}, USE_SMTP={USE_SMTP}")
-    logging.info(f"📧 Attempting to send email to {to_email}, subject: {subject}")
+    logger.info("📧 Attempting to send email to %s, subject: %s", to_email, subject)
     
     # Try SMTP first if enabled
     if USE_SMTP and SMTP_HOST and SMTP_PASSWORD:
-        print(f"🔥 DEBUG: Using SMTP mode - {SMTP_HOST}:{SMTP_PORT}")
+        logger.debug("🔥 Using SMTP mode - %s:%s", SMTP_HOST, SMTP_PORT)
         try:
             import smtplib
             from email.mime.multipart import MIMEMultipart
@@ -790,17 +1462,17 @@ def send_email(to_email: str, subject: str, body: str, attachment: bytes = None,
                 pdf_attachment = MIMEApplication(attachment, _subtype='pdf')
                 pdf_attachment.add_header('Content-Disposition', 'attachment', filename=filename)
                 msg.attach(pdf_attachment)
-                print(f"📎 PDF attached: {filename} ({len(attachment)} bytes)")
+                logger.debug("📎 PDF attached: %s (%s bytes)", filename, len(attachment))
             
             # Try different ports and methods with reduced timeout for faster failure
             smtp_sent = False
             errors = []
             
-            # Try port 587 with STARTTLS first (most reliable), then configured SMTP_PORT
+            # Try the submission port (587, STARTTLS) first (most reliable), then configured SMTP_PORT
             # Removed port 465 to reduce total timeout
-            for port, use_tls in [(587, True), (SMTP_PORT, False)]:
+            for port, use_tls in [(SMTP_SUBMISSION_PORT, SMTP_STARTTLS), (SMTP_PORT, False)]:
                 try:
-                    print(f"🔥 Trying SMTP port {port}, TLS={use_tls}")
+                    logger.debug("🔥 Trying SMTP port %s, TLS=%s", port, use_tls)
                     
                     # Increased timeout for large attachments
                     if use_tls == 'SSL':
@@ -823,29 +1495,24 @@ def send_email(to_email: str, subject: str, body: str, attachment: bytes = None,
                     server.send_message(msg)
                     server.quit()
                     
-                    print(f"✅ SMTP email sent successfully via port {port}!")
-                    logging.info(f"✅ SMTP email sent to {to_email}")
+                    logger.info("✅ SMTP email sent to %s via port %s", to_email, port)
                     smtp_sent = True
                     break
                     
                 except Exception as e:
                     error_msg = f"Port {port}: {str(e)}"
                     errors.append(error_msg)
-                    print(f"❌ {error_msg}")
+                    logger.error("❌ %s", error_msg)
                     continue
             
             if smtp_sent:
                 return True
             else:
-                print(f"❌ All SMTP ports failed: {errors}")
-                logging.error(f"SMTP failed on all ports: {errors}")
+                logger.error("❌ SMTP failed on all ports: %s", errors)
                 return False
                 
         except Exception as e:
-            print(f"❌ SMTP error: {str(e)}")
-            logging.error(f"SMTP error: {str(e)}")
-            import traceback
-            print(traceback.format_exc())
+            logger.exception("❌ SMTP error: %s", e)
             return False
     
     # SMTP not configured
@@ -874,17 +1541,15 @@ def html_to_text_for_pdf(html_content: str) -> str:
     
     return text.strip()
 
-def _draw_simple_header(p, width, height, contract_code, logo_path='/app/logo.png', qr_data=None):
+def _draw_simple_header(p, width, height, contract_code, logo_path='/app/logo.png', qr_data=None, document_date=None, draw_date=True):
     """Draw header with logo and QR code (no page numbers - those are added later)"""
     from reportlab.lib.colors import HexColor
-    from reportlab.lib.utils import ImageReader
     
     # ===== HEADER =====
-    # Logo
+    # Logo - passed by path so ReportLab embeds one shared image XObject per document
     if os.path.exists(logo_path):
         try:
-            img_reader = ImageReader(logo_path)
-            p.drawImage(img_reader, 40, height - 50, width=40, height=40, mask='auto')
+            p.drawImage(logo_path, 40, height - 50, width=40, height=40, mask='auto')
         except Exception as e:
             logging.error(f"Error loading logo: {str(e)}")
     
@@ -907,41 +1572,61 @@ def _draw_simple_header(p, width, height, contract_code, logo_path='/app/logo.pn
     # Contract code on right
     p.setFillColor(HexColor('#64748b'))
     p.drawRightString(width - 40, height - 30, f"№ {contract_code}")
-    p.drawRightString(width - 40, height - 42, datetime.now().strftime('%d.%m.%Y'))
-    
+    if draw_date:
+        _draw_header_date(p, width, height, document_date)
+
     # ===== QR CODE (top right corner) =====
     if qr_data:
-        try:
-            import qrcode
-            from io import BytesIO
-            
-            qr = qrcode.QRCode(version=1, box_size=3, border=1)
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            # Save to bytes
-            qr_buffer = BytesIO()
-            qr_img.save(qr_buffer, format='PNG')
-            qr_buffer.seek(0)
-            
-            # Draw QR code
-            qr_reader = ImageReader(qr_buffer)
-            p.drawImage(qr_reader, width - 100, height - 100, width=50, height=50)
-            
-            # QR label
-            try:
-                p.setFont("DejaVu", 6)
-            except:
-                p.setFont("Helvetica", 6)
-            p.setFillColor(HexColor('#94a3b8'))
-            p.drawCentredString(width - 75, height - 105, "Проверить")
-        except Exception as e:
-            logging.error(f"Error creating QR code: {str(e)}")
-    
+        _draw_qr_stamp(p, width, height, qr_data)
+
     # Reset color
     p.setFillColor(HexColor('#000000'))
 
+def _draw_header_date(p, width, height, document_date=None):
+    """Draw the document date under the contract code in the header"""
+    from reportlab.lib.colors import HexColor
+
+    try:
+        p.setFont("DejaVu", 8)
+    except:
+        p.setFont("Helvetica", 8)
+    p.setFillColor(HexColor('#64748b'))
+    p.drawRightString(width - 40, height - 42, document_date or datetime.now().strftime('%d.%m.%Y'))
+
+@functools.lru_cache(maxsize=256)
+def _qr_png(qr_data: str) -> bytes:
+    """PNG bytes of the verification QR code (same bytes -> one image XObject per document)"""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=3, border=1)
+    qr.add_data(qr_data)
+    qr.make(fit=True)
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+
+    # Save to bytes
+    qr_buffer = BytesIO()
+    qr_img.save(qr_buffer, format='PNG')
+    return qr_buffer.getvalue()
+
+def _draw_qr_stamp(p, width, height, qr_data):
+    """Draw the verification QR code with its label in the top right corner"""
+    from reportlab.lib.colors import HexColor
+
+    try:
+        # Draw QR code
+        qr_reader = ImageReader(BytesIO(_qr_png(qr_data)))
+        p.drawImage(qr_reader, width - 100, height - 100, width=50, height=50)
+
+        # QR label
+        try:
+            p.setFont("DejaVu", 6)
+        except:
+            p.setFont("Helvetica", 6)
+        p.setFillColor(HexColor('#94a3b8'))
+        p.drawCentredString(width - 75, height - 105, "Проверить")
+    except Exception as e:
+        logging.error(f"Error creating QR code: {str(e)}")
+
 def draw_page_header_footer(p, width, height, page_num, total_pages, contract_code, logo_path='/app/logo.png', qr_data=None):
     """Draw header with logo, footer with page number, and QR code on every page"""
     from reportlab.lib.colors import HexColor
@@ -1178,16 +1863,8 @@ def draw_signature_block(p, y_position, width, height, contract, signature, land
     
     # Get landlord data from template placeholders if available
     if template and template.get('placeholders'):
-        for key, config in template['placeholders'].items():
-            if config.get('type') == 'calculated':
-                continue
-            if config.get('showInSignatureInfo') == False:
-                continue
-            if config.get('owner') != 'landlord':
-                continue
-            
+        for key, label in template_artifacts(template)['signature_fields']['landlord']:
             value = placeholder_values.get(key, '')
-            label = config.get('label', key)
             
             if value:
                 p.setFillColor(HexColor('#6b7280'))  # Gray label
@@ -1328,16 +2005,8 @@ def draw_signature_block(p, y_position, width, height, contract, signature, land
         p.setFont("Helvetica", 9)
     
     if template and template.get('placeholders'):
-        for key, config in template['placeholders'].items():
-            if config.get('type') == 'calculated':
-                continue
-            if config.get('showInSignatureInfo') == False:
-                continue
-            if config.get('owner') not in ['tenant', 'signer']:
-                continue
-            
+        for key, label in template_artifacts(template)['signature_fields']['signer']:
             value = placeholder_values.get(key, '')
-            label = config.get('label', key)
             
             if value:
                 p.setFillColor(HexColor('#6b7280'))
@@ -1586,30 +2255,77 @@ def draw_content_section(p, content_text, y_position, width, height, language_la
     
     return y_position
 
-def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signature_hash: str = None, landlord: dict = None, template: dict = None) -> bytes:
-    """Generate full PDF for contract with all content and signatures
+def _draw_id_document_page(p, width, height, signature):
+    """Draw the signer's ID document photo below the page header"""
+    from reportlab.lib.colors import HexColor
     
-    PDF Structure:
-    - Pages 1+: Russian version + signature block (RU) - may span multiple pages
-    - Pages N+: Kazakh version + signature block (KK) - may span multiple pages
-    - Pages M+ (if EN selected): English version + signature block (EN)
-    - Last page: ID document photo (if available)
+    y_position = height - 120
     
-    Features:
-    - QR code on every page
-    - Dynamic page numbers (calculated after content is rendered)
-    - Header with logo
-    - Footer with contract info
-    """
+    try:
+        p.setFont("DejaVu-Bold", 14)
+    except:
+        p.setFont("Helvetica-Bold", 14)
     
-    # Get FIXED contract language (not UI language)
-    selected_language = contract.get('contract_language') or contract.get('signing_language', 'ru')
-    logging.info(f"📄 Generating bilingual PDF. User selected: {selected_language}")
+    p.setFillColor(HexColor('#1e40af'))
+    p.drawCentredString(width / 2, y_position, "═══ УДОСТОВЕРЕНИЕ ЛИЧНОСТИ / ID DOCUMENT ═══")
+    p.setFillColor(HexColor('#000000'))
     
-    # Determine which languages to include
-    include_english = (selected_language == 'en')
+    y_position -= 40
+    
+    try:
+        import base64
+        from PIL import Image as PILImage
+        
+        img_data = base64.b64decode(signature['document_upload'])
+        img_buffer = BytesIO(img_data)
+        img = PILImage.open(img_buffer)
+        
+        # Resize to fit
+        max_width = 400
+        max_height = 500
+        img_ratio = img.width / img.height
+        
+        if img.width > max_width:
+            new_width = max_width
+            new_height = int(new_width / img_ratio)
+        else:
+            new_width = img.width
+            new_height = img.height
+        
+        if new_height > max_height:
+            new_height = max_height
+            new_width = int(new_height * img_ratio)
+        
+        # Downsample to the printed size at PDF_IMAGE_DPI (phone photos are often 12+ MP)
+        target_size = (max(1, round(new_width * PDF_IMAGE_DPI / 72)), max(1, round(new_height * PDF_IMAGE_DPI / 72)))
+        if img.width > target_size[0] or img.height > target_size[1]:
+            img = img.resize(target_size, PILImage.LANCZOS)
+        
+        # Convert to RGB
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        
+        # Save to buffer
+        rgb_buffer = BytesIO()
+        img.save(rgb_buffer, format='JPEG', quality=85)
+        rgb_buffer.seek(0)
+        
+        # Draw image centered
+        img_reader = ImageReader(rgb_buffer)
+        x_pos = (width - new_width) / 2
+        p.drawImage(img_reader, x_pos, y_position - new_height, width=new_width, height=new_height)
+        
+    except Exception as e:
+        logging.error(f"Error adding ID document: {str(e)}")
+        p.drawString(50, y_position, "Ошибка загрузки документа")
+
+
+def _register_pdf_fonts():
+    """Register DejaVu (or FreeFont) TTF faces used by the PDF renderers"""
+    # Parsing the TTF files takes ~150 ms - do it once per process
+    if 'DejaVu' in pdfmetrics.getRegisteredFontNames():
+        return True
     
-    # Register fonts - try multiple locations
     font_registered = False
     font_paths = [
         '/usr/share/fonts/truetype/dejavu/',
@@ -1618,7 +2334,7 @@ def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signa
         '/app/backend/fonts/',
         '/app/backend/',
     ]
-    
+
     for dejavu_path in font_paths:
         try:
             if os.path.exists(dejavu_path + 'DejaVuSans.ttf'):
@@ -1638,213 +2354,249 @@ def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signa
         except Exception as e:
             logging.warning(f"Failed to register fonts from {dejavu_path}: {str(e)}")
             continue
-    
+
     if not font_registered:
         logging.warning("⚠️ No TTF fonts found, using Helvetica fallback (may have encoding issues)")
     
-    # Create PDF
-    pdf_buffer = BytesIO()
-    p = canvas.Canvas(pdf_buffer, pagesize=A4)
-    width, height = A4
+    return font_registered
+
+def _pdf_source_datetime(contract: dict):
+    """Approval (or creation) time of the contract, used instead of "now" in deterministic PDFs"""
+    for field in ('approved_at', 'created_at'):
+        value = contract.get(field)
+        if isinstance(value, str):
+            try:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            except ValueError:
+                continue
+        if isinstance(value, datetime):
+            return value
+    return None
+
+def _pdf_document_date(contract: dict, deterministic: bool) -> str:
+    """Date printed in the page header"""
+    source_dt = _pdf_source_datetime(contract) if deterministic else None
+    return (source_dt or datetime.now()).strftime('%d.%m.%Y')
+
+def _finalize_pdf_writer(writer, contract: dict, content_digest: bytes):
+    """Pin document info and trailer /ID so the same content always gives the same bytes"""
+    from PyPDF2.generic import ArrayObject, ByteStringObject
+    
+    source_dt = _pdf_source_datetime(contract) or datetime(2000, 1, 1, tzinfo=timezone.utc)
+    pdf_date = source_dt.strftime("D:%Y%m%d%H%M%S+00'00'")
+    writer.add_metadata({
+        '/Producer': '2tick.kz',
+        '/CreationDate': pdf_date,
+        '/ModDate': pdf_date,
+    })
+    doc_id = ByteStringObject(content_digest[:16])
+    writer._ID = ArrayObject([doc_id, doc_id])
+
+def _contract_sections(contract: dict, signature: dict = None) -> list:
+    """Ordered list of PDF sections for a contract: languages, then the ID page"""
+    selected_language = contract.get('contract_language') or contract.get('signing_language', 'ru')
+    sections = ['ru', 'kk']
+    if selected_language == 'en':
+        sections.append('en')
+    if signature and signature.get('document_upload'):
+        sections.append('id')
+    return sections
+
+def _draw_contract_section(p, section, contract, signature, landlord, template, page_info, signature_block=True):
+    """Draw one PDF section (header, language content + signature block, or ID page) starting on the current page.
     
+    Returns the y position where the signature block starts (None for the ID page).
+    page_info['draw_date'] = False leaves the header date out (pre-render, see prerender_contract_pdf).
+    """
     from reportlab.lib.colors import HexColor
     
-    contract_code = contract.get('contract_code', 'N/A')
-    logo_path = '/app/logo.png'
-    
-    # QR code data - link to verify contract on production domain
-    qr_data = f"https://2tick.kz/verify/{contract.get('id', '')}"
-    
-    # Track page info for dynamic numbering
-    page_info = {
-        'current_page': 1,
-        'contract_code': contract_code,
-        'logo_path': logo_path,
-        'qr_data': qr_data
-    }
-    
-    # ========== FIRST PASS: Generate content without page numbers ==========
-    # We'll add headers/footers with correct page numbers in a second pass
-    
-    # ========== PAGE 1: RUSSIAN VERSION ==========
-    
-    # Draw header (without page numbers yet - we'll add them later)
-    # For now, draw a simple header
-    _draw_simple_header(p, width, height, contract_code, logo_path, qr_data)
-    
-    # Title - format date as DD-MM-YYYY
-    y_position = height - 140
+    width, height = A4
+    contract_code = page_info['contract_code']
+    _draw_simple_header(p, width, height, contract_code, page_info['logo_path'], page_info['qr_data'],
+                        page_info.get('document_date'), page_info.get('draw_date', True))
     
-    try:
-        p.setFont("DejaVu-Bold", 16)
-    except:
-        p.setFont("Helvetica-Bold", 16)
+    if section == 'id':
+        _draw_id_document_page(p, width, height, signature)
+        return None
     
     # Parse and reformat date in title if present (convert 2026-01-27 to 27-01-2026)
-    title_text = contract['title']
     import re
-    date_pattern = r'(\d{4})-(\d{2})-(\d{2})'
-    title_text = re.sub(date_pattern, r'\3-\2-\1', title_text)
-    
-    p.drawCentredString(width / 2, y_position, title_text[:60])
-    
-    y_position -= 25
-    
-    # Notice
-    try:
-        p.setFont("DejaVu", 8)
-    except:
-        p.setFont("Helvetica", 8)
-    p.setFillColor(HexColor('#64748b'))
-    notice_text = "Договор составлен на русском и казахском языках, оба текста имеют равную юридическую силу."
-    p.drawCentredString(width / 2, y_position, notice_text)
-    p.setFillColor(HexColor('#000000'))
-    
-    y_position -= 30
-    
-    # Russian content
+    title_text = re.sub(r'(\d{4})-(\d{2})-(\d{2})', r'\3-\2-\1', contract['title'])
     content_type = contract.get('content_type', 'plain')
     
+    if section == 'ru':
+        # Title - format date as DD-MM-YYYY
+        y_position = height - 140
+        try:
+            p.setFont("DejaVu-Bold", 16)
+        except:
+            p.setFont("Helvetica-Bold", 16)
+        p.drawCentredString(width / 2, y_position, title_text[:60])
+        y_position -= 25
+        
+        # Notice
+        try:
+            p.setFont("DejaVu", 8)
+        except:
+            p.setFont("Helvetica", 8)
+        p.setFillColor(HexColor('#64748b'))
+        notice_text = "Договор составлен на русском и казахском языках, оба текста имеют равную юридическую силу."
+        p.drawCentredString(width / 2, y_position, notice_text)
+        p.setFillColor(HexColor('#000000'))
+        y_position -= 30
+    else:
+        y_position = height - 120
+        try:
+            p.setFont("DejaVu-Bold", 14)
+        except:
+            p.setFont("Helvetica-Bold", 14)
+        if section == 'kk':
+            # Convert title to Kazakh format
+            section_title = title_text.replace("Договор", "Шарт").replace("от", "")
+        else:
+            section_title = title_text.replace("Договор", "Contract").replace("от", "dated")
+        p.drawCentredString(width / 2, y_position, section_title[:60])
+        y_position -= 25
+    
+    content_key = {'ru': 'content', 'kk': 'content_kk', 'en': 'content_en'}[section]
     try:
-        content_ru = contract.get('content', '')
+        content = contract.get(content_key, '') or contract.get('content', '')
         if content_type == 'html':
-            content_ru = html_to_text_for_pdf(content_ru)
-        content_ru = replace_placeholders_in_content(content_ru, contract, template)
+            content = html_to_text_for_pdf(content)
+        content = replace_placeholders_in_content(content, contract, template)
     except Exception as e:
-        logging.error(f"Error processing RU content: {str(e)}")
-        content_ru = contract.get('content', 'Error loading content')
+        logging.error(f"Error processing {section.upper()} content: {str(e)}")
+        content = contract.get(content_key, contract.get('content', 'Error loading content'))
+    
+    label, is_translation = {
+        'ru': ("РУССКИЙ / RUSSIAN", False),
+        'kk': ("ҚАЗАҚША / KAZAKH", False),
+        'en': ("ENGLISH", True),
+    }[section]
+    y_position = draw_content_section(p, content, y_position, width, height, label, is_translation=is_translation, start_new_page=False, page_info=page_info)
+    
+    if signature_block:
+        draw_signature_block(p, y_position, width, height, contract, signature, landlord, template, section)
+    return y_position
+
+def _render_contract_section(section: str, contract: dict, signature: dict = None, landlord: dict = None, template: dict = None, deterministic: bool = False) -> bytes:
+    """Render a single section as a standalone PDF (runs in a worker process).
     
-    y_position = draw_content_section(p, content_ru, y_position, width, height, "РУССКИЙ / RUSSIAN", start_new_page=False, page_info=page_info)
+    The QR code is left out: the concatenation pass paints one shared QR XObject
+    on the first page of every section instead.
+    """
+    _register_pdf_fonts()
     
-    # Russian signature block
-    y_position = draw_signature_block(p, y_position, width, height, contract, signature, landlord, template, 'ru')
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1 if deterministic else None)
+    page_info = {
+        'current_page': 1,
+        'contract_code': contract.get('contract_code', 'N/A'),
+        'logo_path': '/app/logo.png',
+        'qr_data': None,
+        'document_date': _pdf_document_date(contract, deterministic)
+    }
+    _draw_contract_section(p, section, contract, signature, landlord, template, page_info)
+    p.save()
+    return buffer.getvalue()
+
+_pdf_section_pool = None
+
+def _get_pdf_section_pool():
+    """Lazily start the process pool used for parallel section rendering"""
+    global _pdf_section_pool
+    if _pdf_section_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        
+        # spawn, not fork: the parent has Motor/email threads running
+        _pdf_section_pool = ProcessPoolExecutor(
+            max_workers=PDF_RENDER_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+        logging.info(f"📄 PDF section pool started ({PDF_RENDER_WORKERS} workers)")
+    return _pdf_section_pool
+
+@timed("generate_contract_pdf")
+def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signature_hash: str = None, landlord: dict = None, template: dict = None, deterministic: bool = None) -> bytes:
+    """Generate full PDF for contract with all content and signatures
     
-    # ========== PAGE N+1: KAZAKH VERSION ==========
-    p.showPage()
-    page_info['current_page'] += 1
-    _draw_simple_header(p, width, height, contract_code, logo_path, qr_data)
+    PDF Structure:
+    - Pages 1+: Russian version + signature block (RU) - may span multiple pages
+    - Pages N+: Kazakh version + signature block (KK) - may span multiple pages
+    - Pages M+ (if EN selected): English version + signature block (EN)
+    - Last page: ID document photo (if available)
     
-    y_position = height - 120
+    Features:
+    - QR code on every page
+    - Dynamic page numbers (calculated after content is rendered)
+    - Header with logo
+    - Footer with contract info
     
-    # Kazakh title
-    try:
-        p.setFont("DejaVu-Bold", 14)
-    except:
-        p.setFont("Helvetica-Bold", 14)
-    # Convert title to Kazakh format
-    kk_title = title_text.replace("Договор", "Шарт").replace("от", "")
-    p.drawCentredString(width / 2, y_position, kk_title[:60])
-    y_position -= 25
+    With PDF_RENDER_WORKERS > 0 each section is rendered in its own worker
+    process and the results are concatenated (see _generate_contract_pdf_parallel).
     
-    try:
-        content_kk = contract.get('content_kk', '')
-        if not content_kk:
-            content_kk = contract.get('content', '')
-        if content_type == 'html':
-            content_kk = html_to_text_for_pdf(content_kk)
-        content_kk = replace_placeholders_in_content(content_kk, contract, template)
-    except Exception as e:
-        logging.error(f"Error processing KK content: {str(e)}")
-        content_kk = contract.get('content_kk', contract.get('content', ''))
+    deterministic (default PDF_DETERMINISTIC): header dates come from approved_at/created_at
+    and document info + /ID are derived from the content, so re-rendering the same
+    contract returns byte-identical output.
+    """
+    if deterministic is None:
+        deterministic = PDF_DETERMINISTIC
     
-    y_position = draw_content_section(p, content_kk, y_position, width, height, "ҚАЗАҚША / KAZAKH", start_new_page=False, page_info=page_info)
+    # Uploaded PDF contracts: stamp the original pages instead of re-rendering text
+    if contract.get('source_type') == 'uploaded_pdf':
+        pdf_path = contract.get('uploaded_pdf_path')
+        if pdf_path and os.path.exists(pdf_path):
+            try:
+                return generate_uploaded_contract_pdf(contract, signature, landlord, template, deterministic)
+            except Exception as e:
+                logging.error(f"Error assembling uploaded PDF, falling back to rendered PDF: {str(e)}")
+        else:
+            logging.warning(f"⚠️ Uploaded PDF not found for contract {contract.get('id')}: {pdf_path}")
     
-    # Kazakh signature block
-    y_position = draw_signature_block(p, y_position, width, height, contract, signature, landlord, template, 'kk')
+    # Get FIXED contract language (not UI language)
+    selected_language = contract.get('contract_language') or contract.get('signing_language', 'ru')
+    logging.info(f"📄 Generating bilingual PDF. User selected: {selected_language}")
     
-    # ========== ENGLISH VERSION (if selected) ==========
-    if include_english:
-        p.showPage()
-        page_info['current_page'] += 1
-        _draw_simple_header(p, width, height, contract_code, logo_path, qr_data)
-        
-        y_position = height - 120
-        
-        # English title
-        try:
-            p.setFont("DejaVu-Bold", 14)
-        except:
-            p.setFont("Helvetica-Bold", 14)
-        en_title = title_text.replace("Договор", "Contract").replace("от", "dated")
-        p.drawCentredString(width / 2, y_position, en_title[:60])
-        y_position -= 25
-        
-        try:
-            content_en = contract.get('content_en', '')
-            if not content_en:
-                content_en = contract.get('content', '')
-            if content_type == 'html':
-                content_en = html_to_text_for_pdf(content_en)
-            content_en = replace_placeholders_in_content(content_en, contract, template)
-        except Exception as e:
-            logging.error(f"Error processing EN content: {str(e)}")
-            content_en = contract.get('content_en', contract.get('content', ''))
-        
-        y_position = draw_content_section(p, content_en, y_position, width, height, "ENGLISH", is_translation=True, start_new_page=False, page_info=page_info)
-        
-        # English signature block
-        y_position = draw_signature_block(p, y_position, width, height, contract, signature, landlord, template, 'en')
+    sections = _contract_sections(contract, signature)
     
-    # ========== LAST PAGE: ID DOCUMENT (if available) ==========
-    if signature and signature.get('document_upload'):
-        p.showPage()
-        page_info['current_page'] += 1
-        _draw_simple_header(p, width, height, contract_code, logo_path, qr_data)
-        
-        y_position = height - 120
-        
-        try:
-            p.setFont("DejaVu-Bold", 14)
-        except:
-            p.setFont("Helvetica-Bold", 14)
-        
-        p.setFillColor(HexColor('#1e40af'))
-        p.drawCentredString(width / 2, y_position, "═══ УДОСТОВЕРЕНИЕ ЛИЧНОСТИ / ID DOCUMENT ═══")
-        p.setFillColor(HexColor('#000000'))
-        
-        y_position -= 40
-        
+    if PDF_RENDER_WORKERS > 0:
         try:
-            import base64
-            from PIL import Image as PILImage
-            
-            img_data = base64.b64decode(signature['document_upload'])
-            img_buffer = BytesIO(img_data)
-            img = PILImage.open(img_buffer)
-            
-            # Resize to fit
-            max_width = 400
-            max_height = 500
-            img_ratio = img.width / img.height
-            
-            if img.width > max_width:
-                new_width = max_width
-                new_height = int(new_width / img_ratio)
-            else:
-                new_width = img.width
-                new_height = img.height
-            
-            if new_height > max_height:
-                new_height = max_height
-                new_width = int(new_height * img_ratio)
-            
-            # Convert to RGB
-            if img.mode in ('RGBA', 'P'):
-                img = img.convert('RGB')
-            
-            # Save to buffer
-            rgb_buffer = BytesIO()
-            img.save(rgb_buffer, format='JPEG', quality=85)
-            rgb_buffer.seek(0)
-            
-            # Draw image centered
-            img_reader = ImageReader(rgb_buffer)
-            x_pos = (width - new_width) / 2
-            p.drawImage(img_reader, x_pos, y_position - new_height, width=new_width, height=new_height)
-            
+            return _generate_contract_pdf_parallel(sections, contract, signature, landlord, template, deterministic)
         except Exception as e:
-            logging.error(f"Error adding ID document: {str(e)}")
-            p.drawString(50, y_position, "Ошибка загрузки документа")
+            logging.error(f"Parallel PDF rendering failed, rendering serially: {str(e)}")
+    
+    # Register fonts - try multiple locations
+    _register_pdf_fonts()
+    
+    # Create PDF
+    pdf_buffer = BytesIO()
+    p = canvas.Canvas(pdf_buffer, pagesize=A4, invariant=1 if deterministic else None)
+    width, height = A4
+    
+    contract_code = contract.get('contract_code', 'N/A')
+    logo_path = '/app/logo.png'
+    
+    # QR code data - link to verify contract on production domain
+    qr_data = f"https://2tick.kz/verify/{contract.get('id', '')}"
+    
+    # Track page info for dynamic numbering
+    page_info = {
+        'current_page': 1,
+        'contract_code': contract_code,
+        'logo_path': logo_path,
+        'qr_data': qr_data,
+        'document_date': _pdf_document_date(contract, deterministic)
+    }
+    
+    # ========== FIRST PASS: Generate content without page numbers ==========
+    # We'll add headers/footers with correct page numbers in a second pass
+    # Sections: RU, KK, EN (if selected), ID document (if available) - each starts on a new page
+    for index, section in enumerate(sections):
+        if index:
+            p.showPage()
+            page_info['current_page'] += 1
+        _draw_contract_section(p, section, contract, signature, landlord, template, page_info)
     
     # Save first pass PDF (without page numbers)
     p.save()
@@ -1863,33 +2615,13 @@ def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signa
         total_pages = len(reader.pages)
         logging.info(f"📄 PDF generated with {total_pages} pages. Adding page numbers...")
         
-        # Create page number overlays
-        for page_num in range(total_pages):
-            # Create overlay with page number
-            overlay_buffer = BytesIO()
-            overlay_canvas = canvas.Canvas(overlay_buffer, pagesize=A4)
-            
-            # Set font for page number
-            try:
-                overlay_canvas.setFont("DejaVu", 8)
-            except:
-                overlay_canvas.setFont("Helvetica", 8)
-            
-            overlay_canvas.setFillColor(HexColor('#94a3b8'))
-            
-            # Draw page number in footer
-            overlay_canvas.drawCentredString(width / 2, 25, f"Страница {page_num + 1} из {total_pages}")
-            overlay_canvas.drawString(40, 25, "2tick.kz — Электронная подпись договоров")
-            overlay_canvas.drawRightString(width - 40, 25, f"№ {contract_code}")
-            
-            overlay_canvas.save()
-            overlay_buffer.seek(0)
-            
-            # Merge overlay with page
-            overlay_reader = PdfReader(overlay_buffer)
-            page = reader.pages[page_num]
-            page.merge_page(overlay_reader.pages[0])
-            writer.add_page(page)
+        # Footer + page numbers as XObjects painted over the unchanged pages
+        # (merge_page renamed resources with random names on every render)
+        pages = [writer.add_page(page) for page in reader.pages]
+        _stamp_pages(writer, pages, contract_code, qr_data, qr_pages=set(), deterministic=deterministic)
+        
+        if deterministic:
+            _finalize_pdf_writer(writer, contract, hashlib.sha256(first_pass_pdf).digest())
         
         # Write final PDF
         final_buffer = BytesIO()
@@ -1904,6 +2636,608 @@ def generate_contract_pdf(contract: dict, signature: dict = None, landlord_signa
         # Return first pass PDF without page numbers as fallback
         return first_pass_pdf
 
+def _overlay_page_to_form(writer, overlay_page):
+    """Convert a single-page ReportLab overlay into a Form XObject owned by writer"""
+    from PyPDF2.generic import ArrayObject, FloatObject, NameObject, DecodedStreamObject
+    
+    contents = overlay_page['/Contents'].get_object()
+    if isinstance(contents, ArrayObject):
+        data = b"\n".join(c.get_object().get_data() for c in contents)
+    else:
+        data = contents.get_data()
+    
+    raw = DecodedStreamObject()
+    raw.set_data(data)
+    form = raw.flate_encode()
+    form[NameObject('/Type')] = NameObject('/XObject')
+    form[NameObject('/Subtype')] = NameObject('/Form')
+    box = overlay_page.mediabox
+    form[NameObject('/BBox')] = ArrayObject([FloatObject(v) for v in (box.left, box.bottom, box.right, box.top)])
+    form[NameObject('/Resources')] = overlay_page['/Resources'].get_object().clone(writer)
+    return writer._add_object(form)
+
+
+def _stamp_page(writer, page, xobjects, stream_cache=None):
+    """Paint Form XObjects over a page without touching its original content streams.
+
+    The original /Contents references are kept as-is; the page gets a private
+    /Resources dict (so shared resource dicts of the source are not mutated)
+    and is wrapped in q ... Q followed by one "Do" per overlay. Pass the same
+    stream_cache dict for all pages of a writer to share identical wrapper streams.
+    """
+    from PyPDF2.generic import ArrayObject, DictionaryObject, NameObject, DecodedStreamObject
+    
+    resources = DictionaryObject()
+    if '/Resources' in page:
+        for key, value in page['/Resources'].get_object().items():
+            resources[key] = value
+    xobject_dict = DictionaryObject()
+    if '/XObject' in resources:
+        for key, value in resources['/XObject'].get_object().items():
+            xobject_dict[key] = value
+    
+    box = page.mediabox
+    ops = [b"Q"]
+    for name, ref in xobjects:
+        xobject_dict[NameObject(name)] = ref
+        ops.append(f"q 1 0 0 1 {float(box.left):.2f} {float(box.bottom):.2f} cm {name} Do Q".encode())
+    resources[NameObject('/XObject')] = xobject_dict
+    page[NameObject('/Resources')] = resources
+    
+    if stream_cache is None:
+        stream_cache = {}
+    
+    def wrapper_stream(data):
+        if data not in stream_cache:
+            stream = DecodedStreamObject()
+            stream.set_data(data)
+            stream_cache[data] = writer._add_object(stream)
+        return stream_cache[data]
+    
+    contents = ArrayObject([wrapper_stream(b"q")])
+    original = page.get('/Contents')
+    if original is not None:
+        if isinstance(original.get_object(), ArrayObject):
+            contents.extend(original.get_object())
+        else:
+            contents.append(original)
+    contents.append(wrapper_stream(b"\n".join(ops)))
+    page[NameObject('/Contents')] = contents
+
+
+def _stamp_pages(writer, pages, contract_code, qr_data, qr_pages=None, deterministic=False):
+    """Paint QR code, footer and "Страница X из Y" on writer pages.
+    
+    QR code and footer are rendered once per page size into shared Form XObjects;
+    only the page-number label is a per-page XObject. qr_pages limits the QR code
+    to the given page indexes (default: every page).
+    """
+    from reportlab.lib.colors import HexColor
+    from PyPDF2 import PdfReader
+    
+    total_pages = len(pages)
+    sizes = []
+    for page in pages:
+        size = (float(page.mediabox.width), float(page.mediabox.height))
+        if size not in sizes:
+            sizes.append(size)
+    
+    # Overlay document: [QR, footer] per page size, then one label page per output page
+    overlay_buffer = BytesIO()
+    o = canvas.Canvas(overlay_buffer, invariant=1 if deterministic else None)
+    for page_width, page_height in sizes:
+        o.setPageSize((page_width, page_height))
+        _draw_qr_stamp(o, page_width, page_height, qr_data)
+        o.showPage()
+        o.setPageSize((page_width, page_height))
+        try:
+            o.setFont("DejaVu", 8)
+        except:
+            o.setFont("Helvetica", 8)
+        o.setFillColor(HexColor('#94a3b8'))
+        o.drawString(40, 25, "2tick.kz — Электронная подпись договоров")
+        o.drawRightString(page_width - 40, 25, f"№ {contract_code}")
+        o.showPage()
+    for page_num, page in enumerate(pages):
+        page_width, page_height = float(page.mediabox.width), float(page.mediabox.height)
+        o.setPageSize((page_width, page_height))
+        try:
+            o.setFont("DejaVu", 8)
+        except:
+            o.setFont("Helvetica", 8)
+        o.setFillColor(HexColor('#94a3b8'))
+        o.drawCentredString(page_width / 2, 25, f"Страница {page_num + 1} из {total_pages}")
+        o.showPage()
+    o.save()
+    
+    overlay_reader = PdfReader(BytesIO(overlay_buffer.getvalue()))
+    qr_forms, footer_forms, stream_cache = {}, {}, {}
+    for i, size in enumerate(sizes):
+        if qr_pages is None or qr_pages:
+            qr_forms[size] = _overlay_page_to_form(writer, overlay_reader.pages[2 * i])
+        footer_forms[size] = _overlay_page_to_form(writer, overlay_reader.pages[2 * i + 1])
+    
+    for page_num, page in enumerate(pages):
+        size = (float(page.mediabox.width), float(page.mediabox.height))
+        label = _overlay_page_to_form(writer, overlay_reader.pages[2 * len(sizes) + page_num])
+        xobjects = [('/TwoTickFooter', footer_forms[size]), ('/TwoTickPage', label)]
+        if qr_pages is None or page_num in qr_pages:
+            xobjects.insert(0, ('/TwoTickQR', qr_forms[size]))
+        _stamp_page(writer, page, xobjects, stream_cache)
+
+def _share_image_xobjects(writer, pages):
+    """Point identical image XObjects (logo, QR) from different source documents at one object.
+    
+    Duplicates are replaced by null objects so the writer does not emit their data.
+    Returns the number of bytes saved.
+    """
+    from PyPDF2.generic import DictionaryObject, IndirectObject, NameObject, NullObject
+    
+    canonical, saved = {}, 0
+    for page in pages:
+        resources = page.get('/Resources')
+        if resources is None or '/XObject' not in resources.get_object():
+            continue
+        xobjects = resources.get_object()['/XObject'].get_object()
+        shared = DictionaryObject()
+        for name, ref in xobjects.items():
+            image = ref.get_object()
+            if isinstance(ref, IndirectObject) and image.get('/Subtype') == '/Image':
+                key = hashlib.sha256(repr(sorted((k, str(v)) for k, v in image.items() if k != '/SMask')).encode() + image._data).hexdigest()
+                if '/SMask' in image:
+                    key += hashlib.sha256(image['/SMask'].get_object()._data).hexdigest()
+                first = canonical.setdefault(key, ref)
+                if first.idnum != ref.idnum:
+                    saved += len(image._data)
+                    if '/SMask' in image:
+                        writer._objects[image.raw_get('/SMask').idnum - 1] = NullObject()
+                    writer._objects[ref.idnum - 1] = NullObject()
+                ref = first
+            shared[NameObject(name)] = ref
+        resources.get_object()[NameObject('/XObject')] = shared
+    return saved
+
+def _generate_contract_pdf_parallel(sections: list, contract: dict, signature: dict = None, landlord: dict = None, template: dict = None, deterministic: bool = False) -> bytes:
+    """Render sections in worker processes and concatenate them with global page numbers"""
+    from concurrent.futures.process import BrokenProcessPool
+    from PyPDF2 import PdfReader, PdfWriter
+    
+    _register_pdf_fonts()
+    
+    pool = _get_pdf_section_pool()
+    futures = [
+        pool.submit(_render_contract_section, section, contract, signature, landlord, template, deterministic)
+        for section in sections
+    ]
+    
+    writer = PdfWriter()
+    pages, section_starts = [], set()
+    digest = hashlib.sha256()
+    try:
+        for future in futures:
+            section_starts.add(len(pages))
+            section_pdf = future.result(timeout=120)
+            digest.update(section_pdf)
+            reader = PdfReader(BytesIO(section_pdf))
+            pages += [writer.add_page(page) for page in reader.pages]
+    except BrokenProcessPool:
+        # A worker died - drop the pool so the next render starts a fresh one
+        global _pdf_section_pool
+        _pdf_section_pool = None
+        raise
+    
+    contract_code = contract.get('contract_code', 'N/A')
+    qr_data = f"https://2tick.kz/verify/{contract.get('id', '')}"
+    _stamp_pages(writer, pages, contract_code, qr_data, qr_pages=section_starts, deterministic=deterministic)
+    _share_image_xobjects(writer, pages)
+    if deterministic:
+        _finalize_pdf_writer(writer, contract, digest.digest())
+    
+    final_buffer = BytesIO()
+    writer.write(final_buffer)
+    logging.info(f"✅ PDF rendered in parallel: {len(sections)} sections, {len(pages)} pages")
+    return final_buffer.getvalue()
+
+def generate_uploaded_contract_pdf(contract: dict, signature: dict = None, landlord: dict = None, template: dict = None, deterministic: bool = False) -> bytes:
+    """Assemble the signed PDF for an uploaded-PDF contract
+    
+    PDF Structure:
+    - Pages 1..N: original uploaded pages, copied unchanged (content streams are not re-encoded)
+    - Pages N+1+: signature blocks (RU, KK, EN if selected)
+    - Last page: ID document photo (if available)
+    
+    QR code, footer and page numbers are painted by _stamp_pages.
+    """
+    import mmap
+    from PyPDF2 import PdfReader, PdfWriter
+    
+    selected_language = contract.get('contract_language') or contract.get('signing_language', 'ru')
+    languages = ['ru', 'kk'] + (['en'] if selected_language == 'en' else [])
+    
+    _register_pdf_fonts()
+    
+    contract_code = contract.get('contract_code', 'N/A')
+    logo_path = '/app/logo.png'
+    qr_data = f"https://2tick.kz/verify/{contract.get('id', '')}"
+    document_date = _pdf_document_date(contract, deterministic)
+    
+    # ========== APPENDED PAGES: signature blocks + ID document ==========
+    tail_buffer = BytesIO()
+    p = canvas.Canvas(tail_buffer, pagesize=A4, invariant=1 if deterministic else None)
+    width, height = A4
+    
+    for index, lang in enumerate(languages):
+        if index:
+            p.showPage()
+        _draw_simple_header(p, width, height, contract_code, logo_path, document_date=document_date)
+        draw_signature_block(p, height - 120, width, height, contract, signature, landlord, template, lang)
+    
+    if signature and signature.get('document_upload'):
+        p.showPage()
+        _draw_simple_header(p, width, height, contract_code, logo_path, document_date=document_date)
+        _draw_id_document_page(p, width, height, signature)
+    
+    p.save()
+    tail_reader = PdfReader(BytesIO(tail_buffer.getvalue()))
+    
+    with open(contract['uploaded_pdf_path'], 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as source:
+        reader = PdfReader(source)
+        writer = PdfWriter()
+        
+        pages = [writer.add_page(page) for page in reader.pages]
+        pages += [writer.add_page(page) for page in tail_reader.pages]
+        total_pages = len(pages)
+        logging.info(f"📄 Stamping uploaded PDF: {len(reader.pages)} original + {len(tail_reader.pages)} appended pages")
+        
+        _stamp_pages(writer, pages, contract_code, qr_data, deterministic=deterministic)
+        if deterministic:
+            digest = hashlib.sha256(source)
+            digest.update(tail_buffer.getvalue())
+            _finalize_pdf_writer(writer, contract, digest.digest())
+        
+        final_buffer = BytesIO()
+        writer.write(final_buffer)
+    
+    logging.info(f"✅ Uploaded contract PDF assembled ({total_pages} pages)")
+    return final_buffer.getvalue()
+
+
+# ==================== PDF PRE-RENDER ====================
+# When the signer verifies (contract -> pending-signature) everything that does not
+# depend on the landlord's approval is rendered in the background: every section
+# without its signature block and without the header date. approve_signature then
+# only renders the signature blocks + date and merges them as Form XObjects.
+
+PRERENDER_VOLATILE_FIELDS = ('_id', 'status', 'landlord_signature_hash', 'approved_at', 'updated_at')
+
+def _prerender_fingerprint(contract: dict, signature: dict = None, template: dict = None, deterministic: bool = False) -> str:
+    """Hash of every input the pre-rendered section bodies depend on"""
+    import json
+    
+    payload = {
+        'contract': {k: v for k, v in contract.items() if k not in PRERENDER_VOLATILE_FIELDS},
+        'document_upload': hashlib.sha256((signature or {}).get('document_upload', '').encode()).hexdigest(),
+        'template_placeholders': (template or {}).get('placeholders'),
+        'sections': _contract_sections(contract, signature),
+        'deterministic': deterministic,
+        'logo': os.path.exists('/app/logo.png'),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+def render_contract_prerender(contract: dict, signature: dict = None, landlord: dict = None, template: dict = None, deterministic: bool = None) -> dict:
+    """Render section bodies (no signature blocks, no header date) for later assembly"""
+    if deterministic is None:
+        deterministic = PDF_DETERMINISTIC
+    _register_pdf_fonts()
+    
+    # One document for all sections so font subsets and images are embedded once
+    buffer = BytesIO()
+    p = canvas.Canvas(buffer, pagesize=A4, invariant=1 if deterministic else None)
+    page_info = {
+        'current_page': 1,
+        'contract_code': contract.get('contract_code', 'N/A'),
+        'logo_path': '/app/logo.png',
+        'qr_data': None,
+        'draw_date': False
+    }
+    sections = []
+    for index, section in enumerate(_contract_sections(contract, signature)):
+        if index:
+            p.showPage()
+        start = p.getPageNumber() - 1
+        end_y = _draw_contract_section(p, section, contract, signature, landlord, template, page_info, signature_block=False)
+        sections.append({'section': section, 'start': start, 'pages': p.getPageNumber() - start, 'end_y': end_y})
+    p.save()
+    
+    return {
+        'contract_id': contract.get('id'),
+        'fingerprint': _prerender_fingerprint(contract, signature, template, deterministic),
+        'pdf': buffer.getvalue(),
+        'sections': sections,
+        'created_at': datetime.now(timezone.utc)
+    }
+
+def assemble_prerendered_contract_pdf(prerender: dict, contract: dict, signature: dict = None, landlord: dict = None, template: dict = None, deterministic: bool = None):
+    """Build the final PDF from a pre-render plus freshly drawn signature blocks and dates.
+    
+    Returns None when the pre-render no longer matches the contract (caller renders in full).
+    """
+    from PyPDF2 import PdfReader, PdfWriter
+    
+    if deterministic is None:
+        deterministic = PDF_DETERMINISTIC
+    if prerender.get('fingerprint') != _prerender_fingerprint(contract, signature, template, deterministic):
+        logging.info(f"📄 Pre-render for {contract.get('id')} is stale, rendering in full")
+        return None
+    
+    _register_pdf_fonts()
+    width, height = A4
+    
+    # Delta document: page 0 = header date, then one run of pages per signature block
+    delta_buffer = BytesIO()
+    d = canvas.Canvas(delta_buffer, pagesize=A4, invariant=1 if deterministic else None)
+    _draw_header_date(d, width, height, _pdf_document_date(contract, deterministic))
+    delta_runs = []
+    for entry in prerender['sections']:
+        if entry['section'] == 'id':
+            delta_runs.append(0)
+            continue
+        d.showPage()
+        before = d.getPageNumber()
+        draw_signature_block(d, entry['end_y'], width, height, contract, signature, landlord, template, entry['section'])
+        delta_runs.append(d.getPageNumber() - before + 1)
+    d.save()
+    delta_pdf = delta_buffer.getvalue()
+    delta_reader = PdfReader(BytesIO(delta_pdf))
+    
+    writer = PdfWriter()
+    stream_cache = {}
+    date_form = _overlay_page_to_form(writer, delta_reader.pages[0])
+    digest = hashlib.sha256(delta_pdf)
+    digest.update(prerender['pdf'])
+    body_reader = PdfReader(BytesIO(prerender['pdf']))
+    pages, section_starts, delta_index = [], set(), 1
+    for entry, run in zip(prerender['sections'], delta_runs):
+        body = [writer.add_page(page) for page in body_reader.pages[entry['start']:entry['start'] + entry['pages']]]
+        overlays = {0: [('/TwoTickDate', date_form)]}
+        if run:
+            # The block starts on the last body page; pages it breaks onto are appended
+            sign_form = _overlay_page_to_form(writer, delta_reader.pages[delta_index])
+            overlays.setdefault(len(body) - 1, []).append(('/TwoTickSign', sign_form))
+            body += [writer.add_page(page) for page in delta_reader.pages[delta_index + 1:delta_index + run]]
+            delta_index += run
+        for index, xobjects in overlays.items():
+            _stamp_page(writer, body[index], xobjects, stream_cache)
+        section_starts.add(len(pages))
+        pages += body
+    
+    contract_code = contract.get('contract_code', 'N/A')
+    qr_data = f"https://2tick.kz/verify/{contract.get('id', '')}"
+    _stamp_pages(writer, pages, contract_code, qr_data, qr_pages=section_starts, deterministic=deterministic)
+    _share_image_xobjects(writer, pages)
+    if deterministic:
+        _finalize_pdf_writer(writer, contract, digest.digest())
+    
+    final_buffer = BytesIO()
+    writer.write(final_buffer)
+    logging.info(f"✅ PDF assembled from pre-render ({len(pages)} pages)")
+    return final_buffer.getvalue()
+
+async def _prerender_still_current(contract_id: str, fingerprint: str, template: dict = None) -> bool:
+    """True while the contract is pending-signature and its inputs still hash to fingerprint"""
+    contract = await find_contract({"id": contract_id}, {"_id": 0})
+    if not contract or contract.get('status') != 'pending-signature':
+        return False
+    signature = await find_signature({"contract_id": contract_id}, {"_id": 0})
+    return _prerender_fingerprint(contract, signature, template, PDF_DETERMINISTIC) == fingerprint
+
+async def prerender_contract_pdf(contract_id: str):
+    """Background task: pre-render a contract that is waiting for landlord approval"""
+    import asyncio
+    from bson import Binary
+    
+    try:
+        contract = await find_contract({"id": contract_id}, {"_id": 0})
+        if not contract or contract.get('status') != 'pending-signature' or contract.get('source_type') == 'uploaded_pdf':
+            return
+        signature = await find_signature({"contract_id": contract_id}, {"_id": 0})
+        landlord = await db.users.find_one({"id": contract.get('creator_id')}, {"_id": 0})
+        template = None
+        if contract.get('template_id'):
+            template = await template_for_contract(contract)
+        
+        loop = asyncio.get_event_loop()
+        prerender = await loop.run_in_executor(None, render_contract_prerender, contract, signature, landlord, template)
+        prerender['pdf'] = Binary(prerender['pdf'])
+        
+        # The contract may have been approved or edited while rendering: only store a pre-render
+        # that still matches a contract waiting for approval
+        if not await _prerender_still_current(contract_id, prerender['fingerprint'], template):
+            logging.info(f"📄 Pre-render for {contract.get('contract_code')} is outdated, not stored")
+            return
+        await db.pdf_prerenders.replace_one({"contract_id": contract_id}, prerender, upsert=True)
+        # approve_signature sets the status before it consumes the pre-render; if it slipped in
+        # between the check and the write, nobody will read this one - remove it
+        current = await db.contracts.find_one({"id": contract_id}, {"_id": 0, "status": 1})
+        if not current or current.get('status') != 'pending-signature':
+            await db.pdf_prerenders.delete_one({"contract_id": contract_id, "fingerprint": prerender['fingerprint']})
+            return
+        logging.info(f"📄 Pre-rendered PDF for contract {contract.get('contract_code')}")
+    except Exception as e:
+        logging.error(f"Error pre-rendering PDF for contract {contract_id}: {str(e)}")
+
+_prerender_tasks = set()
+
+def schedule_contract_prerender(contract_id: str):
+    """Start prerender_contract_pdf in the background (keeps a reference until it finishes)"""
+    import asyncio
+    
+    task = asyncio.get_event_loop().create_task(prerender_contract_pdf(contract_id))
+    _prerender_tasks.add(task)
+    task.add_done_callback(_prerender_tasks.discard)
+
+async def discard_contract_prerender(contract_id: str):
+    """Drop the pre-render of a contract that was edited or deleted (it would only go stale)"""
+    await db.pdf_prerenders.delete_one({"contract_id": contract_id})
+
+async def render_approved_contract_pdf(contract: dict, signature: dict = None, landlord_signature_hash: str = None, landlord: dict = None, template: dict = None) -> bytes:
+    """Final PDF on approval: merge the signature-block delta into the pre-render when one is available"""
+    prerender = await db.pdf_prerenders.find_one({"contract_id": contract.get('id')})
+    if prerender:
+        await db.pdf_prerenders.delete_one({"contract_id": contract.get('id')})
+        try:
+            pdf_bytes = assemble_prerendered_contract_pdf(prerender, contract, signature, landlord, template)
+            if pdf_bytes:
+                return pdf_bytes
+        except Exception as e:
+            logging.error(f"Error assembling pre-rendered PDF, rendering in full: {str(e)}")
+    return generate_contract_pdf(contract, signature, landlord_signature_hash, landlord, template)
+
+def pdf_size_report(pdf_bytes: bytes) -> dict:
+    """Break a PDF down into bytes per component (fonts, images, content, forms, structure).
+    
+    Sizes are serialized object sizes taken from xref offsets, so they add up to the file size.
+    Also lists embedded font programs and images and flags streams written without a filter.
+    """
+    from PyPDF2 import PdfReader
+    from PyPDF2.generic import IndirectObject, StreamObject
+    
+    reader = PdfReader(BytesIO(pdf_bytes))
+    offsets = sorted(
+        (offset, idnum, generation)
+        for generation, entries in reader.xref.items()
+        for idnum, offset in entries.items()
+    )
+    xref_start = pdf_bytes.rfind(b'xref')
+    
+    report = {
+        'total_bytes': len(pdf_bytes),
+        'pages': len(reader.pages),
+        'components': {'fonts': 0, 'images': 0, 'content': 0, 'forms': 0, 'structure': 0},
+        'fonts': {},
+        'images': [],
+        'uncompressed_streams': 0,
+        'uncompressed_bytes': 0,
+    }
+    font_files = {}
+    for index, (offset, idnum, generation) in enumerate(offsets):
+        end = offsets[index + 1][0] if index + 1 < len(offsets) else xref_start
+        size = max(0, end - offset)
+        obj = reader.get_object(IndirectObject(idnum, generation, reader))
+        
+        kind = 'structure'
+        if isinstance(obj, StreamObject):
+            if '/Filter' not in obj:
+                report['uncompressed_streams'] += 1
+                report['uncompressed_bytes'] += size
+            subtype = obj.get('/Subtype')
+            if subtype == '/Image':
+                kind = 'images'
+                report['images'].append({'width': obj.get('/Width'), 'height': obj.get('/Height'),
+                                         'filter': str(obj.get('/Filter')), 'bytes': size})
+            elif subtype == '/Form':
+                kind = 'forms'
+            elif '/Length1' in obj or subtype in ('/Type1C', '/CIDFontType0C', '/OpenType') or obj.get_data()[:64].find(b'begincmap') >= 0:
+                kind = 'fonts'
+                font_files[idnum] = size
+            else:
+                kind = 'content'
+        elif hasattr(obj, 'get') and obj.get('/Type') in ('/Font', '/FontDescriptor'):
+            kind = 'fonts'
+            if obj.get('/Type') == '/FontDescriptor':
+                for key in ('/FontFile', '/FontFile2', '/FontFile3'):
+                    if key in obj:
+                        report['fonts'][str(obj.get('/FontName'))] = obj.raw_get(key).idnum
+        report['components'][kind] += size
+    
+    report['fonts'] = {name: font_files.get(ref, 0) for name, ref in report['fonts'].items()}
+    return report
+
+def _check_pdf_size_budget(pdf_bytes: bytes, contract: dict):
+    """Log a per-component breakdown when a PDF exceeds PDF_SIZE_BUDGET_KB"""
+    if len(pdf_bytes) <= PDF_SIZE_BUDGET_KB * 1024:
+        return
+    try:
+        report = pdf_size_report(pdf_bytes)
+        logging.warning(
+            f"⚠️ PDF for contract {contract.get('contract_code')} is {len(pdf_bytes) // 1024} KB "
+            f"(budget {PDF_SIZE_BUDGET_KB} KB): components={report['components']} fonts={report['fonts']} "
+            f"images={report['images']} uncompressed_streams={report['uncompressed_streams']}"
+        )
+    except Exception as e:
+        logging.warning(f"⚠️ PDF for contract {contract.get('contract_code')} is {len(pdf_bytes) // 1024} KB (budget {PDF_SIZE_BUDGET_KB} KB); size report failed: {str(e)}")
+
+def compile_template(template: dict) -> dict:
+    """Precomputed placeholder metadata of one template version (plain data, stored in template_versions):
+    what replace_placeholders_in_content and the PDF signature blocks would otherwise derive per render"""
+    placeholders = template.get('placeholders') or {}
+    content_keys = [key for key, config in placeholders.items() if (config or {}).get('showInContent') != False]
+    labels = {'ru': {}, 'kk': {}, 'en': {}}
+    for key in content_keys:
+        config = placeholders[key] or {}
+        for lang, field in (('ru', 'label'), ('kk', 'label_kk'), ('en', 'label_en')):
+            if config.get(field):
+                labels[lang].setdefault(config[field], []).append(key)
+    
+    signature_fields = {'landlord': [], 'signer': []}
+    for key, config in placeholders.items():
+        config = config or {}
+        if config.get('type') == 'calculated' or config.get('showInSignatureInfo') == False:
+            continue
+        if config.get('owner') == 'landlord':
+            signature_fields['landlord'].append([key, config.get('label', key)])
+        elif config.get('owner') in ['tenant', 'signer']:
+            signature_fields['signer'].append([key, config.get('label', key)])
+    
+    return {
+        'content_keys': content_keys,
+        'labels': labels,
+        'signature_fields': signature_fields,
+    }
+
+def template_artifacts(template: dict) -> dict:
+    """Compiled metadata of a catalog template, or compiled on the spot for an ad-hoc dict"""
+    return template.get('compiled') or compile_template(template)
+
+@functools.lru_cache(maxsize=256)
+def _placeholder_pattern(keys: tuple):
+    import re
+    alternatives = '|'.join(re.escape(key) for key in sorted(keys, key=len, reverse=True))
+    return re.compile(r'{{\s*(' + alternatives + r')\s*}}')
+
+@functools.lru_cache(maxsize=256)
+def _label_pattern(labels: tuple):
+    import re
+    alternatives = '|'.join(re.escape(label) for label in sorted(labels, key=len, reverse=True))
+    return re.compile(r'\[(' + alternatives + r')\]')
+
+def landlord_placeholder_values(template: dict, values: dict) -> dict:
+    """Values the landlord fills into the text at creation/edit time: non-empty, landlord-owned
+    (signer placeholders stay as {{key}} for Party B), dates as DD.MM.YYYY"""
+    placeholders = template.get('placeholders') or {}
+    filled = {}
+    for key, value in (values or {}).items():
+        config = placeholders.get(key)
+        if config is None or not value:
+            continue
+        if config.get('owner', 'landlord') in ['signer', 'tenant']:
+            continue
+        value = str(value)
+        if config.get('type') == 'date':
+            try:
+                value = datetime.fromisoformat(value.replace('Z', '+00:00')).strftime('%d.%m.%Y')
+            except ValueError:
+                pass
+        filled[key] = value
+    return filled
+
+def fill_placeholders(content: Optional[str], values: dict) -> Optional[str]:
+    """Every {{key}} of values replaced in one pass"""
+    if not content or not values:
+        return content
+    return _placeholder_pattern(tuple(values)).sub(lambda m: values[m.group(1)], content)
+
 def replace_placeholders_in_content(content: str, contract: dict, template: dict = None) -> str:
     """Replace placeholders in contract content with actual values, respecting showInContent flag"""
     import re
@@ -1941,31 +3275,26 @@ def replace_placeholders_in_content(content: str, contract: dict, template: dict
             pattern = re.compile(f'{{{{\\s*{key}\\s*}}}}')
             content = pattern.sub(str(value), content)
     
-    # Handle new {{placeholder}} format with template
+    # Handle new {{placeholder}} format with template (skips showInContent=False)
     if template and template.get('placeholders'):
-        for key, config in template['placeholders'].items():
-            # Skip placeholders that should NOT appear in content
-            if config.get('showInContent') == False:
-                continue
-            
-            # Get value from contract placeholder_values OR party_b_mapping
+        compiled = template_artifacts(template)
+        # Value from contract placeholder_values OR party_b_mapping
+        values = {}
+        for key in compiled['content_keys']:
             value = pv.get(key, '') or party_b_mapping.get(key, '')
             if value:
-                # Replace {{key}} with value
-                pattern = re.compile(f'{{{{\\s*{key}\\s*}}}}')
-                content = pattern.sub(str(value), content)
-                
-                # Also replace [label] format if label exists
-                label = config.get('label', '')
-                label_kk = config.get('label_kk', '')
-                label_en = config.get('label_en', '')
-                
-                if label:
-                    content = content.replace(f'[{label}]', str(value))
-                if label_kk:
-                    content = content.replace(f'[{label_kk}]', str(value))
-                if label_en:
-                    content = content.replace(f'[{label_en}]', str(value))
+                values[key] = str(value)
+        if values:
+            # One pass for every {{key}}, one pass for every [label] (RU/KK/EN)
+            content = _placeholder_pattern(tuple(values)).sub(lambda m: values[m.group(1)], content)
+            label_values = {}
+            for lang in ('ru', 'kk', 'en'):
+                for label, keys in compiled['labels'][lang].items():
+                    key = next((k for k in keys if k in values), None)
+                    if key is not None:
+                        label_values.setdefault(label, values[key])
+            if label_values:
+                content = _label_pattern(tuple(label_values)).sub(lambda m: label_values[m.group(1)], content)
     
     # Handle [Label] format placeholders using placeholder_values mapping
     # Map common labels to their placeholder keys
@@ -2090,7 +3419,9 @@ def verify_document_ocr(file_data: str) -> bool:
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     token = credentials.credentials
-    return verify_jwt_token(token)
+    user = verify_jwt_token(token)
+    presence.mark(user.get('user_id'))
+    return user
 
 async def get_current_user_optional(
     authorization: Optional[str] = Header(None)
@@ -2100,35 +3431,464 @@ async def get_current_user_optional(
         return None
     try:
         token = authorization.split(' ')[1]
-        return verify_jwt_token(token)
+        user = verify_jwt_token(token)
     except Exception:
         return None
+    presence.mark(user.get('user_id'))
+    return user
+
+async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Get current user and verify admin role"""
+    token = credentials.credentials
+    user = verify_jwt_token(token)
+    if user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    presence.mark(user.get('user_id'))
+    return user
+
+# ===== LOG SINK =====
+class LogSink:
+    """Buffers audit/user-action log documents and writes them with insert_many.
+    
+    Handlers only append to an in-memory queue; a background task flushes every
+    LOG_SINK_FLUSH_INTERVAL seconds or as soon as LOG_SINK_BATCH_SIZE records are
+    waiting. At most LOG_SINK_MAX_PENDING records are buffered - beyond that new
+    records are dropped and counted.
+    """
+    
+    def __init__(self, batch_size: int, flush_interval: float, max_pending: int):
+        from collections import deque
+        
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.queues = {"audit_logs": deque(), "user_logs": deque()}
+        self.stats = {name: {"written": 0, "dropped": 0, "failed": 0} for name in self.queues}
+        self._wakeup = None
+        self._task = None
+        self._stopping = False
+    
+    @property
+    def pending(self) -> int:
+        return sum(len(q) for q in self.queues.values())
+    
+    def enqueue(self, collection: str, doc: dict):
+        if self.pending >= self.max_pending:
+            self.stats[collection]["dropped"] += 1
+            return
+        self.queues[collection].append(doc)
+        if self._wakeup is not None and self.pending >= self.batch_size:
+            self._wakeup.set()
+    
+    async def flush(self):
+        """Write everything currently buffered (one insert_many per batch)"""
+        import asyncio
+        from pymongo.errors import BulkWriteError
+        
+        for collection, pending in self.queues.items():
+            while pending:
+                batch = [pending.popleft() for _ in range(min(self.batch_size, len(pending)))]
+                try:
+                    await db[collection].insert_many(batch, ordered=False)
+                    self.stats[collection]["written"] += len(batch)
+                except asyncio.CancelledError:
+                    # Cancelled mid-write: put the batch back so a later flush still writes it
+                    # (at worst a record already inserted is retried and rejected as a duplicate _id)
+                    pending.extendleft(reversed(batch))
+                    raise
+                except BulkWriteError as e:
+                    failed = len(e.details.get('writeErrors', []))
+                    self.stats[collection]["written"] += len(batch) - failed
+                    self.stats[collection]["failed"] += failed
+                except Exception as e:
+                    self.stats[collection]["failed"] += len(batch)
+                    logging.error(f"❌ Log sink: failed to write {len(batch)} {collection} records: {str(e)}")
+    
+    async def _run(self):
+        import asyncio
+        
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+    
+    def start(self):
+        import asyncio
+        
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_event_loop().create_task(self._run())
+    
+    async def stop(self):
+        """Stop the background task and write whatever is still buffered.
+        The task is asked to finish rather than cancelled, so an in-flight insert_many completes."""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+            self._stopping = False
+        await self.flush()
+    
+    def snapshot(self) -> dict:
+        return {"pending": self.pending, **{name: dict(stats) for name, stats in self.stats.items()}}
+
+log_sink = LogSink(LOG_SINK_BATCH_SIZE, LOG_SINK_FLUSH_INTERVAL, LOG_SINK_MAX_PENDING)
+
+# ===== PRESENCE =====
+class PresenceTracker:
+    """Online (last 15 min) and active (last 24 h) user counts without scanning user_logs.
+    
+    Every authenticated request calls mark(). Locally each user is kept in exactly
+    one minute bucket and one hour bucket (its latest), with a running count per
+    bucket, so local counts are a sum over 15 + 24 counters. Users newly seen in a
+    bucket are periodically $addToSet into db.presence ("m:<minute>" / "h:<hour>"
+    documents with a TTL), which merges workers: counts() unions at most 39 small
+    documents and caches the result for a few seconds.
+    """
+    
+    WINDOW_MINUTES = 15
+    ACTIVE_HOURS = 24
+    
+    def __init__(self, flush_interval: float):
+        from collections import defaultdict
+        
+        self.flush_interval = flush_interval
+        self.last_minute = {}
+        self.last_hour = {}
+        self.minute_counts = defaultdict(int)
+        self.hour_counts = defaultdict(int)
+        self.dirty = defaultdict(set)
+        self._cached = None
+        self._task = None
+    
+    def mark(self, user_id: str):
+        if not user_id:
+            return
+        minute = int(time.time() // 60)
+        if self.last_minute.get(user_id) == minute:
+            return
+        self._move(user_id, minute, self.last_minute, self.minute_counts, f"m:{minute}")
+        hour = minute // 60
+        if self.last_hour.get(user_id) != hour:
+            self._move(user_id, hour, self.last_hour, self.hour_counts, f"h:{hour}")
+    
+    def _move(self, user_id, bucket, last, counts, key):
+        previous = last.get(user_id)
+        if previous is not None:
+            counts[previous] -= 1
+        counts[bucket] += 1
+        last[user_id] = bucket
+        self.dirty[key].add(user_id)
+    
+    def local_counts(self) -> dict:
+        minute = int(time.time() // 60)
+        hour = minute // 60
+        return {
+            "online_users": sum(self.minute_counts.get(m, 0) for m in range(minute - self.WINDOW_MINUTES + 1, minute + 1)),
+            "active_users_24h": sum(self.hour_counts.get(h, 0) for h in range(hour - self.ACTIVE_HOURS + 1, hour + 1)),
+        }
+    
+    def prune(self):
+        """Forget users and buckets that fell out of both windows"""
+        minute = int(time.time() // 60)
+        oldest_minute = minute - self.WINDOW_MINUTES + 1
+        oldest_hour = minute // 60 - self.ACTIVE_HOURS + 1
+        for bucket in [b for b in self.minute_counts if b < oldest_minute]:
+            del self.minute_counts[bucket]
+        for bucket in [b for b in self.hour_counts if b < oldest_hour]:
+            del self.hour_counts[bucket]
+        for user_id in [u for u, b in self.last_minute.items() if b < oldest_minute]:
+            del self.last_minute[user_id]
+        for user_id in [u for u, b in self.last_hour.items() if b < oldest_hour]:
+            del self.last_hour[user_id]
+    
+    async def flush(self):
+        from pymongo import UpdateOne
+        
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, type(self.dirty)(set)
+        requests = []
+        for key, users in dirty.items():
+            kind, bucket = key.split(':')
+            bucket_end = (int(bucket) + 1) * (60 if kind == 'm' else 3600)
+            keep = self.WINDOW_MINUTES * 60 if kind == 'm' else self.ACTIVE_HOURS * 3600
+            requests.append(UpdateOne(
+                {"_id": key},
+                {"$addToSet": {"users": {"$each": list(users)}},
+                 "$setOnInsert": {"expires_at": datetime.fromtimestamp(bucket_end + keep, timezone.utc)}},
+                upsert=True
+            ))
+        try:
+            await db.presence.bulk_write(requests, ordered=False)
+        except Exception as e:
+            logging.error(f"❌ Presence flush failed: {str(e)}")
+            for key, users in dirty.items():
+                self.dirty[key] |= users
+    
+    async def counts(self) -> dict:
+        """Online / 24h-active user counts merged across workers"""
+        now = time.time()
+        if self._cached and now - self._cached[0] < 5:
+            return self._cached[1]
+        minute = int(now // 60)
+        hour = minute // 60
+        minute_keys = [f"m:{m}" for m in range(minute - self.WINDOW_MINUTES + 1, minute + 1)]
+        hour_keys = [f"h:{h}" for h in range(hour - self.ACTIVE_HOURS + 1, hour + 1)]
+        try:
+            await self.flush()
+            online, active = set(), set()
+            async for doc in db.presence.find({"_id": {"$in": minute_keys + hour_keys}}):
+                (online if doc['_id'].startswith('m:') else active).update(doc.get('users', []))
+            result = {"online_users": len(online), "active_users_24h": len(active)}
+        except Exception as e:
+            logging.error(f"❌ Presence read failed, using local counts: {str(e)}")
+            result = self.local_counts()
+        self._cached = (now, result)
+        return result
+    
+    async def _run(self):
+        import asyncio
+        
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.prune()
+            await self.flush()
+    
+    async def start(self):
+        import asyncio
+        
+        try:
+            await db.presence.create_index("expires_at", expireAfterSeconds=0)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not create presence TTL index: {str(e)}")
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+    
+    async def stop(self):
+        import asyncio
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+presence = PresenceTracker(PRESENCE_FLUSH_INTERVAL)
+
+# ===== SYSTEM METRICS SAMPLER =====
+ERROR_LOG_PATHS = [
+    '/var/log/supervisor/backend.err.log',
+    '/var/log/backend.err.log',
+    'backend.err.log'
+]
+
+def _empty_system_snapshot() -> dict:
+    return {
+        "status": "healthy" if PSUTIL_AVAILABLE else "limited",
+        "cpu_percent": 0,
+        "memory": {"total_gb": 0, "used_gb": 0, "available_gb": 0, "percent": 0},
+        "disk": {"total_gb": 0, "used_gb": 0, "free_gb": 0, "percent": 0},
+        "uptime": {"days": 0, "hours": 0, "total_seconds": 0},
+        "network": None,
+        "database": {"size_mb": 0, "collections": 0, "indexes": 0},
+        "active_users_24h": 0,
+        "online_users": 0,
+        "recent_errors": []
+    }
+
+def _read_error_tail(max_bytes: int = 64 * 1024) -> List[str]:
+    """Last ERROR/Exception lines of the backend error log (reads only the file tail)"""
+    for log_path in ERROR_LOG_PATHS:
+        try:
+            with open(log_path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - max_bytes))
+                error_lines = f.read().decode('utf-8', errors='replace').splitlines()[-100:]
+            return [line.strip() for line in error_lines if 'ERROR' in line or 'Exception' in line][-20:]
+        except (FileNotFoundError, PermissionError):
+            continue
+    return []
+
+def _sample_host_metrics(previous_net: Optional[dict], interval: float) -> dict:
+    """Blocking psutil part of a sample - runs in the default executor"""
+    sample = {}
+    if not (PSUTIL_AVAILABLE and psutil):
+        return sample
+    try:
+        # interval=None: utilisation since the previous call, never sleeps
+        sample["cpu_percent"] = psutil.cpu_percent(interval=None) or 0
+    except Exception:
+        pass
+    try:
+        memory = psutil.virtual_memory()
+        sample["memory"] = {
+            "total_gb": round(memory.total / (1024**3), 2),
+            "used_gb": round(memory.used / (1024**3), 2),
+            "available_gb": round(memory.available / (1024**3), 2),
+            "percent": memory.percent
+        }
+    except Exception:
+        pass
+    try:
+        disk = psutil.disk_usage('/')
+        sample["disk"] = {
+            "total_gb": round(disk.total / (1024**3), 2),
+            "used_gb": round(disk.used / (1024**3), 2),
+            "free_gb": round(disk.free / (1024**3), 2),
+            "percent": disk.percent
+        }
+    except Exception:
+        pass
+    try:
+        uptime_seconds = time.time() - psutil.boot_time()
+        sample["uptime"] = {
+            "days": int(uptime_seconds // 86400),
+            "hours": int((uptime_seconds % 86400) // 3600),
+            "total_seconds": int(uptime_seconds)
+        }
+    except Exception:
+        pass
+    try:
+        net_io = psutil.net_io_counters()
+        network = {
+            "bytes_sent": net_io.bytes_sent,
+            "bytes_recv": net_io.bytes_recv,
+            "packets_sent": net_io.packets_sent,
+            "packets_recv": net_io.packets_recv
+        }
+        if previous_net:
+            network["sent_per_sec"] = round(max(0, net_io.bytes_sent - previous_net["bytes_sent"]) / interval)
+            network["recv_per_sec"] = round(max(0, net_io.bytes_recv - previous_net["bytes_recv"]) / interval)
+        sample["network"] = network
+    except Exception:
+        pass
+    return sample
+
+class SystemMetricsSampler:
+    """Collects system metrics on a fixed interval so the admin endpoint never blocks.
+    
+    Host metrics and the error-log tail are read in the default executor, dbStats
+    runs every DB_STATS_EVERY samples. The latest snapshot is served as-is and a
+    compact point per sample is kept in a fixed-size ring buffer for history charts.
+    """
+    
+    DB_STATS_EVERY = 6
+    
+    def __init__(self, interval: float, history_seconds: int):
+        from collections import deque
+        
+        self.interval = interval
+        self.history = deque(maxlen=max(1, int(history_seconds // interval)))
+        self.latest = None
+        self._samples = 0
+        self._task = None
+    
+    async def sample(self):
+        import asyncio
+        
+        loop = asyncio.get_event_loop()
+        previous = self.latest or _empty_system_snapshot()
+        snapshot = dict(previous)
+        try:
+            snapshot.update(await loop.run_in_executor(
+                None, _sample_host_metrics, previous.get("network"), self.interval
+            ))
+        except Exception as e:
+            logging.error(f"❌ Host metrics sample failed: {str(e)}")
+        try:
+            snapshot["recent_errors"] = await loop.run_in_executor(None, _read_error_tail)
+        except Exception:
+            pass
+        if self._samples % self.DB_STATS_EVERY == 0:
+            try:
+                db_stats = await db.command("dbStats")
+                snapshot["database"] = {
+                    "size_mb": round(db_stats.get('dataSize', 0) / (1024**2), 2),
+                    "collections": db_stats.get('collections', 0),
+                    "indexes": db_stats.get('indexes', 0)
+                }
+            except Exception:
+                pass
+        try:
+            snapshot.update(await presence.counts())
+        except Exception:
+            pass
+        snapshot["sampled_at"] = datetime.now(timezone.utc).isoformat()
+        self._samples += 1
+        self.latest = snapshot
+        network = snapshot.get("network") or {}
+        self.history.append({
+            "t": snapshot["sampled_at"],
+            "cpu": snapshot["cpu_percent"],
+            "memory": snapshot["memory"]["percent"],
+            "disk": snapshot["disk"]["percent"],
+            "sent_per_sec": network.get("sent_per_sec", 0),
+            "recv_per_sec": network.get("recv_per_sec", 0),
+            "online": snapshot["online_users"]
+        })
+        return snapshot
+    
+    def history_window(self, seconds: int) -> List[dict]:
+        points = max(0, int(seconds // self.interval))
+        if points == 0:
+            return []
+        return list(self.history)[-points:]
+    
+    async def _run(self):
+        import asyncio
+        
+        while True:
+            try:
+                await self.sample()
+            except Exception as e:
+                logging.error(f"❌ Metrics sampler error: {str(e)}")
+            await asyncio.sleep(self.interval)
+    
+    def start(self):
+        import asyncio
+        
+        if self._task is None:
+            self._task = asyncio.get_event_loop().create_task(self._run())
+    
+    async def stop(self):
+        import asyncio
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
 
-async def get_current_admin(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    """Get current user and verify admin role"""
-    token = credentials.credentials
-    user = verify_jwt_token(token)
-    if user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
-    return user
+metrics_sampler = SystemMetricsSampler(METRICS_SAMPLE_INTERVAL, METRICS_HISTORY_SECONDS)
 
 async def log_audit(action: str, contract_id: str = None, user_id: str = None, details: str = None, ip: str = None):
+    """Queue an audit record (written in the background by log_sink)"""
     log = AuditLog(action=action, contract_id=contract_id, user_id=user_id, details=details, ip_address=ip)
     doc = log.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    await db.audit_logs.insert_one(doc)
+    log_sink.enqueue("audit_logs", doc)
 
 async def log_user_action(user_id: str, action: str, details: str = None, ip: str = None, metadata: dict = None):
-    """Enhanced logging for user actions"""
+    """Enhanced logging for user actions (queued, written in the background by log_sink)"""
     log_entry = {
         "user_id": user_id,
         "action": action,
         "details": details,
         "ip_address": ip,
         "metadata": metadata or {},
-        "timestamp": datetime.now(timezone.utc).isoformat()
+        "timestamp": datetime.now(timezone.utc)
     }
-    await db.user_logs.insert_one(log_entry)
+    log_sink.enqueue("user_logs", log_entry)
 
 # ===== AUTH ROUTES =====
 @api_router.post("/auth/check-user-exists")
@@ -2151,7 +3911,7 @@ async def check_user_exists(data: dict):
     # Clean up expired/unverified pending registrations before checking
     # This allows users to re-register if they didn't complete verification
     from datetime import datetime, timezone
-    now = datetime.now(timezone.utc).isoformat()
+    now = datetime.now(timezone.utc)
     
     if email:
         # Delete expired or old unverified registrations for this email
@@ -2177,7 +3937,7 @@ async def register(user_data: UserCreate):
         await db.registrations.delete_one({"email": user_data.email})
     
     # Hash password
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await hash_password(user_data.password)
     
     # Create temporary registration record
     registration = Registration(
@@ -2192,8 +3952,6 @@ async def register(user_data: UserCreate):
     )
     
     registration_doc = registration.model_dump()
-    registration_doc['created_at'] = registration_doc['created_at'].isoformat()
-    registration_doc['expires_at'] = registration_doc['expires_at'].isoformat()
     
     await db.registrations.insert_one(registration_doc)
     
@@ -2219,14 +3977,19 @@ async def login(credentials: UserLogin, request: Request):
         raise HTTPException(status_code=403, detail="Аккаунт деактивирован. Обратитесь к администратору.")
     
     # Verify password
-    if not verify_password(credentials.password, user_doc['password']):
+    if not await verify_password(credentials.password, user_doc['password']):
         await log_user_action(user_doc['id'], "login_failed", "Wrong password", request.client.host)
         raise HTTPException(status_code=401, detail="Неверный пароль")
     
+    # Upgrade the hash transparently when BCRYPT_ROUNDS has changed
+    if password_needs_rehash(user_doc['password']):
+        await db.users.update_one(
+            {"id": user_doc['id']},
+            {"$set": {"password": await hash_password(credentials.password)}}
+        )
+    
     # Convert to User model
     user_doc.pop('password', None)
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
     # Set role based on is_admin flag
     if user_doc.get('is_admin'):
@@ -2247,8 +4010,6 @@ async def get_me(current_user: dict = Depends(get_current_user)):
     user_doc = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0, "password": 0})
     if not user_doc:
         raise HTTPException(status_code=404, detail="User not found")
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     return User(**user_doc)
 
 
@@ -2282,8 +4043,6 @@ async def update_me(
     
     # Get updated user
     updated_user = await db.users.find_one({"id": current_user['user_id']}, {"_id": 0, "password": 0})
-    if isinstance(updated_user.get('created_at'), str):
-        updated_user['created_at'] = datetime.fromisoformat(updated_user['created_at'])
     return User(**updated_user)
 
 @api_router.get("/auth/me/stats")
@@ -2338,11 +4097,11 @@ async def change_password(
         raise HTTPException(status_code=404, detail="User not found")
     
     # Verify old password
-    if not verify_password(change_pwd.old_password, user_doc['password']):
+    if not await verify_password(change_pwd.old_password, user_doc['password']):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Hash new password
-    new_password_hash = hash_password(change_pwd.new_password)
+    new_password_hash = await hash_password(change_pwd.new_password)
     
     # Update password in database
     await db.users.update_one(
@@ -2442,13 +4201,7 @@ async def reset_password(request: ResetPassword):
         raise HTTPException(status_code=400, detail="Invalid or expired reset code")
     
     # Check if code is expired
-    expires_at = reset_doc.get('expires_at')
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
-    
-    # Ensure expires_at has timezone info (whether from string or datetime)
-    if isinstance(expires_at, datetime) and expires_at.tzinfo is None:
-        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    expires_at = as_utc(reset_doc.get('expires_at'))
     
     if datetime.now(timezone.utc) > expires_at:
         raise HTTPException(status_code=400, detail="Reset code has expired")
@@ -2459,7 +4212,7 @@ async def reset_password(request: ResetPassword):
         raise HTTPException(status_code=404, detail="User not found")
     
     # Hash new password
-    new_password_hash = hash_password(request.new_password)
+    new_password_hash = await hash_password(request.new_password)
     
     # Update password
     await db.users.update_one(
@@ -2608,9 +4361,7 @@ async def request_registration_otp(registration_id: str, method: str = "sms"):
         raise HTTPException(status_code=400, detail="Registration already verified")
     
     # Check if expired
-    expires_at = registration.get('expires_at')
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
+    expires_at = as_utc(registration.get('expires_at'))
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Registration expired. Please register again.")
     
@@ -2642,7 +4393,7 @@ async def request_registration_otp(registration_id: str, method: str = "sms"):
     # Store verification info
     update_data = {
         "verification_method": method,
-        "otp_requested_at": datetime.now(timezone.utc).isoformat()
+        "otp_requested_at": datetime.now(timezone.utc)
     }
     
     # Store OTP code for verification
@@ -2670,9 +4421,7 @@ async def verify_registration_otp(registration_id: str, otp_data: dict):
         raise HTTPException(status_code=400, detail="Registration already verified")
     
     # Check if expired
-    expires_at = registration.get('expires_at')
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
+    expires_at = as_utc(registration.get('expires_at'))
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Registration expired. Please register again.")
     
@@ -2693,7 +4442,7 @@ async def verify_registration_otp(registration_id: str, otp_data: dict):
     
     # OTP verified! Create user account
     # Generate unique user ID
-    unique_id = await generate_unique_user_id()
+    unique_id = generate_unique_user_id()
     
     user = User(
         id=unique_id,
@@ -2708,9 +4457,8 @@ async def verify_registration_otp(registration_id: str, otp_data: dict):
     
     user_doc = user.model_dump()
     user_doc['password'] = registration['password_hash']
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
     
-    await db.users.insert_one(user_doc)
+    user.id = await insert_with_unique_retry(db.users, user_doc, "id", generate_unique_user_id)
     
     # Mark registration as verified and delete it
     await db.registrations.delete_one({"id": registration_id})
@@ -2743,9 +4491,7 @@ async def get_registration_telegram_deep_link(registration_id: str):
         raise HTTPException(status_code=400, detail="Registration already verified")
     
     # Check if expired
-    expires_at = registration.get('expires_at')
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
+    expires_at = as_utc(registration.get('expires_at'))
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Registration expired. Please register again.")
     
@@ -2757,8 +4503,8 @@ async def get_registration_telegram_deep_link(registration_id: str):
         "registration_id": registration_id,
         "otp_code": otp_code,
         "method": "telegram",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
         "verified": False
     }
     
@@ -2804,9 +4550,7 @@ async def verify_registration_telegram_otp(registration_id: str, data: dict):
         raise HTTPException(status_code=404, detail="Telegram verification not found. Please request a new code.")
     
     # Check if expired
-    expires_at = verification.get('expires_at')
-    if isinstance(expires_at, str):
-        expires_at = datetime.fromisoformat(expires_at)
+    expires_at = as_utc(verification.get('expires_at'))
     if expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=400, detail="Verification expired. Please request a new code.")
     
@@ -2823,7 +4567,7 @@ async def verify_registration_telegram_otp(registration_id: str, data: dict):
     
     # Create user account
     # Generate unique user ID
-    unique_id = await generate_unique_user_id()
+    unique_id = generate_unique_user_id()
     
     user = User(
         id=unique_id,
@@ -2838,9 +4582,8 @@ async def verify_registration_telegram_otp(registration_id: str, data: dict):
     
     user_doc = user.model_dump()
     user_doc['password'] = registration['password_hash']
-    user_doc['created_at'] = user_doc['created_at'].isoformat()
     
-    await db.users.insert_one(user_doc)
+    user.id = await insert_with_unique_retry(db.users, user_doc, "id", generate_unique_user_id)
     
     # Delete registration
     await db.registrations.delete_one({"id": registration_id})
@@ -2883,18 +4626,25 @@ async def create_contract(contract_data: ContractCreate, current_user: dict = De
             detail=f"Contract limit reached. You have signed {signed_contract_count}/{contract_limit} contracts. Please upgrade your subscription."
         )
     
-    # For contract numbering, count ALL contracts (not just signed)
-    total_contract_count = await db.contracts.count_documents({"creator_id": current_user['user_id']})
-    contract_num = total_contract_count + 1
+    # Per-user sequence; seeded from ALL existing contracts (not just signed) on first use
+    contract_num = await sequences.next(
+        "contract_number", current_user['user_id'],
+        seed=lambda: db.contracts.count_documents({"creator_id": current_user['user_id']})
+    )
     
     # Always start with 0, then the number: 01, 02, 03...09, 010, 011
     contract_number = f"0{contract_num}"
     
-    # Generate unique contract code
+    # Unique contract code; collisions are caught by the unique index on insert
     contract_code = generate_contract_code()
-    # Ensure uniqueness (very rare collision, but check anyway)
-    while await db.contracts.find_one({"contract_code": contract_code}):
-        contract_code = generate_contract_code()
+    
+    # Pin the template version the contract is based on
+    template_version = None
+    if contract_data.template_id:
+        template_version = contract_data.template_version
+        if template_version is None:
+            template = await template_catalog.get(contract_data.template_id)
+            template_version = template.get('version') if template else None
     
     contract = Contract(
         title=contract_data.title,
@@ -2904,6 +4654,7 @@ async def create_contract(contract_data: ContractCreate, current_user: dict = De
         content_type=contract_data.content_type,
         creator_id=current_user['user_id'],
         template_id=contract_data.template_id,  # Template ID if created from template
+        template_version=template_version,  # Pinned template version
         placeholder_values=contract_data.placeholder_values or {},  # Placeholder values
         contract_number=contract_number,  # Sequential number with leading 0
         contract_code=contract_code,  # Unique code like ABC-1234
@@ -2930,20 +4681,14 @@ async def create_contract(contract_data: ContractCreate, current_user: dict = De
     )
     
     doc = contract.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    doc['updated_at'] = doc['updated_at'].isoformat()
-    
-    print(f"🔥 CREATE CONTRACT: ID={contract.id}, Code={contract_code}, Title={contract_data.title}")
-    logging.info(f"🔥 CREATE CONTRACT: ID={contract.id}, Code={contract_code}")
+    # Template-based: store only the difference to the pinned template version
+    compaction_base = await _compaction_base(doc)
+    if compaction_base:
+        compact_contract_doc(doc, compaction_base)
     
-    result = await db.contracts.insert_one(doc)
-    print(f"🔥 INSERT RESULT: inserted_id={result.inserted_id}")
-    logging.info(f"🔥 INSERT RESULT: inserted_id={result.inserted_id}")
-    
-    # Verify contract was saved
-    saved = await db.contracts.find_one({"id": contract.id})
-    print(f"🔥 VERIFY SAVED: {bool(saved)}")
-    logging.info(f"🔥 VERIFY SAVED: {bool(saved)}")
+    contract_code = await insert_with_unique_retry(db.contracts, doc, "contract_code", generate_contract_code)
+    contract.contract_code = contract_code
+    logger.info("📝 Contract created: id=%s code=%s", contract.id, contract_code)
     
     # Log contract creation
     if contract_data.template_id:
@@ -2961,6 +4706,258 @@ async def create_contract(contract_data: ContractCreate, current_user: dict = De
     
     return contract
 
+class BulkContractRow(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    title: Optional[str] = None
+    signer_name: Optional[str] = None
+    signer_phone: Optional[str] = None
+    signer_email: Optional[str] = None
+    placeholder_values: dict = {}
+
+class BulkContractCreate(BaseModel):
+    template_id: str
+    template_version: Optional[int] = None
+    rows: List[BulkContractRow] = []
+    # Alternative to rows: header line of placeholder keys and/or title/signer_* columns
+    csv: Optional[str] = None
+
+BULK_ROW_FIELDS = ("title", "signer_name", "signer_phone", "signer_email")
+
+def parse_bulk_csv(text: str, template: dict) -> List[BulkContractRow]:
+    """CSV (comma, semicolon or tab separated, as Excel exports it) -> rows; unknown columns are a 400"""
+    import csv
+    import io
+    
+    text = text.lstrip('\ufeff')
+    try:
+        dialect = csv.Sniffer().sniff(text.split('\n', 1)[0], delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.DictReader(io.StringIO(text), dialect=dialect)
+    columns = [c.strip() for c in (reader.fieldnames or [])]
+    placeholders = template.get('placeholders') or {}
+    unknown = [c for c in columns if c not in placeholders and c not in BULK_ROW_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown CSV columns: {', '.join(unknown)}")
+    rows = []
+    for record in reader:
+        record = {(k or '').strip(): (v or '').strip() for k, v in record.items() if k}
+        if not any(record.values()):
+            continue
+        rows.append(BulkContractRow(
+            **{field: record.get(field) or None for field in BULK_ROW_FIELDS},
+            placeholder_values={k: v for k, v in record.items() if k in placeholders and v}
+        ))
+    return rows
+
+def validate_bulk_row(row: BulkContractRow, template: dict) -> List[str]:
+    """Problems with one row; dates are normalised to ISO in place (DD.MM.YYYY is accepted too)"""
+    placeholders = template.get('placeholders') or {}
+    values = row.placeholder_values
+    errors = [f"Unknown placeholder: {key}" for key in values if key not in placeholders]
+    for key, config in placeholders.items():
+        config = config or {}
+        value = values.get(key)
+        if value in (None, ''):
+            if config.get('required') and config.get('owner', 'landlord') == 'landlord' and config.get('type') != 'calculated':
+                errors.append(f"Missing required placeholder: {key}")
+            continue
+        value = str(value).strip()
+        if config.get('type') == 'date':
+            for pattern in ('%Y-%m-%d', '%d.%m.%Y'):
+                try:
+                    values[key] = datetime.strptime(value, pattern).date().isoformat()
+                    break
+                except ValueError:
+                    continue
+            else:
+                errors.append(f"Invalid date for {key}: {value}")
+        elif config.get('type') == 'number':
+            try:
+                float(value.replace(' ', '').replace(',', '.'))
+            except ValueError:
+                errors.append(f"Invalid number for {key}: {value}")
+    return errors
+
+def build_bulk_contract(row: BulkContractRow, template_id: str, template: dict, base: Optional[dict],
+                        number: int, code: str, user: dict, current_user: dict) -> dict:
+    """Contract document for one bulk row. Landlord placeholders are filled into every language;
+    against the pinned snapshot (base) the texts are stored as deltas built straight from the slots."""
+    placeholders = template.get('placeholders') or {}
+    values = row.placeholder_values
+    contract_number = f"0{number}"
+    
+    # Signer details from Party B placeholders unless given explicitly (same rules as the create form)
+    signer = {'signer_name': row.signer_name, 'signer_phone': row.signer_phone, 'signer_email': row.signer_email}
+    for key, value in values.items():
+        config = placeholders.get(key) or {}
+        if config.get('owner') not in ['signer', 'tenant'] or not value:
+            continue
+        if config.get('type') == 'phone':
+            signer['signer_phone'] = signer['signer_phone'] or value
+        elif config.get('type') == 'email':
+            signer['signer_email'] = signer['signer_email'] or value
+        elif config.get('type') == 'text' and any(word in key.lower() for word in ('name', 'фио', 'tenant', 'наниматель')):
+            signer['signer_name'] = signer['signer_name'] or value
+    
+    filled = landlord_placeholder_values(template, values)
+    source = base or template
+    contract = Contract(
+        title=row.title or f"{template.get('title') or 'Договор'} № {contract_number}",
+        content=fill_placeholders(source.get('content') or '', filled),
+        content_kk=fill_placeholders(source.get('content_kk'), filled),
+        content_en=fill_placeholders(source.get('content_en'), filled),
+        content_type=template.get('content_type', 'plain'),
+        creator_id=current_user['user_id'],
+        source_type='template',
+        template_id=template_id,
+        template_version=template.get('version'),
+        placeholder_values=values,
+        contract_number=contract_number,
+        contract_code=code,
+        signer_name=signer['signer_name'] or "",
+        signer_phone=signer['signer_phone'] or "",
+        signer_email=signer['signer_email'],
+        landlord_email=current_user.get('email'),
+        landlord_full_name=user.get('full_name', ''),
+        landlord_iin_bin=user.get('iin', ''),
+        party_a_role=template.get('party_a_role') or 'Сторона А',
+        party_a_role_kk=template.get('party_a_role_kk') or 'А жағы',
+        party_a_role_en=template.get('party_a_role_en') or 'Party A',
+        party_b_role=template.get('party_b_role') or 'Сторона Б',
+        party_b_role_kk=template.get('party_b_role_kk') or 'Б жағы',
+        party_b_role_en=template.get('party_b_role_en') or 'Party B'
+    )
+    doc = contract.model_dump()
+    if base is not None:
+        deltas = {}
+        for field in ('content', 'content_kk', 'content_en'):
+            if not base.get(field) or not doc.get(field):
+                continue
+            delta = placeholder_delta(base[field], filled)
+            if _delta_size(delta) <= COMPACT_MAX_DELTA_RATIO * len(doc[field].encode('utf-8')):
+                deltas[field] = delta
+                doc.pop(field)
+        if deltas:
+            doc['content_delta'] = deltas
+    return doc
+
+async def insert_bulk_contracts(docs: List[dict]) -> dict:
+    """insert_many in chunks; codes already taken (probed up front or rejected by the unique
+    index) are re-rolled and retried. Returns {index: error} for documents not inserted."""
+    from pymongo.errors import BulkWriteError
+    
+    failed = {}
+    for start in range(0, len(docs), BULK_INSERT_CHUNK):
+        pending = list(range(start, min(start + BULK_INSERT_CHUNK, len(docs))))
+        for attempt in range(UNIQUE_INSERT_ATTEMPTS):
+            taken = set(await db.contracts.distinct(
+                "contract_code", {"contract_code": {"$in": [docs[i]['contract_code'] for i in pending]}}
+            ))
+            for i in pending:
+                if docs[i]['contract_code'] in taken:
+                    docs[i]['contract_code'] = generate_contract_code()
+            try:
+                await db.contracts.insert_many([docs[i] for i in pending], ordered=False)
+                pending = []
+            except BulkWriteError as e:
+                retry = []
+                for error in e.details.get('writeErrors', []):
+                    i = pending[error['index']]
+                    if error.get('code') == 11000 and 'contract_code' in (error.get('keyValue') or {}):
+                        docs[i]['contract_code'] = generate_contract_code()
+                        retry.append(i)
+                    else:
+                        failed[i] = error.get('errmsg', 'Insert failed')
+                pending = retry
+            if not pending:
+                break
+        for i in pending:
+            failed[i] = "Could not allocate a unique contract_code"
+    return failed
+
+@api_router.post("/contracts/bulk")
+async def create_contracts_bulk(data: BulkContractCreate, current_user: dict = Depends(get_current_user)):
+    """Create many contracts from one template: rows (JSON) or a CSV of placeholder values and signer fields.
+    Invalid rows are reported and skipped; the rest are created as drafts. Returns one result per row."""
+    import time as time_module
+    
+    started = time_module.perf_counter()
+    user_id = current_user['user_id']
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "iin": 1, "full_name": 1, "contract_limit": 1}) or {}
+    
+    # Limit is checked once for the whole batch - it counts SIGNED contracts, like create_contract
+    signed_contract_count = await db.contracts.count_documents({"creator_id": user_id, "status": "signed"})
+    contract_limit = user.get('contract_limit', 3)
+    if signed_contract_count >= contract_limit:
+        raise HTTPException(
+            status_code=403,
+            detail=f"Contract limit reached. You have signed {signed_contract_count}/{contract_limit} contracts. Please upgrade your subscription."
+        )
+    
+    template = await template_catalog.get(data.template_id, data.template_version)
+    if not template or (data.template_version is None and not template.get('is_active')):
+        raise HTTPException(status_code=404, detail="Template not found")
+    assigned_users = template.get('assigned_users') or []
+    if assigned_users and user_id not in assigned_users:
+        raise HTTPException(status_code=403, detail="This template is not available to you")
+    
+    rows = list(data.rows)
+    if data.csv:
+        rows += parse_bulk_csv(data.csv, template)
+    if not rows:
+        raise HTTPException(status_code=400, detail="No rows to create")
+    if len(rows) > BULK_CONTRACTS_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {BULK_CONTRACTS_MAX} contracts per request")
+    
+    results = [None] * len(rows)
+    valid = []
+    for index, row in enumerate(rows):
+        errors = validate_bulk_row(row, template)
+        if errors:
+            results[index] = {"row": index, "ok": False, "errors": errors}
+        else:
+            valid.append(index)
+    
+    docs = []
+    if valid:
+        # One atomic $inc reserves consecutive numbers for the whole batch
+        first_number = await sequences.reserve(
+            "contract_number", user_id, len(valid),
+            seed=lambda: db.contracts.count_documents({"creator_id": user_id})
+        )
+        version = template.get('version')
+        base = await template_catalog.get_version(data.template_id, version) if version is not None else None
+        codes = set()
+        while len(codes) < len(valid):
+            codes.add(generate_contract_code())
+        docs = [
+            build_bulk_contract(rows[index], data.template_id, template, base, first_number + offset, code, user, current_user)
+            for offset, (index, code) in enumerate(zip(valid, codes))
+        ]
+        failed = await insert_bulk_contracts(docs)
+        
+        for offset, index in enumerate(valid):
+            doc = docs[offset]
+            if offset in failed:
+                results[index] = {"row": index, "ok": False, "errors": [failed[offset]]}
+                continue
+            results[index] = {"row": index, "ok": True, "id": doc['id'],
+                              "contract_number": doc['contract_number'], "contract_code": doc['contract_code']}
+            await log_audit("contract_created_from_template", contract_id=doc['id'], user_id=user_id,
+                           details=f"Contract created from template {data.template_id} (bulk)")
+    
+    created = sum(1 for result in results if result["ok"])
+    await log_user_action(
+        user_id,
+        "contracts_bulk_created",
+        f"Создано договоров: {created} из {len(rows)} (шаблон {template.get('title')})",
+        metadata={"template_id": data.template_id, "created": created, "failed": len(rows) - created}
+    )
+    duration = time_module.perf_counter() - started
+    logger.info("📝 Bulk contracts: %s/%s created in %.2fs", created, len(rows), duration)
+    return {"created": created, "failed": len(rows) - created, "duration_ms": round(duration * 1000, 1), "results": results}
+
 @api_router.get("/contracts/limit/info")
 async def get_contract_limit_info(current_user: dict = Depends(get_current_user)):
     user = await db.users.find_one({"id": current_user['user_id']})
@@ -2979,69 +4976,220 @@ async def get_contract_limit_info(current_user: dict = Depends(get_current_user)
     }
 
 @api_router.get("/contracts", response_model=List[Contract])
-async def get_contracts(current_user: dict = Depends(get_current_user)):
+async def get_contracts(summary: bool = False, current_user: dict = Depends(get_current_user)):
     # Filter out deleted contracts
-    contracts = await db.contracts.find({
+    query = {
         "creator_id": current_user['user_id'],
         "$or": [
             {"deleted": {"$exists": False}},  # Old contracts without deleted field
             {"deleted": False}  # New contracts that are not deleted
         ]
-    }, {"_id": 0}).to_list(1000)
-    for c in contracts:
-        if isinstance(c.get('created_at'), str):
-            c['created_at'] = datetime.fromisoformat(c['created_at'])
-        if isinstance(c.get('updated_at'), str):
-            c['updated_at'] = datetime.fromisoformat(c['updated_at'])
-    return contracts
+    }
+    if summary:
+        # Slim rows: texts are neither read from Mongo nor materialized
+        contracts = await db.contracts.find(query, CONTRACT_SUMMARY_PROJECTION).to_list(1000)
+        return FastJSONResponse(construct_rows(ContractSummary, contracts))
+    contracts = await db.contracts.find(query, {"_id": 0}).to_list(1000)
+    await materialize_contracts(contracts)
+    # Documents are our own writes: shape them like Contract without re-validating 1000 wide models
+    return FastJSONResponse(construct_rows(Contract, contracts))
+
+def encode_sync_cursor(at: datetime, contract_id: str = "") -> str:
+    """Opaque position in a user's (updated_at, id) order"""
+    return base64.urlsafe_b64encode(f"{int(at.timestamp() * 1000)}:{contract_id}".encode('utf-8')).decode('ascii')
+
+def decode_sync_cursor(cursor: str):
+    try:
+        millis, contract_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split(":", 1)
+        return datetime.fromtimestamp(int(millis) / 1000, timezone.utc), contract_id
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@api_router.get("/contracts/changes")
+async def get_contract_changes(
+    since: Optional[str] = None,
+    limit: int = CONTRACT_CHANGES_PAGE,
+    current_user: dict = Depends(get_current_user)
+):
+    """Delta sync for the dashboard: contracts created, updated or deleted after `since`.
+    
+    Without `since` (or with one older than the tombstone retention) it is a full sync
+    and `reset` tells the client to replace its cache. Rows are ContractSummary; deleted
+    contracts (soft or hard) come back as ids. Repeat with the returned cursor while
+    `has_more`; the final cursor steps back CONTRACT_CHANGES_OVERLAP seconds, so a few rows
+    may arrive twice - applying them is idempotent.
+    """
+    user_id = current_user['user_id']
+    limit = max(1, min(limit, CONTRACT_CHANGES_PAGE))
+    now = datetime.now(timezone.utc)
+    since_at, since_id = decode_sync_cursor(since) if since else (None, "")
+    if since_at is not None and since_at < now - timedelta(days=CONTRACT_TOMBSTONE_DAYS):
+        # Hard deletes of that period may have expired: start over
+        since_at = None
+    final_cursor = encode_sync_cursor(now - timedelta(seconds=CONTRACT_CHANGES_OVERLAP))
+    
+    if since_at is None:
+        rows = await db.contracts.find({
+            "creator_id": user_id,
+            "$or": [{"deleted": {"$exists": False}}, {"deleted": False}]
+        }, CONTRACT_SUMMARY_PROJECTION).to_list(1000)
+        return FastJSONResponse({"changed": construct_rows(ContractSummary, rows), "deleted": [],
+                                 "cursor": final_cursor, "has_more": False, "reset": True})
+    
+    rows = await db.contracts.find({
+        "creator_id": user_id,
+        "$or": [
+            {"updated_at": {"$gt": since_at}},
+            {"updated_at": since_at, "id": {"$gt": since_id}}
+        ]
+    }, CONTRACT_SUMMARY_PROJECTION).sort([("updated_at", 1), ("id", 1)]).limit(limit + 1).to_list(limit + 1)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    
+    deleted = [row["id"] for row in rows if row.get("deleted")]
+    tombstones = await db.contract_tombstones.find(
+        {"creator_id": user_id, "deleted_at": {"$gte": since_at}},
+        {"_id": 0, "contract_id": 1}
+    ).to_list(1000)
+    deleted += [t["contract_id"] for t in tombstones]
+    
+    return FastJSONResponse({
+        "changed": construct_rows(ContractSummary, [row for row in rows if not row.get("deleted")]),
+        "deleted": deleted,
+        "cursor": encode_sync_cursor(as_utc(rows[-1]["updated_at"]), rows[-1]["id"]) if has_more else final_cursor,
+        "has_more": has_more,
+        "reset": False
+    })
+
+VERIFY_PUBLIC_FIELDS = ("id", "title", "contract_code", "status", "created_at", "approved_at",
+                        "landlord_signature_hash", "signer_name")
+
+class VerificationCache:
+    """Per-worker LRU/TTL cache of the public verification payloads.
+    
+    One entry per contract holds both the contract and the signature part, loaded
+    with two lean projections (no texts, no archive rehydration). Signed contracts
+    never change, so they live VERIFY_CACHE_TTL_SIGNED; everything else, including
+    unknown ids, VERIFY_CACHE_TTL. Writes on this worker invalidate right away,
+    other workers catch up within the TTL.
+    """
+    
+    def __init__(self, size: int, ttl: float, signed_ttl: float):
+        from collections import OrderedDict
+        
+        self.size = size
+        self.ttl = ttl
+        self.signed_ttl = signed_ttl
+        self._entries = OrderedDict()  # contract_id -> (expires_monotonic, entry)
+        self.hits = 0
+        self.misses = 0
+    
+    async def get(self, contract_id: str) -> dict:
+        cached = self._entries.get(contract_id)
+        if cached and cached[0] > time.monotonic():
+            self._entries.move_to_end(contract_id)
+            self.hits += 1
+            return cached[1]
+        self.misses += 1
+        entry = await self._load(contract_id)
+        self._entries[contract_id] = (time.monotonic() + entry["ttl"], entry)
+        self._entries.move_to_end(contract_id)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+        return entry
+    
+    async def _load(self, contract_id: str) -> dict:
+        import asyncio
+        
+        contract, signature = await asyncio.gather(
+            db.contracts.find_one({"id": contract_id}, {"_id": 0, "updated_at": 1, **{f: 1 for f in VERIFY_PUBLIC_FIELDS}}),
+            db.signatures.find_one({"contract_id": contract_id}, {"_id": 0, "signature_hash": 1, "created_at": 1}),
+        )
+        signature_part = {
+            "signature_hash": (signature or {}).get("signature_hash"),
+            "created_at": (signature or {}).get("created_at")
+        }
+        if not contract:
+            return {"contract": None, "signature": signature_part, "signed": False, "ttl": self.ttl,
+                    "etag": weak_etag("verify", contract_id, None, signature_part["signature_hash"])}
+        public = {field: contract.get(field) for field in VERIFY_PUBLIC_FIELDS}
+        public["verified"] = contract.get("status") == "signed" and contract.get("landlord_signature_hash") is not None
+        return {
+            "contract": public,
+            "signature": signature_part,
+            "signed": public["verified"],
+            "ttl": self.signed_ttl if public["verified"] else self.ttl,
+            "etag": weak_etag("verify", contract_id, version_stamp(contract), signature_part["signature_hash"])
+        }
+    
+    def invalidate(self, contract_id: str):
+        self._entries.pop(contract_id, None)
+    
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else None}
+
+verification_cache = VerificationCache(VERIFY_CACHE_SIZE, VERIFY_CACHE_TTL, VERIFY_CACHE_TTL_SIGNED)
+
+async def verification_response(contract_id: str, request: Request, response: Response, route: str):
+    """Cached verification entry, or a ready 304; sets edge-cache headers either way.
+    X-Accel-Expires drives nginx's proxy_cache, Cache-Control the browser."""
+    entry = await verification_cache.get(contract_id)
+    if entry["signed"]:
+        cache_control = f"public, max-age={VERIFY_BROWSER_MAX_AGE}"
+    else:
+        cache_control = "public, max-age=0, must-revalidate"
+    response.headers["X-Accel-Expires"] = str(int(entry["ttl"]))
+    not_modified = conditional_get(request, response, route, entry["etag"], cache_control)
+    if not_modified:
+        not_modified.headers["X-Accel-Expires"] = str(int(entry["ttl"]))
+    return entry, not_modified
 
 @api_router.get("/verify/{contract_id}")
-async def verify_contract_public(contract_id: str):
+async def verify_contract_public(contract_id: str, request: Request, response: Response):
     """Public endpoint for contract verification via QR code - no auth required"""
-    contract = await db.contracts.find_one({"id": contract_id}, {"_id": 0})
-    if not contract:
-        raise HTTPException(status_code=404, detail="Contract not found")
-    
+    entry, not_modified = await verification_response(contract_id, request, response, "verify")
+    if not entry["contract"]:
+        # Unknown ids are cached briefly too; the 404 keeps the short edge TTL
+        raise HTTPException(status_code=404, detail="Contract not found",
+                            headers={"Cache-Control": "public, max-age=0", "X-Accel-Expires": str(int(entry["ttl"]))})
+    if not_modified:
+        return not_modified
     # Return only safe public information
-    return {
-        "id": contract.get("id"),
-        "title": contract.get("title"),
-        "contract_code": contract.get("contract_code"),
-        "status": contract.get("status"),
-        "created_at": contract.get("created_at"),
-        "approved_at": contract.get("approved_at"),
-        "landlord_signature_hash": contract.get("landlord_signature_hash"),
-        "signer_name": contract.get("signer_name"),
-        "verified": contract.get("status") == "signed" and contract.get("landlord_signature_hash") is not None
-    }
+    return entry["contract"]
 
 @api_router.get("/verify/{contract_id}/signature")
-async def verify_contract_signature_public(contract_id: str):
+async def verify_contract_signature_public(contract_id: str, request: Request, response: Response):
     """Public endpoint for contract signature verification"""
-    signature = await db.signatures.find_one({"contract_id": contract_id}, {"_id": 0})
-    if not signature:
-        return {"signature_hash": None, "created_at": None}
-    
-    return {
-        "signature_hash": signature.get("signature_hash"),
-        "created_at": signature.get("created_at")
-    }
+    entry, not_modified = await verification_response(contract_id, request, response, "verify_signature")
+    return not_modified or entry["signature"]
+
+@api_router.get("/verify/{contract_id}/full")
+async def verify_contract_full_public(contract_id: str, request: Request, response: Response):
+    """Public: contract and signature verification in one call (what the QR page needs)"""
+    entry, not_modified = await verification_response(contract_id, request, response, "verify_full")
+    if not entry["contract"]:
+        raise HTTPException(status_code=404, detail="Contract not found",
+                            headers={"Cache-Control": "public, max-age=0", "X-Accel-Expires": str(int(entry["ttl"]))})
+    return not_modified or {"contract": entry["contract"], "signature": entry["signature"]}
 
 @api_router.get("/contracts/{contract_id}", response_model=Contract)
-async def get_contract(contract_id: str, current_user: dict = Depends(get_current_user)):
-    contract = await db.contracts.find_one({"id": contract_id}, {"_id": 0})
+async def get_contract(contract_id: str, request: Request, response: Response, current_user: dict = Depends(get_current_user)):
+    stamp = await db.contracts.find_one({"id": contract_id}, {"_id": 0, "updated_at": 1, "created_at": 1})
+    if stamp:
+        not_modified = conditional_get(request, response, "contract", weak_etag("contract", contract_id, version_stamp(stamp)))
+        if not_modified:
+            return not_modified
+    contract = await find_contract({"id": contract_id}, {"_id": 0})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
-    if isinstance(contract.get('created_at'), str):
-        contract['created_at'] = datetime.fromisoformat(contract['created_at'])
-    if isinstance(contract.get('updated_at'), str):
-        contract['updated_at'] = datetime.fromisoformat(contract['updated_at'])
     return Contract(**contract)
 
 @api_router.put("/contracts/{contract_id}")
 async def update_contract(contract_id: str, update_data: dict, current_user: dict = Depends(get_current_user)):
     """Update contract fields"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3053,54 +5201,30 @@ async def update_contract(contract_id: str, update_data: dict, current_user: dic
     if 'placeholder_values' in filtered_data and contract.get('template_id'):
         try:
             # Load template to get placeholder configs
-            template = await db.contract_templates.find_one({"id": contract['template_id']})
+            template = await template_for_contract(contract)
             if template and template.get('placeholders'):
-                content = contract.get('content', '')
-                placeholder_values = filtered_data['placeholder_values']
-                
                 # Replace ONLY placeholders that have values (keep empty ones as {{key}})
                 # КРИТИЧНО: НЕ заменяем плейсхолдеры стороны Б (owner=signer) при редактировании
-                for key, value in placeholder_values.items():
-                    if key in template['placeholders'] and value:  # Only replace if value is not empty
-                        config = template['placeholders'][key]
-                        
-                        # ИСПРАВЛЕНИЕ: Пропускаем signer плейсхолдеры
-                        owner = config.get('owner', 'landlord')
-                        if owner in ['signer', 'tenant']:
-                            print(f"⏭️ Skipping signer placeholder {key} in update_contract (owner={owner})")
-                            continue
-                        
-                        # Format dates to DD.MM.YYYY
-                        if config.get('type') == 'date':
-                            try:
-                                from datetime import datetime as dt
-                                date_obj = dt.fromisoformat(value.replace('Z', '+00:00'))
-                                value = date_obj.strftime('%d.%m.%Y')
-                            except:
-                                pass
-                        
-                        # Replace placeholder
-                        import re
-                        pattern = re.compile(f'{{{{\\s*{key}\\s*}}}}')
-                        content = pattern.sub(str(value), content)
+                values = landlord_placeholder_values(template, filtered_data['placeholder_values'])
                 
                 # Update content with replaced placeholders
-                filtered_data['content'] = content
+                filtered_data['content'] = fill_placeholders(contract.get('content') or '', values)
         except Exception as e:
-            print(f"Error replacing placeholders: {e}")
+            logger.error("Error replacing placeholders: %s", e)
     
     if filtered_data:
-        filtered_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+        filtered_data['updated_at'] = datetime.now(timezone.utc)
         await db.contracts.update_one(
             {"id": contract_id},
-            {"$set": filtered_data}
+            await contract_text_update(contract, filtered_data)
         )
+        await discard_contract_prerender(contract_id)
     
     return {"message": "Contract updated"}
 
 @api_router.post("/contracts/{contract_id}/send")
 async def send_contract(contract_id: str, current_user: dict = Depends(get_current_user)):
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3118,7 +5242,7 @@ async def send_contract(contract_id: str, current_user: dict = Depends(get_curre
         {"$set": {
             "status": "sent",
             "signature_link": signature_link,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
@@ -3130,7 +5254,6 @@ async def send_contract(contract_id: str, current_user: dict = Depends(get_curre
         otp_code=otp_code
     )
     sig_doc = signature.model_dump()
-    sig_doc['created_at'] = sig_doc['created_at'].isoformat()
     await db.signatures.insert_one(sig_doc)
     
     await log_audit("contract_sent", contract_id=contract_id, user_id=current_user['user_id'])
@@ -3144,19 +5267,15 @@ async def send_contract(contract_id: str, current_user: dict = Depends(get_curre
 
 @api_router.get("/contracts/{contract_id}/signature")
 async def get_signature(contract_id: str, current_user: dict = Depends(get_current_user)):
-    signature = await db.signatures.find_one({"contract_id": contract_id}, {"_id": 0})
+    signature = await find_signature({"contract_id": contract_id}, {"_id": 0})
     if not signature:
         return None
-    if isinstance(signature.get('created_at'), str):
-        signature['created_at'] = datetime.fromisoformat(signature['created_at'])
-    if isinstance(signature.get('signed_at'), str):
-        signature['signed_at'] = datetime.fromisoformat(signature['signed_at'])
     return signature
 
 @api_router.delete("/contracts/{contract_id}")
 async def delete_contract(contract_id: str, current_user: dict = Depends(get_current_user)):
     # Get contract first to check status
-    contract = await db.contracts.find_one({"id": contract_id, "creator_id": current_user['user_id']})
+    contract = await find_contract({"id": contract_id, "creator_id": current_user['user_id']})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3176,15 +5295,23 @@ async def delete_contract(contract_id: str, current_user: dict = Depends(get_cur
         result = await db.contracts.delete_one({"id": contract_id, "creator_id": current_user['user_id']})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Contract not found")
+        # Tombstone so synced dashboards learn about the delete (expires with CONTRACT_TOMBSTONE_DAYS)
+        await db.contract_tombstones.insert_one({
+            "contract_id": contract_id,
+            "creator_id": current_user['user_id'],
+            "deleted_at": datetime.now(timezone.utc)
+        })
         await log_audit("contract_deleted", contract_id=contract_id, user_id=current_user['user_id'])
         await log_user_action(current_user['user_id'], "contract_deleted", f"Удален договор {contract.get('contract_code')}")
     
+    await discard_contract_prerender(contract_id)
+    verification_cache.invalidate(contract_id)
     return {"message": "Contract deleted"}
 
 @api_router.post("/contracts/{contract_id}/upload-landlord-document")
 async def upload_landlord_document(contract_id: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
     """Upload landlord's ID/passport document for a contract"""
-    contract = await db.contracts.find_one({"id": contract_id, "creator_id": current_user['user_id']})
+    contract = await find_contract({"id": contract_id, "creator_id": current_user['user_id']})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3237,9 +5364,11 @@ async def upload_landlord_document(contract_id: str, file: UploadFile = File(...
         {"id": contract_id},
         {"$set": {
             "landlord_document_upload": file_data,
-            "landlord_document_filename": filename
+            "landlord_document_filename": filename,
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
+    await discard_contract_prerender(contract_id)
     
     await log_audit("landlord_document_uploaded", contract_id=contract_id, user_id=current_user['user_id'])
     
@@ -3248,16 +5377,12 @@ async def upload_landlord_document(contract_id: str, file: UploadFile = File(...
 # ===== SIGNING ROUTES (PUBLIC) =====
 @api_router.get("/sign/{contract_id}")
 async def get_contract_for_signing(contract_id: str):
-    contract = await db.contracts.find_one({"id": contract_id}, {"_id": 0})
+    contract = await find_contract({"id": contract_id}, {"_id": 0})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
-    if isinstance(contract.get('created_at'), str):
-        contract['created_at'] = datetime.fromisoformat(contract['created_at'])
-    if isinstance(contract.get('updated_at'), str):
-        contract['updated_at'] = datetime.fromisoformat(contract['updated_at'])
     
     # Get signature data (including document_upload if exists)
-    signature = await db.signatures.find_one({"contract_id": contract_id}, {"_id": 0})
+    signature = await find_signature({"contract_id": contract_id}, {"_id": 0})
     
     # If signature doesn't exist, create it automatically (for direct signing links)
     if not signature:
@@ -3270,7 +5395,7 @@ async def get_contract_for_signing(contract_id: str):
             # Получаем шаблон чтобы узнать владельцев полей
             template = None
             if contract.get('template_id'):
-                template = await db.templates.find_one({"id": contract['template_id']}, {"_id": 0})
+                template = await template_for_contract(contract)
             
             placeholder_values = contract.get('placeholder_values') or {}
             template_placeholders = template.get('placeholders', {}) if template else {}
@@ -3291,10 +5416,10 @@ async def get_contract_for_signing(contract_id: str):
                 
                 if not signer_phone and field_type == 'phone':
                     signer_phone = value
-                    print(f"🔧 Extracted signer_phone from placeholder_values[{key}] (owner={owner}): {signer_phone}")
+                    logger.debug("🔧 Extracted signer_phone from placeholder_values[%s] (owner=%s): %s", key, owner, signer_phone)
                 elif not signer_name and field_type == 'text' and ('name' in key.lower() or 'фио' in key.lower()):
                     signer_name = value
-                    print(f"🔧 Extracted signer_name from placeholder_values[{key}] (owner={owner}): {signer_name}")
+                    logger.debug("🔧 Extracted signer_name from placeholder_values[%s] (owner=%s): %s", key, owner, signer_name)
         
         # ИСПРАВЛЕНИЕ: Автоматическое создание signature для прямых ссылок
         initial_signature = {
@@ -3303,7 +5428,7 @@ async def get_contract_for_signing(contract_id: str):
             "signer_name": signer_name,
             "verification_method": None,
             "verified": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.signatures.insert_one(initial_signature)
         
@@ -3317,13 +5442,14 @@ async def get_contract_for_signing(contract_id: str):
             contract['signer_name'] = signer_name
             
         if updates:
+            updates['updated_at'] = datetime.now(timezone.utc)
             await db.contracts.update_one(
                 {"id": contract_id},
                 {"$set": updates}
             )
-            print(f"🔧 Updated contract with signer info: {updates}")
+            logger.debug("🔧 Updated contract with signer info: %s", updates)
         
-        signature = await db.signatures.find_one({"contract_id": contract_id}, {"_id": 0})
+        signature = await find_signature({"contract_id": contract_id}, {"_id": 0})
     
     if signature:
         # Don't include full document_upload in response (too large), just flag
@@ -3344,7 +5470,7 @@ class SignerInfoUpdate(BaseModel):
 @api_router.post("/sign/{contract_id}/update-placeholder-values")
 async def update_placeholder_values_for_signing(contract_id: str, data: dict):
     """Public endpoint for updating placeholder values during contract signing"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3356,7 +5482,7 @@ async def update_placeholder_values_for_signing(contract_id: str, data: dict):
             {"id": contract_id},
             {"$set": {
                 "placeholder_values": placeholder_values,
-                "updated_at": datetime.now(timezone.utc).isoformat()
+                "updated_at": datetime.now(timezone.utc)
             }}
         )
         
@@ -3370,16 +5496,16 @@ async def update_placeholder_values_for_signing(contract_id: str, data: dict):
         if phone:
             await db.contracts.update_one(
                 {"id": contract_id},
-                {"$set": {"signer_phone": phone}}
+                {"$set": {"signer_phone": phone, "updated_at": datetime.now(timezone.utc)}}
             )
     
     return {"message": "Placeholder values updated successfully"}
 
 @api_router.post("/sign/{contract_id}/update-signer-info")
 async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
-    print(f"🔧 Update signer info called: name={data.signer_name}, phone={data.signer_phone}, email={data.signer_email}, placeholder_values={data.placeholder_values}")
+    logger.debug("🔧 Update signer info called: name=%s, phone=%s, email=%s, placeholder_values=%s", data.signer_name, data.signer_phone, data.signer_email, data.placeholder_values)
     
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3401,31 +5527,31 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
         for key in ['PARTY_B_NAME', 'NAME2', 'SIGNER_NAME', '1NAME', 'ФИО', 'ФИО_НАНИМАТЕЛЯ', 'TENANT_NAME']:
             if key in data.placeholder_values and data.placeholder_values[key]:
                 update_data['signer_name'] = data.placeholder_values[key]
-                print(f"👤 Имя найдено в placeholder_values[{key}]: {data.placeholder_values[key]}")
+                logger.debug("👤 Имя найдено в placeholder_values[%s]: %s", key, data.placeholder_values[key])
                 break
         
         # Телефон стороны Б
         for key in ['PARTY_B_PHONE', 'PHONE_NUM', 'PHONE', 'ТЕЛЕФОН', 'TENANT_PHONE']:
             if key in data.placeholder_values and data.placeholder_values[key]:
                 update_data['signer_phone'] = data.placeholder_values[key]
-                print(f"📱 Телефон найден в placeholder_values[{key}]: {data.placeholder_values[key]}")
+                logger.debug("📱 Телефон найден в placeholder_values[%s]: %s", key, data.placeholder_values[key])
                 break
         
         # ИИН стороны Б  
         for key in ['PARTY_B_IIN', 'ID_CARD', 'IIN', 'ИИН', 'TENANT_IIN']:
             if key in data.placeholder_values and data.placeholder_values[key]:
                 update_data['signer_iin'] = data.placeholder_values[key]
-                print(f"🆔 ИИН найден в placeholder_values[{key}]: {data.placeholder_values[key]}")
+                logger.debug("🆔 ИИН найден в placeholder_values[%s]: %s", key, data.placeholder_values[key])
                 break
         
         # Email стороны Б
         for key in ['PARTY_B_EMAIL', 'EMAIL_КЛИЕНТА', 'EMAIL_НАНИМАТЕЛЯ', 'EMAIL', 'email', 'TENANT_EMAIL']:
             if key in data.placeholder_values and data.placeholder_values[key]:
                 update_data['signer_email'] = data.placeholder_values[key]
-                print(f"📧 Email найден в placeholder_values[{key}]: {data.placeholder_values[key]}")
+                logger.debug("📧 Email найден в placeholder_values[%s]: %s", key, data.placeholder_values[key])
                 break
     
-    print(f"🔧 Update data: {update_data}")
+    logger.debug("🔧 Update data: %s", update_data)
     
     if update_data:
         # Update the content with new signer information or placeholder values
@@ -3435,21 +5561,21 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
         # If placeholder_values are being updated and contract has a template, replace placeholders in content
         if data.placeholder_values and contract.get('template_id'):
             try:
-                print(f"🔧 Updating placeholders for template contract {contract_id}")
+                logger.debug("🔧 Updating placeholders for template contract %s", contract_id)
                 
                 # Load template to get placeholder configs
-                template = await db.contract_templates.find_one({"id": contract['template_id']})
+                template = await template_for_contract(contract)
                 if template and template.get('placeholders'):
                     # ИСПРАВЛЕНО: Используем объединенные значения, а не только новые
                     placeholder_values = update_data.get('placeholder_values', {})
                     
-                    print(f"🔧 Template placeholders: {list(template['placeholders'].keys())}")
-                    print(f"🔧 Values to replace: {placeholder_values}")
-                    print(f"🔧 Original content preview: {updated_content[:200]}...")
+                    logger.debug("🔧 Template placeholders: %s", list(template['placeholders'].keys()))
+                    logger.debug("🔧 Values to replace: %s", placeholder_values)
+                    logger.debug("🔧 Original content preview: %s...", updated_content[:200])
                     
                     # Get existing placeholder values to know what to replace
                     existing_values = contract.get('placeholder_values', {})
-                    print(f"🔧 Existing values: {existing_values}")
+                    logger.debug("🔧 Existing values: %s", existing_values)
                     
                     # Update ALL content versions (RU, KK, EN)
                     content_fields = [
@@ -3479,7 +5605,7 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
                                 # Только при подписании (status меняется на signed) или если это signer заполняет
                                 owner = config.get('owner', 'landlord')
                                 if owner in ['signer', 'tenant'] and contract_status != 'signed':
-                                    print(f"⏭️ [{field_name}] Skipping signer placeholder {{{{{key}}}}} (owner={owner}, status={contract_status})")
+                                    logger.debug("⏭️ [%s] Skipping signer placeholder {{%s}} (owner=%s, status=%s)", field_name, key, owner, contract_status)
                                     continue
                                 
                                 if new_value:  # Replace if we have a new value
@@ -3501,7 +5627,7 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
                                     current_content = pattern.sub(str(new_value), current_content)
                                     
                                     if old_content != current_content:
-                                        print(f"🔧 ✅ [{field_name}] Replaced {{{{{key}}}}} with value: {new_value}")
+                                        logger.debug("🔧 ✅ [%s] Replaced {{%s}} with value: %s", field_name, key, new_value)
                         
                         updated_contents[field_name] = current_content
                     
@@ -3513,8 +5639,8 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
                     if 'content_en' in updated_contents:
                         update_data['content_en'] = updated_contents['content_en']
                     
-                    print(f"🔧 Final content preview: {updated_content[:200]}...")
-                    print(f"🔧 ✅ Placeholders replacement completed for all language versions")
+                    logger.debug("🔧 Final content preview: %s...", updated_content[:200])
+                    logger.debug("🔧 ✅ Placeholders replacement completed for all language versions")
                     
             except Exception as e:
                 logging.error(f"Error replacing placeholders: {e}")
@@ -3552,18 +5678,18 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
         
         # Add content to update data
         update_data['content'] = updated_content
-        update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+        update_data['updated_at'] = datetime.now(timezone.utc)
         
         await db.contracts.update_one(
             {"id": contract_id},
-            {"$set": update_data}
+            await contract_text_update(contract, update_data)
         )
         
         await log_audit("signer_info_updated", contract_id=contract_id, 
                        details=f"Updated: {', '.join(update_data.keys())}")
     
     # Return updated contract
-    updated_contract = await db.contracts.find_one({"id": contract_id})
+    updated_contract = await find_contract({"id": contract_id})
     
     return {
         "message": "Signer info updated",
@@ -3578,7 +5704,7 @@ async def update_signer_info(contract_id: str, data: SignerInfoUpdate):
 @api_router.post("/sign/{contract_id}/set-contract-language")
 async def set_contract_language(contract_id: str, data: dict):
     """Public endpoint to set FIXED contract language (one-time only)"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3599,7 +5725,7 @@ async def set_contract_language(contract_id: str, data: dict):
         {"id": contract_id},
         {"$set": {
             "contract_language": language,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
@@ -3614,7 +5740,7 @@ async def set_contract_language(contract_id: str, data: dict):
 @api_router.post("/sign/{contract_id}/accept-english-disclaimer")
 async def accept_english_disclaimer(contract_id: str):
     """Public endpoint to accept English disclaimer"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3626,7 +5752,7 @@ async def accept_english_disclaimer(contract_id: str):
         {"id": contract_id},
         {"$set": {
             "english_disclaimer_accepted": True,
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
@@ -3718,7 +5844,7 @@ async def upload_document(contract_id: str, file: UploadFile = File(...)):
 
 @api_router.post("/sign/{contract_id}/request-otp")
 async def request_otp(contract_id: str, method: str = "sms"):
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3772,7 +5898,7 @@ async def request_otp(contract_id: str, method: str = "sms"):
         "verification_method": method,
         "signer_phone": phone_to_use,
         "signer_email": email_to_use,
-        "otp_requested_at": datetime.now(timezone.utc).isoformat()
+        "otp_requested_at": datetime.now(timezone.utc)
     }
     
     # Store OTP code for verification
@@ -3800,7 +5926,7 @@ async def request_call_otp(contract_id: str):
 @api_router.get("/sign/{contract_id}/telegram-deep-link")
 async def get_telegram_deep_link(contract_id: str):
     """Generate Telegram deep link for OTP verification"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3813,8 +5939,8 @@ async def get_telegram_deep_link(contract_id: str):
         "contract_id": contract_id,
         "otp_code": otp_code,
         "method": "telegram",
-        "created_at": datetime.now(timezone.utc).isoformat(),
-        "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+        "created_at": datetime.now(timezone.utc),
+        "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
         "verified": False
     }
     
@@ -3835,7 +5961,7 @@ async def get_telegram_deep_link(contract_id: str):
 @api_router.get("/sign/{contract_id}/view-pdf")
 async def view_pdf_for_signer(contract_id: str):
     """Public endpoint to view uploaded PDF for signing (no auth required)"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3861,7 +5987,7 @@ async def view_pdf_for_signer(contract_id: str):
 @api_router.post("/sign/{contract_id}/request-telegram-otp")
 async def request_telegram_otp(contract_id: str, data: dict):
     """Request OTP via Telegram - user provides their Telegram username"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
         raise HTTPException(status_code=404, detail="Contract not found")
     
@@ -3898,8 +6024,8 @@ async def request_telegram_otp(contract_id: str, data: dict):
                 "telegram_username": telegram_username,
                 "otp_code": otp_code,
                 "method": "telegram",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+                "created_at": datetime.now(timezone.utc),
+                "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
                 "verified": False
             }
             
@@ -3913,7 +6039,7 @@ async def request_telegram_otp(contract_id: str, data: dict):
         from telegram import Bot, InlineKeyboardButton, InlineKeyboardMarkup, CopyTextButton
         import asyncio
         
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
+        bot = Bot(token=TELEGRAM_BOT_TOKEN, base_url=TELEGRAM_API_URL)
         
         # Create localized message and button
         msg_text = translations[language]['message']
@@ -3976,8 +6102,8 @@ async def request_telegram_otp(contract_id: str, data: dict):
                     "telegram_username": telegram_username,
                     "otp_code": otp_code,
                     "method": "telegram",
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+                    "created_at": datetime.now(timezone.utc),
+                    "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
                     "verified": False
                 }
                 
@@ -4000,8 +6126,8 @@ async def request_telegram_otp(contract_id: str, data: dict):
             "telegram_username": telegram_username,
             "otp_code": otp_code,
             "method": "telegram",
-            "created_at": datetime.now(timezone.utc).isoformat(),
-            "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+            "created_at": datetime.now(timezone.utc),
+            "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
             "verified": False
         }
         
@@ -4052,7 +6178,7 @@ async def verify_telegram_otp(contract_id: str, data: dict):
             raise HTTPException(status_code=400, detail="Неверный код. Проверьте код в Telegram или запросите новый.")
     
     # Check if expired
-    expires_at = datetime.fromisoformat(verification['expires_at'])
+    expires_at = as_utc(verification['expires_at'])
     if datetime.now(timezone.utc) > expires_at:
         raise HTTPException(status_code=400, detail="Код истек. Нажмите /start в боте для нового кода.")
     
@@ -4063,7 +6189,7 @@ async def verify_telegram_otp(contract_id: str, data: dict):
     )
     
     # Sign contract (same as SMS/Call)
-    signature = await db.signatures.find_one({"contract_id": contract_id})
+    signature = await find_signature({"contract_id": contract_id})
     if not signature:
         raise HTTPException(status_code=404, detail="Signature not found")
     
@@ -4072,7 +6198,7 @@ async def verify_telegram_otp(contract_id: str, data: dict):
     
     # If not in verification, try to get from signature
     if not telegram_username:
-        signature_full = await db.signatures.find_one({"contract_id": contract_id})
+        signature_full = await find_signature({"contract_id": contract_id})
         telegram_username = signature_full.get('telegram_username', '') if signature_full else ''
     
     # For signature hash - use username if available, otherwise just contract_id
@@ -4087,7 +6213,7 @@ async def verify_telegram_otp(contract_id: str, data: dict):
         {"contract_id": contract_id},
         {"$set": {
             "verified": True,
-            "signed_at": datetime.now(timezone.utc).isoformat(),
+            "signed_at": datetime.now(timezone.utc),
             "signature_hash": signature_hash,
             "verification_method": "telegram",
             "telegram_username": telegram_username if telegram_username else None
@@ -4098,7 +6224,7 @@ async def verify_telegram_otp(contract_id: str, data: dict):
         {"id": contract_id},
         {"$set": {
             "status": "pending-signature",
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "updated_at": datetime.now(timezone.utc),
             "verification_method": "telegram",
             "telegram_username": telegram_username if telegram_username else None
         }}
@@ -4106,8 +6232,11 @@ async def verify_telegram_otp(contract_id: str, data: dict):
     
     await log_audit("signature_verified_telegram", contract_id=contract_id)
     
+    verification_cache.invalidate(contract_id)
+    schedule_contract_prerender(contract_id)
+    
     # Get contract info for logging
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if contract:
         # Log to creator's logs that tenant signed via Telegram
         await log_user_action(
@@ -4139,7 +6268,7 @@ async def verify_call_otp(contract_id: str, data: dict):
         raise HTTPException(status_code=404, detail="Verification not found")
     
     # Check if expired
-    expires_at = datetime.fromisoformat(verification['expires_at'])
+    expires_at = as_utc(verification['expires_at'])
     if datetime.now(timezone.utc) > expires_at:
         raise HTTPException(status_code=400, detail="Код истек. Запросите новый звонок.")
     
@@ -4156,7 +6285,7 @@ async def verify_call_otp(contract_id: str, data: dict):
         
         # Now SIGN the contract (same as SMS OTP)
         # Find signature
-        signature = await db.signatures.find_one({"contract_id": contract_id})
+        signature = await find_signature({"contract_id": contract_id})
         if not signature:
             raise HTTPException(status_code=404, detail="Signature not found")
         
@@ -4170,7 +6299,7 @@ async def verify_call_otp(contract_id: str, data: dict):
             {"contract_id": contract_id},
             {"$set": {
                 "verified": True,
-                "signed_at": datetime.now(timezone.utc).isoformat(),
+                "signed_at": datetime.now(timezone.utc),
                 "signature_hash": signature_hash,
                 "verification_method": "call",
                 "signer_phone": signer_phone
@@ -4182,7 +6311,7 @@ async def verify_call_otp(contract_id: str, data: dict):
             {"id": contract_id},
             {"$set": {
                 "status": "pending-signature",
-                "updated_at": datetime.now(timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc),
                 "verification_method": "call",
                 "signer_phone": signer_phone
             }}
@@ -4190,8 +6319,11 @@ async def verify_call_otp(contract_id: str, data: dict):
         
         await log_audit("signature_verified", contract_id=contract_id)
         
+        verification_cache.invalidate(contract_id)
+        schedule_contract_prerender(contract_id)
+        
         # Get contract info for logging
-        contract = await db.contracts.find_one({"id": contract_id})
+        contract = await find_contract({"id": contract_id})
         if contract:
             # Log to creator's logs that tenant signed via Call
             await log_user_action(
@@ -4209,7 +6341,7 @@ async def verify_call_otp(contract_id: str, data: dict):
 async def verify_signature_otp(contract_id: str, otp_data: OTPVerify):
     """Verify OTP for contract signing"""
     # Find signature
-    signature = await db.signatures.find_one({"contract_id": contract_id})
+    signature = await find_signature({"contract_id": contract_id})
     if not signature:
         raise HTTPException(status_code=404, detail="Signature not found")
     
@@ -4229,14 +6361,14 @@ async def verify_signature_otp(contract_id: str, otp_data: OTPVerify):
     
     # Mark as verified and signed
     # Get signer phone from signature
-    signature_full = await db.signatures.find_one({"contract_id": contract_id})
+    signature_full = await find_signature({"contract_id": contract_id})
     signer_phone = signature_full.get('signer_phone', '') if signature_full else ''
     
     await db.signatures.update_one(
         {"contract_id": contract_id},
         {"$set": {
             "verified": True,
-            "signed_at": datetime.now(timezone.utc).isoformat(),
+            "signed_at": datetime.now(timezone.utc),
             "signature_hash": signature_hash,
             "verification_method": "sms",
             "signer_phone": signer_phone
@@ -4248,7 +6380,7 @@ async def verify_signature_otp(contract_id: str, otp_data: OTPVerify):
         {"id": contract_id},
         {"$set": {
             "status": "pending-signature",
-            "updated_at": datetime.now(timezone.utc).isoformat(),
+            "updated_at": datetime.now(timezone.utc),
             "verification_method": "sms",
             "signer_phone": signer_phone
         }}
@@ -4256,8 +6388,11 @@ async def verify_signature_otp(contract_id: str, otp_data: OTPVerify):
     
     await log_audit("signature_verified", contract_id=contract_id)
     
+    verification_cache.invalidate(contract_id)
+    schedule_contract_prerender(contract_id)
+    
     # Get contract info for logging
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if contract:
         # Log to creator's logs that tenant signed via SMS
         await log_user_action(
@@ -4271,7 +6406,7 @@ async def verify_signature_otp(contract_id: str, otp_data: OTPVerify):
 @api_router.post("/contracts/{contract_id}/approve-for-signing")
 async def approve_contract_for_signing(contract_id: str, current_user: dict = Depends(get_current_user)):
     """Утвердить договор перед отправкой клиенту (фиксирует content и placeholder values)"""
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     
     if not contract:
         raise HTTPException(status_code=404, detail="Договор не найден")
@@ -4291,14 +6426,14 @@ async def approve_contract_for_signing(contract_id: str, current_user: dict = De
     # Обновить договор
     await db.contracts.update_one(
         {"id": contract_id},
-        {"$set": {
+        await contract_text_update(contract, {
             "approved": True,
-            "approved_at": datetime.now(timezone.utc).isoformat(),
+            "approved_at": datetime.now(timezone.utc),
             "approved_content": current_content,
             "approved_placeholder_values": current_placeholder_values,
             "status": "sent",  # Изменить статус на "sent" (отправлен клиенту)
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
+            "updated_at": datetime.now(timezone.utc)
+        })
     )
     
     await log_audit("contract_approved_for_signing", contract_id=contract_id, user_id=current_user['user_id'])
@@ -4307,7 +6442,7 @@ async def approve_contract_for_signing(contract_id: str, current_user: dict = De
     if contract.get('signer_email'):
         # Generate PDF with approved content
         landlord = await db.users.find_one({"id": contract.get('creator_id')})
-        signature = await db.signatures.find_one({"contract_id": contract_id})
+        signature = await find_signature({"contract_id": contract_id})
         
         # Temporarily update contract with approved values for PDF generation
         pdf_contract = {**contract, 'content': current_content, 'placeholder_values': current_placeholder_values}
@@ -4315,9 +6450,10 @@ async def approve_contract_for_signing(contract_id: str, current_user: dict = De
         # Get template if contract has one
         template = None
         if contract.get('template_id'):
-            template = await db.templates.find_one({"id": contract['template_id']}, {"_id": 0})
+            template = await template_for_contract(contract)
         
         pdf_bytes = generate_contract_pdf(pdf_contract, signature, None, landlord, template)
+        _check_pdf_size_budget(pdf_bytes, contract)
         
         subject = f"📄 Договор на подпись: {contract['title']}"
         body = f"""
@@ -4374,14 +6510,14 @@ async def approve_contract_for_signing(contract_id: str, current_user: dict = De
                 pdf_bytes,
                 f"Contract_{contract.get('contract_code', contract_id)}.pdf"
             )
-            print(f"📧 Email task queued for {contract['signer_email']}")
+            logger.info("📧 Email task queued for %s", contract['signer_email'])
         except Exception as e:
-            print(f"Error queueing email: {e}")
+            logger.error("Error queueing email: %s", e)
     
     return {
         "message": "Договор утвержден и отправлен клиенту",
         "contract_id": contract_id,
-        "approved_at": datetime.now(timezone.utc).isoformat()
+        "approved_at": datetime.now(timezone.utc)
     }
 
 @api_router.post("/contracts/{contract_id}/approve")
@@ -4396,54 +6532,52 @@ async def approve_signature(contract_id: str, current_user: dict = Depends(get_c
         {"$set": {
             "status": "signed",
             "landlord_signature_hash": landlord_signature_hash,
-            "approved_at": datetime.now(timezone.utc).isoformat(),
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "approved_at": datetime.now(timezone.utc),
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
+    verification_cache.invalidate(contract_id)
     
     await log_audit("contract_approved", contract_id=contract_id, user_id=current_user['user_id'])
     
     # Get contract info for logging
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     await log_user_action(
         current_user['user_id'],
         "contract_approved",
         f"Утвержден договор {contract.get('contract_code', contract_id)}"
     )
     
-    print(f"🔥 DEBUG: Approve called for contract {contract_id}")
-    logging.info(f"🔥 DEBUG: Approve called for contract {contract_id}")
+    logger.debug("🔥 Approve called for contract %s", contract_id)
     
     # Get contract and signature for email
-    signature = await db.signatures.find_one({"contract_id": contract_id})
+    signature = await find_signature({"contract_id": contract_id})
     creator = await db.users.find_one({"id": contract['creator_id']})
     
-    print(f"🔥 DEBUG: Contract email: {contract.get('signer_email')}")
-    logging.info(f"🔥 DEBUG: Contract email: {contract.get('signer_email')}")
+    logger.debug("🔥 Contract email: %s", contract.get('signer_email'))
     
     # Generate PDF for email
-    print(f"🔥 DEBUG: Starting PDF generation...")
+    logger.debug("🔥 Starting PDF generation...")
     try:
-        print(f"🔥 DEBUG: Inside try block")
-        
         # Get landlord info
         landlord = await db.users.find_one({"id": contract.get('creator_id')})
         
         # Get template if contract has one
         template = None
-        print(f"🔥 DEBUG: contract.template_id = {contract.get('template_id')}")
+        logger.debug("🔥 contract.template_id = %s", contract.get('template_id'))
         if contract.get('template_id'):
-            template = await db.templates.find_one({"id": contract['template_id']}, {"_id": 0})
-            print(f"🔥 DEBUG: Template loaded from DB: {bool(template)}")
+            template = await template_for_contract(contract)
+            logger.debug("🔥 Template loaded from DB: %s", bool(template))
             if template:
-                print(f"🔥 DEBUG: Template has {len(template.get('placeholders', {}))} placeholders")
+                logger.debug("🔥 Template has %s placeholders", len(template.get('placeholders', {})))
         else:
-            print(f"🔥 DEBUG: Contract has no template_id!")
+            logger.debug("🔥 Contract has no template_id!")
         
         # Use the centralized PDF generation function
-        print(f"🔥 DEBUG: Calling generate_contract_pdf with template={bool(template)}")
-        pdf_bytes = generate_contract_pdf(contract, signature, landlord_signature_hash, landlord, template)
-        print(f"🔥 DEBUG: PDF generated, size: {len(pdf_bytes)} bytes")
+        logger.debug("🔥 Calling generate_contract_pdf with template=%s", bool(template))
+        pdf_bytes = await render_approved_contract_pdf(contract, signature, landlord_signature_hash, landlord, template)
+        logger.debug("🔥 PDF generated, size: %s bytes", len(pdf_bytes))
+        _check_pdf_size_budget(pdf_bytes, contract)
         
         # Send email to signer
         if contract.get('signer_email'):
@@ -4570,7 +6704,7 @@ async def approve_signature(contract_id: str, current_user: dict = Depends(get_c
 </html>
             """
             
-            print(f"🔥 DEBUG: About to call send_email_async to {contract['signer_email']}")
+            logger.debug("🔥 About to call send_email_async to %s", contract['signer_email'])
             # Send email in background for faster response
             send_email_async(
                 contract['signer_email'],
@@ -4579,13 +6713,9 @@ async def approve_signature(contract_id: str, current_user: dict = Depends(get_c
                 pdf_bytes,
                 f"contract-{contract_id}.pdf"
             )
-            print(f"⚡ Email queued for {contract['signer_email']}")
+            logger.info("⚡ Email queued for %s", contract['signer_email'])
     except Exception as e:
-        print(f"🔥 DEBUG: Exception in try block: {str(e)}")
-        logging.error(f"❌ Error generating PDF or sending email: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        logging.error(traceback.format_exc())
+        logger.exception("❌ Error generating PDF or sending email: %s", e)
     
     return {"message": "Contract approved and signed", "landlord_signature_hash": landlord_signature_hash}
 
@@ -4593,11 +6723,11 @@ async def approve_signature(contract_id: str, current_user: dict = Depends(get_c
 @api_router.get("/contracts/{contract_id}/download")
 async def download_contract_pdf(contract_id: str, current_user: dict = Depends(get_current_user)):
     """Download contract as PDF - for both landlords and admins"""
-    print(f"🔥 DEBUG: download_contract_pdf called for contract {contract_id}")
+    logger.debug("🔥 download_contract_pdf called for contract %s", contract_id)
     
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
-        print(f"❌ Contract not found: {contract_id}")
+        logger.warning("❌ Contract not found: %s", contract_id)
         raise HTTPException(status_code=404, detail="Contract not found")
     
     # Check permissions - landlord or admin can download
@@ -4608,14 +6738,14 @@ async def download_contract_pdf(contract_id: str, current_user: dict = Depends(g
     if user_role != 'admin' and not is_owner:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    print(f"✅ Contract found: {contract['title']}")
+    logger.debug("✅ Contract found: %s", contract['title'])
     
-    signature = await db.signatures.find_one({"contract_id": contract_id})
-    print(f"✅ Signature: {bool(signature)}")
+    signature = await find_signature({"contract_id": contract_id})
+    logger.debug("✅ Signature: %s", bool(signature))
     
     # Get landlord signature hash if contract is signed/approved
     landlord_signature_hash = contract.get('landlord_signature_hash')
-    print(f"✅ Landlord hash: {bool(landlord_signature_hash)}")
+    logger.debug("✅ Landlord hash: %s", bool(landlord_signature_hash))
     
     # Get landlord info - try both landlord_id and creator_id
     landlord = None
@@ -4627,13 +6757,13 @@ async def download_contract_pdf(contract_id: str, current_user: dict = Depends(g
     # Get template if contract has one
     template = None
     if contract.get('template_id'):
-        template = await db.templates.find_one({"id": contract['template_id']}, {"_id": 0})
+        template = await template_for_contract(contract)
     
     # Generate PDF using centralized function
     try:
-        print(f"🔥 Generating PDF...")
+        logger.debug("🔥 Generating PDF...")
         pdf_bytes = generate_contract_pdf(contract, signature, landlord_signature_hash, landlord, template)
-        print(f"✅ PDF generated: {len(pdf_bytes)} bytes")
+        logger.debug("✅ PDF generated: %s bytes", len(pdf_bytes))
         
         return Response(
             content=pdf_bytes,
@@ -4642,46 +6772,46 @@ async def download_contract_pdf(contract_id: str, current_user: dict = Depends(g
         )
         
     except Exception as e:
-        print(f"❌ PDF generation error: {e}")
+        logger.exception("❌ PDF generation error: %s", e)
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
 
 @api_router.get("/contracts/{contract_id}/download-pdf")
 async def download_pdf(contract_id: str, current_user: dict = Depends(get_current_user)):
-    print(f"🔥 DEBUG: download_pdf called for contract {contract_id}")
+    logger.debug("🔥 download_pdf called for contract %s", contract_id)
     
-    contract = await db.contracts.find_one({"id": contract_id})
+    contract = await find_contract({"id": contract_id})
     if not contract:
-        print(f"❌ Contract not found: {contract_id}")
+        logger.warning("❌ Contract not found: %s", contract_id)
         raise HTTPException(status_code=404, detail="Contract not found")
     
-    print(f"✅ Contract found: {contract['title']}")
+    logger.debug("✅ Contract found: %s", contract['title'])
     
-    signature = await db.signatures.find_one({"contract_id": contract_id})
-    print(f"✅ Signature: {bool(signature)}")
+    signature = await find_signature({"contract_id": contract_id})
+    logger.debug("✅ Signature: %s", bool(signature))
     
     # Get landlord signature hash if contract is signed/approved
     landlord_signature_hash = contract.get('landlord_signature_hash')
-    print(f"✅ Landlord hash: {bool(landlord_signature_hash)}")
+    logger.debug("✅ Landlord hash: %s", bool(landlord_signature_hash))
     
     # Get landlord info
     landlord = await db.users.find_one({"id": contract.get('creator_id')})
     
     # Get template if contract has one
     template = None
-    print(f"🔥 DEBUG: contract.template_id = {contract.get('template_id')}")
+    logger.debug("🔥 contract.template_id = %s", contract.get('template_id'))
     if contract.get('template_id'):
-        template = await db.templates.find_one({"id": contract['template_id']}, {"_id": 0})
-        print(f"🔥 DEBUG: Template loaded from DB: {bool(template)}")
+        template = await template_for_contract(contract)
+        logger.debug("🔥 Template loaded from DB: %s", bool(template))
         if template:
-            print(f"🔥 DEBUG: Template has {len(template.get('placeholders', {}))} placeholders")
+            logger.debug("🔥 Template has %s placeholders", len(template.get('placeholders', {})))
     else:
-        print(f"🔥 DEBUG: Contract has no template_id!")
+        logger.debug("🔥 Contract has no template_id!")
     
     # Generate PDF using centralized function
     try:
-        print(f"🔥 Generating PDF with template={bool(template)}...")
+        logger.debug("🔥 Generating PDF with template=%s...", bool(template))
         pdf_bytes = generate_contract_pdf(contract, signature, landlord_signature_hash, landlord, template)
-        print(f"✅ PDF generated: {len(pdf_bytes)} bytes")
+        logger.debug("✅ PDF generated: %s bytes", len(pdf_bytes))
         
         return Response(
             content=pdf_bytes,
@@ -4689,16 +6819,32 @@ async def download_pdf(contract_id: str, current_user: dict = Depends(get_curren
             headers={"Content-Disposition": f"attachment; filename=contract-{contract_id}.pdf"}
         )
     except Exception as e:
-        print(f"❌ PDF generation error: {str(e)}")
-        logging.error(f"Error generating PDF: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
-        logging.error(traceback.format_exc())
+        logger.exception("❌ PDF generation error: %s", e)
         raise HTTPException(status_code=500, detail=f"Error generating PDF: {str(e)}")
 
 # ===== ADMIN ROUTES =====
+class UserSummary(BaseModel):
+    """Row of the admin users list (?summary=true): profile fields without the ID document"""
+    id: str
+    email: Optional[str] = None
+    full_name: Optional[str] = None
+    phone: Optional[str] = None
+    role: Optional[str] = None
+    language: Optional[str] = None
+    iin: Optional[str] = None
+    company_name: Optional[str] = None
+    legal_address: Optional[str] = None
+    contract_limit: Optional[int] = None
+    is_admin: Optional[bool] = None
+    is_active: Optional[bool] = None
+    is_deleted: Optional[bool] = None
+    created_at: Optional[datetime] = None
+
+USER_SUMMARY_PROJECTION = summary_projection(UserSummary)
+
 @api_router.get("/admin/users")
-async def get_all_users(current_user: dict = Depends(get_current_user), search: str = None, include_deleted: bool = False):
+async def get_all_users(current_user: dict = Depends(get_current_user), search: str = None, include_deleted: bool = False,
+                        summary: bool = False):
     if current_user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
@@ -4720,8 +6866,10 @@ async def get_all_users(current_user: dict = Depends(get_current_user), search:
             {"iin": search_pattern}
         ]
     
-    users = await db.users.find(query, {"_id": 0, "password": 0}).to_list(1000)
-    return users
+    # Summary rows keep only the keys a user actually has (no defaults invented for legacy docs)
+    projection = USER_SUMMARY_PROJECTION if summary else {"_id": 0, "password": 0}
+    users = await db.users.find(query, projection).to_list(1000)
+    return FastJSONResponse(users)
 
 @api_router.get("/debug/contracts-landlords")
 async def debug_contracts_landlords(current_user: dict = Depends(get_current_user)):
@@ -4789,6 +6937,7 @@ async def get_all_contracts(
     
     # Получить договоры с пагинацией, отсортированные от новых к старым
     contracts = await db.contracts.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
+    await materialize_contracts(contracts)
     
     # Получить общее количество договоров
     total_count = await db.contracts.count_documents(query)
@@ -4802,11 +6951,23 @@ async def get_all_contracts(
     }
 
 @api_router.get("/admin/audit-logs")
-async def get_audit_logs(current_user: dict = Depends(get_current_user)):
+async def get_audit_logs(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    current_user: dict = Depends(get_current_user)
+):
     if current_user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
-    logs = await db.audit_logs.find({}, {"_id": 0}).sort("timestamp", -1).to_list(1000)
-    return logs
+    # Range over the timestamp index; only meaningful now that timestamps are BSON dates
+    query = {}
+    if since or until:
+        query["timestamp"] = {}
+        if since:
+            query["timestamp"]["$gte"] = as_utc(since)
+        if until:
+            query["timestamp"]["$lt"] = as_utc(until)
+    logs = await db.audit_logs.find(query, {"_id": 0}).sort("timestamp", -1).to_list(1000)
+    return FastJSONResponse(logs)
 
 @api_router.get("/test-error")
 async def test_error():
@@ -4840,15 +7001,8 @@ async def get_stats(current_user: dict = Depends(get_current_user)):
         "status": "pending-signature"
     })
     
-    # Online users (any activity in last 15 minutes) - count unique users
-    fifteen_min_ago = datetime.now(timezone.utc) - timedelta(minutes=15)
-    online_users_pipeline = [
-        {"$match": {"timestamp": {"$gte": fifteen_min_ago.isoformat()}}},
-        {"$group": {"_id": "$user_id"}},
-        {"$count": "unique_users"}
-    ]
-    online_result = await db.user_logs.aggregate(online_users_pipeline).to_list(1)
-    online_users = online_result[0]['unique_users'] if online_result else 0
+    # Online users (any authenticated request in last 15 minutes)
+    online_users = (await presence.counts())["online_users"]
     
     return {
         "total_users": total_users,
@@ -4891,7 +7045,7 @@ async def admin_reset_password(user_id: str, new_password: str, current_user: di
         raise HTTPException(status_code=404, detail="User not found")
     
     # Хешируем новый пароль
-    password_hash = bcrypt.hashpw(new_password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    password_hash = await hash_password(new_password)
     
     await db.users.update_one(
         {"id": user_id},
@@ -5003,95 +7157,862 @@ async def toggle_user_status(user_id: str, current_user: dict = Depends(get_curr
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Нельзя деактивировать самого себя
-    if user_id == current_user.get('user_id'):
-        raise HTTPException(status_code=400, detail="Cannot deactivate yourself")
+    # Нельзя деактивировать самого себя
+    if user_id == current_user.get('user_id'):
+        raise HTTPException(status_code=400, detail="Cannot deactivate yourself")
+    
+    current_status = user.get('is_active', True)
+    new_status = not current_status
+    
+    await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"is_active": new_status}}
+    )
+    
+    action = "activated" if new_status else "deactivated"
+    await log_audit(f"admin_user_{action}", user_id=current_user.get('user_id'), 
+                   details=f"User {user.get('email')} was {action}")
+    
+    return {
+        "message": f"User {action} successfully",
+        "is_active": new_status
+    }
+
+
+@api_router.delete("/admin/users/{user_id}")
+async def delete_user(user_id: str, current_user: dict = Depends(get_current_user)):
+    """Полностью удалить пользователя из базы данных"""
+    if current_user.get('role') != 'admin':
+        raise HTTPException(status_code=403, detail="Admin access required")
+    
+    user = await db.users.find_one({"id": user_id})
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    # Нельзя удалить самого себя
+    if user_id == current_user.get('user_id'):
+        raise HTTPException(status_code=400, detail="Cannot delete yourself")
+    
+    # Удаляем пользователя полностью
+    await db.users.delete_one({"id": user_id})
+    
+    # Также удаляем все его договора
+    await db.contracts.delete_many({"user_id": user_id})
+    
+    await log_audit("admin_user_deleted", user_id=current_user.get('user_id'), 
+                   details=f"User {user.get('email')} was permanently deleted")
+    
+    return {"message": "User deleted successfully"}
+
+
+# ==================== CONTRACT TEMPLATES ENDPOINTS ====================
+
+# Marketplace cards: everything except the RU/KK/EN content and placeholder configs
+TEMPLATE_SUMMARY_PROJECTION = {
+    "_id": 0, "id": 1, "title": 1, "title_kk": 1, "title_en": 1,
+    "description": 1, "description_kk": 1, "description_en": 1,
+    "category": 1, "content_type": 1, "requires_tenant_document": 1,
+    "is_active": 1, "version": 1, "created_at": 1, "updated_at": 1,
+}
+TEMPLATE_LIST_LIMIT = 100
+
+
+class TemplateCatalog:
+    """Single read path for db.contract_templates.
+    
+    Full templates are cached per worker keyed by id and version; the public
+    marketplace summaries are cached per category. Every admin write bumps the
+    template's version and calls invalidate(). Other workers learn about writes
+    from a change stream; on a standalone mongod (no change streams) entries
+    simply expire after TEMPLATE_CACHE_TTL seconds.
+    
+    Each version is also saved to db.template_versions as an immutable snapshot
+    with its compile_template() artifacts. Contracts pin template_version, so
+    their renders read a snapshot that can be cached for good.
+    """
+    
+    VERSION_CACHE_SIZE = 512
+    
+    def __init__(self, ttl: float):
+        from collections import OrderedDict
+        
+        self.ttl = ttl
+        self._templates = {}  # id -> (version, loaded_at, doc)
+        self._versions = OrderedDict()  # (id, version) -> immutable doc, LRU
+        self._public = {}  # category -> (loaded_at, summaries)
+        # Bumped by invalidate(): a read that started before an invalidation must not
+        # store what it fetched (it may be the pre-write document)
+        self._generations = {}  # id -> invalidation count
+        self._epoch = 0  # invalidations of everything (and of the public summaries)
+        self._watching = False
+        self._task = None
+    
+    def _fresh(self, loaded_at: float) -> bool:
+        return self._watching or time.monotonic() - loaded_at < self.ttl
+    
+    def invalidate(self, template_id: Optional[str] = None):
+        if template_id is None:
+            self._templates.clear()
+        else:
+            self._templates.pop(template_id, None)
+            self._generations[template_id] = self._generations.get(template_id, 0) + 1
+        self._epoch += 1
+        self._public.clear()
+    
+    def _generation(self, template_id: str) -> tuple:
+        return (self._epoch, self._generations.get(template_id, 0))
+    
+    async def get(self, template_id: Optional[str], version: Optional[int] = None) -> Optional[dict]:
+        """Full template (any status) with its 'compiled' artifacts, or None.
+        With version: that immutable snapshot (falls back to the current template
+        for versions that were never recorded). The result is a copy callers may modify."""
+        if not template_id:
+            return None
+        if version is not None:
+            snapshot = await self.get_version(template_id, version)
+            if snapshot is not None:
+                return snapshot
+        cached = self._templates.get(template_id)
+        if cached and self._fresh(cached[1]):
+            return dict(cached[2])
+        generation = self._generation(template_id)
+        doc = await db.contract_templates.find_one({"id": template_id}, {"_id": 0})
+        if doc is None:
+            self._templates.pop(template_id, None)
+            return None
+        doc['compiled'] = compile_template(doc)
+        if self._generation(template_id) == generation:
+            self._templates[template_id] = (doc.get('version', 0), time.monotonic(), doc)
+        return dict(doc)
+    
+    async def get_version(self, template_id: str, version: int) -> Optional[dict]:
+        key = (template_id, version)
+        doc = self._versions.get(key)
+        if doc is None:
+            record = await db.template_versions.find_one({"template_id": template_id, "version": version}, {"_id": 0})
+            if record is None:
+                return None
+            doc = {**record['template'], 'compiled': record['compiled']}
+            self._versions[key] = doc
+            if len(self._versions) > self.VERSION_CACHE_SIZE:
+                self._versions.popitem(last=False)
+        else:
+            self._versions.move_to_end(key)
+        return dict(doc)
+    
+    async def save_version(self, template: dict, created_by: Optional[str] = None):
+        """Record the snapshot of template at its current version (idempotent)"""
+        snapshot = {k: v for k, v in template.items() if k not in ('_id', 'compiled')}
+        snapshot.setdefault('version', 1)
+        await db.template_versions.update_one(
+            {"template_id": snapshot['id'], "version": snapshot['version']},
+            {"$setOnInsert": {
+                "template": snapshot,
+                "compiled": compile_template(snapshot),
+                "created_by": created_by,
+                "created_at": datetime.now(timezone.utc),
+            }},
+            upsert=True
+        )
+    
+    async def commit_change(self, template_id: str, update: dict, created_by: Optional[str] = None) -> Optional[dict]:
+        """Apply an admin write as a new version: bump, snapshot, invalidate"""
+        update = {**update, "$inc": {"version": 1}}
+        doc = await db.contract_templates.find_one_and_update(
+            {"id": template_id}, update, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        await self.save_version(doc, created_by)
+        self.invalidate(template_id)
+        return doc
+    
+    async def public_summaries(self, category: Optional[str] = None) -> list:
+        cached = self._public.get(category)
+        if cached and self._fresh(cached[0]):
+            return cached[1]
+        query = {"is_active": True, "assigned_users": {"$in": [None, []]}}
+        if category:
+            query["category"] = category
+        epoch = self._epoch
+        summaries = await db.contract_templates.find(query, TEMPLATE_SUMMARY_PROJECTION) \
+            .sort("created_at", -1).to_list(TEMPLATE_LIST_LIMIT)
+        if self._epoch == epoch:
+            self._public[category] = (time.monotonic(), summaries)
+        return summaries
+    
+    async def assigned_summaries(self, user_id: str, category: Optional[str] = None) -> list:
+        """Individual templates of one user; small and indexed, so not cached"""
+        query = {"is_active": True, "assigned_users": user_id}
+        if category:
+            query["category"] = category
+        summaries = await db.contract_templates.find(query, TEMPLATE_SUMMARY_PROJECTION) \
+            .sort("created_at", -1).to_list(TEMPLATE_LIST_LIMIT)
+        for summary in summaries:
+            summary['is_individual'] = True
+        return summaries
+    
+    async def summaries_by_ids(self, template_ids: list) -> list:
+        return await db.contract_templates.find(
+            {"id": {"$in": template_ids}}, TEMPLATE_SUMMARY_PROJECTION
+        ).to_list(TEMPLATE_LIST_LIMIT)
+    
+    async def ensure_indexes(self):
+        try:
+            await db.contract_templates.create_index("id")
+            await db.template_versions.create_index([("template_id", 1), ("version", 1)], unique=True)
+            # Multikey: serves both the public ($in [null, []]) and the per-user lookups
+            await db.contract_templates.create_index([("is_active", 1), ("assigned_users", 1), ("created_at", -1)])
+        except Exception as e:
+            logging.error(f"❌ Template indexes not created: {str(e)}")
+    
+    async def migrate_legacy_collection(self):
+        """Older code read templates from db.templates; fold anything left there into contract_templates"""
+        async for doc in db.templates.find({}, {"_id": 0}):
+            if doc.get('id'):
+                await db.contract_templates.update_one({"id": doc['id']}, {"$setOnInsert": doc}, upsert=True)
+    
+    async def backfill_versions(self):
+        """Templates saved before versioning get version 1 and a snapshot of their current state"""
+        await db.contract_templates.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        async for doc in db.contract_templates.find({}, {"_id": 0}):
+            await self.save_version(doc, created_by="backfill")
+    
+    async def start(self):
+        import asyncio
+        
+        await self.ensure_indexes()
+        try:
+            await self.migrate_legacy_collection()
+            await self.backfill_versions()
+        except Exception as e:
+            logging.error(f"❌ Template migration failed: {str(e)}")
+        if self._task is None:
+            self._task = asyncio.create_task(self._watch())
+    
+    async def stop(self):
+        import asyncio
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def _watch(self):
+        import asyncio
+        from pymongo.errors import OperationFailure
+        
+        pipeline = [{"$project": {"operationType": 1, "fullDocument.id": 1}}]
+        while True:
+            try:
+                async with db.contract_templates.watch(pipeline, full_document='updateLookup') as stream:
+                    # Anything cached before the stream opened may already be stale
+                    self.invalidate()
+                    self._watching = True
+                    logging.info("🔔 Template catalog: watching contract_templates for changes")
+                    async for change in stream:
+                        self.invalidate((change.get('fullDocument') or {}).get('id'))
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self._watching = False
+                logging.info(f"ℹ️ Template change stream unavailable, cache TTL {self.ttl}s: {str(e)}")
+                return
+            except Exception as e:
+                self._watching = False
+                logging.warning(f"⚠️ Template change stream interrupted: {str(e)}")
+                await asyncio.sleep(5)
+
+
+template_catalog = TemplateCatalog(TEMPLATE_CACHE_TTL)
+
+
+async def template_for_contract(contract: dict) -> Optional[dict]:
+    """The template version a contract was created from (current one for older contracts)"""
+    return await template_catalog.get(contract.get('template_id'), contract.get('template_version'))
+
+
+# ==================== COMPACT CONTRACT STORAGE ====================
+# A template-based contract's texts are near-copies of its pinned template version.
+# Instead of storing content/content_kk/content_en/approved_content in full, such a
+# contract keeps content_delta: {field: [[start, end, text], ...]} - token-range
+# replacements against the template text of the same language. A full text field in
+# the document always wins over its delta (older writes, non-compactable texts).
+# Texts are materialised on read by find_contract()/materialize_contracts().
+
+# Text field -> template field it is diffed against
+CONTRACT_TEXT_FIELDS = {
+    'content': 'content',
+    'content_kk': 'content_kk',
+    'content_en': 'content_en',
+    'approved_content': 'content',
+}
+# Keep the full text when the delta would not save at least half of it
+COMPACT_MAX_DELTA_RATIO = 0.5
+TEXT_DELTA_MAX_BLOCK = 250_000
+MATERIALIZED_CACHE_SIZE = 1024
+
+
+@functools.lru_cache(maxsize=128)
+def _text_tokens(text: str) -> tuple:
+    """Lossless split into newline / blank / word / punctuation runs (''.join() restores text)"""
+    import re
+    return tuple(re.findall(r'\n|[^\S\n]+|\w+|[^\w\s]', text))
+
+def _token_lines(tokens: tuple) -> list:
+    """Token index at which every line starts (newlines are single tokens), plus the end"""
+    starts = [0]
+    starts.extend(index + 1 for index, token in enumerate(tokens) if token == '\n')
+    if starts[-1] != len(tokens):
+        starts.append(len(tokens))
+    return starts
+
+def text_delta(base: str, text: str) -> list:
+    """Token-range replacements turning base into text: lines are matched first,
+    then only the changed line blocks are diffed token by token"""
+    from difflib import SequenceMatcher
+    
+    base_tokens = _text_tokens(base)
+    tokens = _text_tokens(text)
+    base_starts = _token_lines(base_tokens)
+    starts = _token_lines(tokens)
+    base_lines = [''.join(base_tokens[a:b]) for a, b in zip(base_starts, base_starts[1:])]
+    lines = [''.join(tokens[a:b]) for a, b in zip(starts, starts[1:])]
+    
+    delta = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, base_lines, lines, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            continue
+        b1, b2 = base_starts[i1], base_starts[i2]
+        t1, t2 = starts[j1], starts[j2]
+        # Token-level matching is quadratic; a huge rewritten block is kept as one replacement
+        if tag != 'replace' or (b2 - b1) * (t2 - t1) > TEXT_DELTA_MAX_BLOCK:
+            delta.append([b1, b2, ''.join(tokens[t1:t2])])
+            continue
+        matcher = SequenceMatcher(None, base_tokens[b1:b2], tokens[t1:t2], autojunk=False)
+        for op, k1, k2, l1, l2 in matcher.get_opcodes():
+            if op != 'equal':
+                delta.append([b1 + k1, b1 + k2, ''.join(tokens[t1 + l1:t1 + l2])])
+    return delta
+
+def apply_text_delta(base: str, delta: list) -> str:
+    tokens = _text_tokens(base)
+    parts = []
+    position = 0
+    for start, end, replacement in delta:
+        parts.extend(tokens[position:start])
+        parts.append(replacement)
+        position = end
+    parts.extend(tokens[position:])
+    return ''.join(parts)
+
+@functools.lru_cache(maxsize=128)
+def _token_offsets(text: str) -> dict:
+    """Character offset -> index of the token starting there (plus the end offset)"""
+    offsets = {}
+    position = 0
+    for index, token in enumerate(_text_tokens(text)):
+        offsets[position] = index
+        position += len(token)
+    offsets[position] = len(offsets)
+    return offsets
+
+def placeholder_delta(base: str, values: dict) -> list:
+    """Delta equal to text_delta(base, fill_placeholders(base, values)), built without diffing.
+    '{' and '}' are single tokens, so every {{key}} slot spans whole tokens."""
+    if not values:
+        return []
+    offsets = _token_offsets(base)
+    return [[offsets[m.start()], offsets[m.end()], values[m.group(1)]]
+            for m in _placeholder_pattern(tuple(values)).finditer(base)]
+
+def _delta_size(delta: list) -> int:
+    return sum(len(replacement.encode('utf-8')) + 16 for _, _, replacement in delta)
+
+def compact_text(base: Optional[str], text) -> Optional[list]:
+    """Delta for text against base, or None when storing it in full is as good"""
+    if not base or not isinstance(text, str) or not text:
+        return None
+    delta = text_delta(base, text)
+    if _delta_size(delta) > COMPACT_MAX_DELTA_RATIO * len(text.encode('utf-8')):
+        return None
+    if apply_text_delta(base, delta) != text:  # never store something that does not round-trip
+        return None
+    return delta
+
+
+async def _compaction_base(contract: dict) -> Optional[dict]:
+    """Pinned template snapshot the contract's texts can be diffed against (immutable only)"""
+    if not contract.get('template_id') or contract.get('template_version') is None:
+        return None
+    return await template_catalog.get_version(contract['template_id'], contract['template_version'])
+
+def compact_contract_doc(doc: dict, template: dict) -> dict:
+    """Move the compactable text fields of doc into doc['content_delta'] (in place)"""
+    deltas = dict(doc.get('content_delta') or {})
+    for field, base_field in CONTRACT_TEXT_FIELDS.items():
+        delta = compact_text(template.get(base_field), doc.get(field))
+        if delta is not None:
+            deltas[field] = delta
+            doc.pop(field)
+    if deltas:
+        doc['content_delta'] = deltas
+    return doc
+
+async def contract_text_update(contract: dict, fields: dict) -> dict:
+    """Update document for fields; texts of template-pinned contracts are stored as deltas"""
+    if contract.get('archived') and any(field in ARCHIVE_CONTRACT_FIELDS for field in fields):
+        await contract_archive.restore(contract['id'])
+    update = {"$set": dict(fields)}
+    if not any(field in fields for field in CONTRACT_TEXT_FIELDS):
+        return update
+    template = await _compaction_base(contract)
+    if template is None:
+        return update
+    unset = {}
+    for field, base_field in CONTRACT_TEXT_FIELDS.items():
+        if field not in fields:
+            continue
+        delta = compact_text(template.get(base_field), fields[field])
+        if delta is not None:
+            update["$set"].pop(field)
+            update["$set"][f"content_delta.{field}"] = delta
+            unset[field] = ""
+        else:
+            unset[f"content_delta.{field}"] = ""
+    if unset:
+        update["$unset"] = unset
+    return update
+
+
+_materialized_texts = None
+
+async def materialize_contract(contract: Optional[dict]) -> Optional[dict]:
+    """Fill in the text fields of a compact contract (in place)"""
+    from collections import OrderedDict
+    
+    global _materialized_texts
+    if not contract or not contract.get('content_delta'):
+        return contract
+    if _materialized_texts is None:
+        _materialized_texts = OrderedDict()
     
-    current_status = user.get('is_active', True)
-    new_status = not current_status
+    template = None
+    for field, delta in contract['content_delta'].items():
+        if contract.get(field) is not None:
+            continue
+        # The delta itself is the key (not its hash): a collision would hand out another contract's text
+        key = (contract.get('template_id'), contract.get('template_version'), field,
+               tuple((start, end, text) for start, end, text in delta))
+        text = _materialized_texts.get(key)
+        if text is None:
+            if template is None:
+                template = await _compaction_base(contract)
+            if template is None:
+                logging.error(f"❌ Contract {contract.get('id')}: template version "
+                              f"{contract.get('template_id')}@{contract.get('template_version')} missing, cannot materialise {field}")
+                continue
+            text = apply_text_delta(template.get(CONTRACT_TEXT_FIELDS[field]) or '', delta)
+            _materialized_texts[key] = text
+            if len(_materialized_texts) > MATERIALIZED_CACHE_SIZE:
+                _materialized_texts.popitem(last=False)
+        else:
+            _materialized_texts.move_to_end(key)
+        contract[field] = text
+    contract.pop('content_delta')
+    return contract
+
+async def materialize_contracts(contracts: list) -> list:
+    """List variant of find_contract's post-processing: archived contracts are rehydrated
+    with one contracts_archive query, then compact texts are materialised"""
+    await contract_archive.rehydrate_many(contracts)
+    for contract in contracts:
+        if contract.get('archived'):
+            contract.setdefault('content', '')  # archive record missing
+        await materialize_contract(contract)
+    return contracts
+
+async def find_contract(query: dict, projection: dict = None) -> Optional[dict]:
+    """db.contracts.find_one with archived fields rehydrated and compact texts materialised"""
+    contract = await contract_archive.rehydrate(await db.contracts.find_one(query, projection), 'contract')
+    return await materialize_contract(contract)
+
+async def find_signature(query: dict, projection: dict = None) -> Optional[dict]:
+    """db.signatures.find_one with the archived ID document rehydrated"""
+    return await contract_archive.rehydrate(await db.signatures.find_one(query, projection), 'signature')
+
+
+def _bson_size(doc: dict) -> int:
+    import bson
+    return len(bson.encode({k: v for k, v in doc.items() if k != '_id'}))
+
+
+class CompactMigrationRequest(BaseModel):
+    dry_run: bool = True
+    limit: int = 1000
+    details: bool = True  # per-contract rows in the report
+
+
+@api_router.post("/admin/contracts/compact")
+async def compact_contracts(
+    request: CompactMigrationRequest,
+    current_user: dict = Depends(get_current_admin)
+):
+    """Migrate template-based contracts to the compact representation.
+    dry_run=true only reports the BSON bytes each contract would save."""
+    query = {"template_id": {"$nin": [None, ""]}, "content_delta": {"$exists": False}}
+    report = {"dry_run": request.dry_run, "scanned": 0, "compacted": 0, "skipped": 0,
+              "bytes_before": 0, "bytes_after": 0, "contracts": []}
+    
+    async for doc in db.contracts.find(query).limit(max(1, min(request.limit, 10000))):
+        report["scanned"] += 1
+        pin = {}
+        if doc.get('template_version') is None:
+            # Contracts created before versioning are diffed against the current version
+            current = await template_catalog.get(doc['template_id'])
+            if current and current.get('version') is not None:
+                pin = {"template_version": current['version']}
+        template = await _compaction_base({**doc, **pin})
+        compacted = compact_contract_doc({**doc, **pin}, template) if template else None
+        if not compacted or not compacted.get('content_delta'):
+            report["skipped"] += 1
+            continue
+        
+        before = _bson_size(doc)
+        after = _bson_size(compacted)
+        report["compacted"] += 1
+        report["bytes_before"] += before
+        report["bytes_after"] += after
+        fields = sorted(compacted['content_delta'])
+        if request.details:
+            report["contracts"].append({
+                "id": doc.get('id'), "contract_code": doc.get('contract_code'),
+                "bytes_before": before, "bytes_after": after, "bytes_saved": before - after, "fields": fields,
+            })
+        if request.dry_run:
+            continue
+        
+        # Only if none of the texts changed since they were read
+        result = await db.contracts.update_one(
+            {"_id": doc['_id'], **{field: doc[field] for field in fields}},
+            {"$set": {"content_delta": compacted['content_delta'], **pin},
+             "$unset": {field: "" for field in fields}}
+        )
+        if result.modified_count == 0:
+            report["compacted"] -= 1
+            report["skipped"] += 1
     
-    await db.users.update_one(
-        {"id": user_id},
-        {"$set": {"is_active": new_status}}
-    )
+    report["bytes_saved"] = report["bytes_before"] - report["bytes_after"]
+    report["avg_bytes_saved"] = report["bytes_saved"] // report["compacted"] if report["compacted"] else 0
+    if not request.dry_run:
+        await log_audit("contracts_compacted", user_id=current_user['user_id'],
+                        details=f"{report['compacted']} contracts, {report['bytes_saved']} bytes saved")
+    return report
+
+
+# ==================== COLD CONTRACT ARCHIVE ====================
+
+# Fields that leave the hot documents; everything else (status, parties, codes, dates) stays
+ARCHIVE_CONTRACT_FIELDS = (
+    'content', 'content_kk', 'content_en', 'approved_content', 'content_delta',
+    'landlord_document_upload', 'approved_placeholder_values',
+)
+ARCHIVE_SIGNATURE_FIELDS = ('document_upload',)
+
+
+def _archive_compress(payload: dict) -> tuple:
+    import bson
     
-    action = "activated" if new_status else "deactivated"
-    await log_audit(f"admin_user_{action}", user_id=current_user.get('user_id'), 
-                   details=f"User {user.get('email')} was {action}")
+    raw = bson.encode(payload)
+    return 'zstd', zstandard.ZstdCompressor(level=ARCHIVE_ZSTD_LEVEL).compress(raw), len(raw)
+
+def _archive_decompress(codec: str, blob: bytes) -> dict:
+    import bson
     
-    return {
-        "message": f"User {action} successfully",
-        "is_active": new_status
-    }
+    if codec != 'zstd':
+        raise RuntimeError(f"Unknown contract archive codec: {codec!r}")
+    return bson.decode(zstandard.ZstdDecompressor().decompress(blob))
 
 
-@api_router.delete("/admin/users/{user_id}")
-async def delete_user(user_id: str, current_user: dict = Depends(get_current_user)):
-    """Полностью удалить пользователя из базы данных"""
-    if current_user.get('role') != 'admin':
-        raise HTTPException(status_code=403, detail="Admin access required")
+def merge_archived_fields(doc: dict, archived: dict) -> dict:
+    """Put archived fields back into a hot document (in place); anything written after archiving wins.
+    A text counts as written in either form (full field or content_delta entry), so an archived
+    copy of it is dropped in both forms; other dict fields are merged key by key."""
+    hot_delta = doc.get('content_delta') or {}
+    rewritten = {field for field in CONTRACT_TEXT_FIELDS if field in doc or field in hot_delta}
+    for key, value in archived.items():
+        if key == 'content_delta' or key in rewritten:
+            continue
+        if isinstance(value, dict) and isinstance(doc.get(key), dict):
+            doc[key] = {**value, **doc[key]}
+        else:
+            doc.setdefault(key, value)
+    archived_delta = {field: delta for field, delta in (archived.get('content_delta') or {}).items()
+                      if field not in rewritten}
+    if archived_delta:
+        doc['content_delta'] = {**archived_delta, **hot_delta}
+    return doc
+
+
+class ContractArchiver:
+    """Moves the heavy fields of cold contracts (and their signatures' ID documents) into
+    db.contracts_archive as one compressed BSON blob per document, leaving summary fields
+    hot. find_contract()/find_signature()/materialize_contracts() rehydrate archived documents
+    transparently, and restore() un-archives a contract before its texts are written. Archiving is idempotent and guarded, so every worker may run it.
+    """
     
-    user = await db.users.find_one({"id": user_id})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    def __init__(self, interval: float, batch_size: int):
+        from collections import deque
+        
+        self.interval = interval
+        self.batch_size = batch_size
+        self.rehydrate_ms = deque(maxlen=1000)
+        self._task = None
+    
+    def _candidates_query(self) -> dict:
+        now = datetime.now(timezone.utc)
+        signed_cutoff = now - timedelta(days=ARCHIVE_SIGNED_AFTER_DAYS)
+        stale_cutoff = now - timedelta(days=ARCHIVE_STALE_AFTER_DAYS)
+        return {
+            "archived": {"$ne": True},
+            "$or": [
+                {"deleted": True},
+                {"status": "signed", "updated_at": {"$lt": signed_cutoff}},
+                {"updated_at": {"$lt": stale_cutoff}},
+            ],
+        }
     
-    # Нельзя удалить самого себя
-    if user_id == current_user.get('user_id'):
-        raise HTTPException(status_code=400, detail="Cannot delete yourself")
+    async def archive_contract(self, contract: dict) -> Optional[dict]:
+        """Archive one hot contract document; returns its size stats or None if nothing moved"""
+        from bson import Binary
+        
+        fields = {k: contract[k] for k in ARCHIVE_CONTRACT_FIELDS if contract.get(k) is not None}
+        signature = await db.signatures.find_one({"contract_id": contract['id'], "archived": {"$ne": True}})
+        signature_fields = {k: signature[k] for k in ARCHIVE_SIGNATURE_FIELDS if signature and signature.get(k)}
+        if not fields and not signature_fields:
+            return None
+        
+        codec, blob, raw_size = _archive_compress(fields)
+        record = {"contract_id": contract['id'], "codec": codec, "contract_blob": Binary(blob),
+                  "raw_bytes": raw_size, "compressed_bytes": len(blob),
+                  "archived_at": datetime.now(timezone.utc)}
+        if signature_fields:
+            codec, signature_blob, signature_raw = _archive_compress(signature_fields)
+            record.update({"signature_blob": Binary(signature_blob), "signature_codec": codec})
+            record["raw_bytes"] += signature_raw
+            record["compressed_bytes"] += len(signature_blob)
+        await db.contracts_archive.replace_one({"contract_id": contract['id']}, record, upsert=True)
+        
+        # The archive is written first; the hot document only loses fields it still has unchanged
+        result = await db.contracts.update_one(
+            {"_id": contract['_id'], "archived": {"$ne": True}, "updated_at": contract.get('updated_at')},
+            {"$set": {"archived": True, "archived_at": record['archived_at']},
+             "$unset": {k: "" for k in fields}}
+        )
+        if result.modified_count == 0:
+            await db.contracts_archive.delete_one({"contract_id": contract['id'], "archived_at": record['archived_at']})
+            return None
+        if signature_fields:
+            await db.signatures.update_one(
+                {"_id": signature['_id']},
+                {"$set": {"archived": True}, "$unset": {k: "" for k in signature_fields}}
+            )
+        return {"raw_bytes": record['raw_bytes'], "compressed_bytes": record['compressed_bytes']}
     
-    # Удаляем пользователя полностью
-    await db.users.delete_one({"id": user_id})
+    async def run_once(self, limit: Optional[int] = None) -> dict:
+        summary = {"archived": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        async for contract in db.contracts.find(self._candidates_query()).limit(limit or self.batch_size):
+            try:
+                stats = await self.archive_contract(contract)
+            except Exception as e:
+                logging.error(f"❌ Archiving contract {contract.get('id')} failed: {str(e)}")
+                continue
+            if stats:
+                summary["archived"] += 1
+                summary["raw_bytes"] += stats['raw_bytes']
+                summary["compressed_bytes"] += stats['compressed_bytes']
+        if summary["archived"]:
+            logging.info(f"🗄️ Archived {summary['archived']} contracts: {summary['raw_bytes']} -> {summary['compressed_bytes']} bytes")
+        return summary
+    
+    async def rehydrate(self, doc: Optional[dict], kind: str) -> Optional[dict]:
+        """Put archived fields back into a contract or signature document (in place)"""
+        if not doc or not doc.get('archived'):
+            return doc
+        start = time.perf_counter()
+        contract_id = doc.get('id') if kind == 'contract' else doc.get('contract_id')
+        blob_field, codec_field = ('contract_blob', 'codec') if kind == 'contract' else ('signature_blob', 'signature_codec')
+        record = await db.contracts_archive.find_one({"contract_id": contract_id}, {"_id": 0, blob_field: 1, codec_field: 1})
+        if record is None or record.get(blob_field) is None:
+            if record is None:
+                logging.error(f"❌ Archived {kind} of contract {contract_id} has no contracts_archive record")
+            return doc
+        merge_archived_fields(doc, _archive_decompress(record[codec_field], record[blob_field]))
+        elapsed = time.perf_counter() - start
+        self.rehydrate_ms.append(elapsed * 1000)
+        metrics.observe("archive_rehydrate_seconds", elapsed, (("kind", kind),))
+        return doc
+    
+    async def rehydrate_many(self, contracts: list) -> list:
+        """List variant of rehydrate for contracts: one contracts_archive query for the whole page"""
+        archived = {doc['id']: doc for doc in contracts if doc.get('archived') and doc.get('id')}
+        if not archived:
+            return contracts
+        start = time.perf_counter()
+        async for record in db.contracts_archive.find(
+            {"contract_id": {"$in": list(archived)}, "contract_blob": {"$ne": None}},
+            {"_id": 0, "contract_id": 1, "codec": 1, "contract_blob": 1}
+        ):
+            merge_archived_fields(archived[record['contract_id']], _archive_decompress(record['codec'], record['contract_blob']))
+        metrics.observe("archive_rehydrate_seconds", time.perf_counter() - start, (("kind", "contract_list"),))
+        return contracts
+    
+    async def restore(self, contract_id: str) -> bool:
+        """Un-archive a contract before a write touches its archived fields, so the hot
+        document is complete again and partial writes (content_delta.<field>) cannot hide
+        archived values. Signature ID documents stay archived."""
+        doc = await db.contracts.find_one({"id": contract_id, "archived": True})
+        if doc is None:
+            return False
+        record = await db.contracts_archive.find_one({"contract_id": contract_id}, {"_id": 0, "codec": 1, "contract_blob": 1})
+        restored = {}
+        if record and record.get('contract_blob') is not None:
+            merged = merge_archived_fields({k: v for k, v in doc.items()}, _archive_decompress(record['codec'], record['contract_blob']))
+            restored = {k: v for k, v in merged.items() if doc.get(k) != v}
+        result = await db.contracts.update_one(
+            {"_id": doc['_id'], "archived": True},
+            {"$set": restored, "$unset": {"archived": "", "archived_at": ""}} if restored
+            else {"$unset": {"archived": "", "archived_at": ""}}
+        )
+        if not result.modified_count:
+            return False  # restored concurrently
+        if record is not None:
+            await db.contracts_archive.update_one(
+                {"contract_id": contract_id}, {"$unset": {"contract_blob": "", "codec": ""}}
+            )
+            await db.contracts_archive.delete_one({"contract_id": contract_id, "signature_blob": {"$exists": False}})
+        logging.info(f"🗄️ Restored archived contract {contract_id} before a write")
+        return True
     
-    # Также удаляем все его договора
-    await db.contracts.delete_many({"user_id": user_id})
+    async def _run(self):
+        import asyncio
+        
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                logging.error(f"❌ Contract archive job failed: {str(e)}")
     
-    await log_audit("admin_user_deleted", user_id=current_user.get('user_id'), 
-                   details=f"User {user.get('email')} was permanently deleted")
+    async def start(self):
+        import asyncio
+        
+        try:
+            await db.contracts_archive.create_index("contract_id", unique=True)
+        except Exception as e:
+            logging.warning(f"⚠️ Could not create contracts_archive index: {str(e)}")
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.get_event_loop().create_task(self._run())
     
-    return {"message": "User deleted successfully"}
+    async def stop(self):
+        import asyncio
+        
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+    
+    async def stats(self) -> dict:
+        totals = await db.contracts_archive.aggregate([{"$group": {
+            "_id": None, "count": {"$sum": 1},
+            "raw_bytes": {"$sum": "$raw_bytes"}, "compressed_bytes": {"$sum": "$compressed_bytes"},
+        }}]).to_list(1)
+        totals = totals[0] if totals else {"count": 0, "raw_bytes": 0, "compressed_bytes": 0}
+        latencies = sorted(self.rehydrate_ms)
+        
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 2) if latencies else None
+        
+        return {
+            "codec": "zstd",
+            "archived_contracts": totals['count'],
+            "raw_bytes": totals['raw_bytes'],
+            "compressed_bytes": totals['compressed_bytes'],
+            "ratio": round(totals['raw_bytes'] / totals['compressed_bytes'], 2) if totals['compressed_bytes'] else None,
+            "rehydrate_samples": len(latencies),
+            "rehydrate_ms_p50": pct(0.5),
+            "rehydrate_ms_p95": pct(0.95),
+            "rehydrate_ms_max": round(latencies[-1], 2) if latencies else None,
+        }
 
 
-# ==================== CONTRACT TEMPLATES ENDPOINTS ====================
+contract_archive = ContractArchiver(ARCHIVE_INTERVAL, ARCHIVE_BATCH_SIZE)
+metrics.describe("archive_rehydrate_seconds", "histogram", "Time to rehydrate an archived contract or signature")
+
+
+@api_router.get("/admin/archive/stats")
+async def get_archive_stats(current_user: dict = Depends(get_current_admin)):
+    """Compression ratio of the cold contract archive and recent rehydrate latency (this worker)"""
+    return await contract_archive.stats()
+
+@api_router.post("/admin/archive/run")
+async def run_contract_archive(limit: int = 200, current_user: dict = Depends(get_current_admin)):
+    """Archive one batch of cold contracts now"""
+    summary = await contract_archive.run_once(max(1, min(limit, 5000)))
+    await log_audit("contracts_archived", user_id=current_user['user_id'],
+                    details=f"{summary['archived']} contracts, {summary['raw_bytes']} -> {summary['compressed_bytes']} bytes")
+    return summary
+
 
 @api_router.get("/templates")
 async def get_templates(
+    request: Request,
+    response: Response,
     category: Optional[str] = None,
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
     """Получить список активных шаблонов (для маркетплейса)
-    Индивидуальные шаблоны (с assigned_users) показываются только назначенным пользователям
+    Индивидуальные шаблоны (с assigned_users) показываются только назначенным пользователям.
+    Возвращаются только карточки (без content/placeholders) - полный шаблон через /templates/{id}
     """
-    query = {"is_active": True}
-    if category:
-        query["category"] = category
+    templates = list(await template_catalog.public_summaries(category))
     
-    # Get all active templates
-    templates = await db.contract_templates.find(query, {"_id": 0}).sort("created_at", -1).to_list(100)
-    
-    # Filter: show only public templates OR templates assigned to current user
     user_id = current_user.get('user_id') if current_user else None
-    filtered_templates = []
-    for t in templates:
-        assigned_users = t.get('assigned_users', [])
-        if not assigned_users:
-            # Public template - show to everyone
-            filtered_templates.append(t)
-        elif user_id and user_id in assigned_users:
-            # Individual template - show only to assigned user
-            t['is_individual'] = True  # Mark as individual
-            filtered_templates.append(t)
-    
-    return filtered_templates
+    if user_id:
+        individual = await template_catalog.assigned_summaries(user_id, category)
+        if individual:
+            templates = sorted(individual + templates, key=lambda t: as_utc(t.get('created_at')) or datetime.min.replace(tzinfo=timezone.utc), reverse=True)
+    templates = templates[:TEMPLATE_LIST_LIMIT]
+    
+    # Summaries come from the in-memory catalog; the tag covers exactly the cards returned
+    etag = weak_etag("templates", category, *(f"{t.get('id')}:{version_stamp(t)}" for t in templates))
+    not_modified = conditional_get(request, response, "templates", etag)
+    if not_modified:
+        return not_modified
+    return templates
 
 @api_router.get("/templates/{template_id}")
 async def get_template(
     template_id: str,
+    request: Request,
+    response: Response,
+    version: Optional[int] = None,
     current_user: Optional[dict] = Depends(get_current_user_optional)
 ):
-    """Получить детали шаблона"""
-    template = await db.contract_templates.find_one({"id": template_id, "is_active": True}, {"_id": 0})
-    if not template:
+    """Получить детали шаблона
+    version - конкретная (неизменяемая) версия, например та, по которой создан договор
+    """
+    template = await template_catalog.get(template_id, version)
+    # A pinned version stays readable after the template is retired
+    if not template or (version is None and not template.get('is_active')):
         raise HTTPException(status_code=404, detail="Template not found")
+    template.pop('compiled', None)
     
     # Check if individual template - only assigned users can access
     assigned_users = template.get('assigned_users', [])
@@ -5101,6 +8022,10 @@ async def get_template(
             raise HTTPException(status_code=403, detail="This template is not available to you")
         template['is_individual'] = True
     
+    not_modified = conditional_get(request, response, "template",
+                                   weak_etag("template", template_id, version, version_stamp(template)))
+    if not_modified:
+        return not_modified
     return template
 
 # === Favorite Templates Endpoints ===
@@ -5114,8 +8039,8 @@ async def add_favorite_template(
     user_id = current_user['user_id']
     
     # Проверить что шаблон существует
-    template = await db.contract_templates.find_one({"id": template_id, "is_active": True})
-    if not template:
+    template = await template_catalog.get(template_id)
+    if not template or not template.get('is_active'):
         raise HTTPException(status_code=404, detail="Template not found")
     
     # Добавить в избранное (если еще не добавлен)
@@ -5160,12 +8085,7 @@ async def get_favorite_templates(current_user: dict = Depends(get_current_user))
         return []
     
     # Получить шаблоны (не проверяем is_active, показываем все избранные)
-    templates = await db.contract_templates.find(
-        {"id": {"$in": favorite_ids}},
-        {"_id": 0}
-    ).to_list(100)
-    
-    return templates
+    return await template_catalog.summaries_by_ids(favorite_ids)
 
 
 @api_router.post("/admin/templates")
@@ -5178,12 +8098,15 @@ async def create_template(
         raise HTTPException(status_code=403, detail="Admin access required")
     
     template_dict = template.model_dump()
+    template_dict['version'] = 1
     logging.info(f"🔍 Creating template: {template.title}, ID: {template.id}")
     logging.info(f"📝 Template dict keys: {list(template_dict.keys())}")
     logging.info(f"📏 Content lengths: RU={len(template_dict.get('content',''))}, KK={len(template_dict.get('content_kk',''))}, EN={len(template_dict.get('content_en',''))}")
     
     result = await db.contract_templates.insert_one(template_dict)
     logging.info(f"✅ Template inserted with _id: {result.inserted_id}")
+    await template_catalog.save_version(template_dict, current_user['user_id'])
+    template_catalog.invalidate(template.id)
     
     await log_audit("template_created", user_id=current_user['user_id'], 
                    details=f"Created template: {template.title}")
@@ -5203,12 +8126,10 @@ async def update_template(
     template_dict = template.model_dump(exclude={'id'})  # Exclude ID to preserve original
     template_dict['updated_at'] = datetime.now(timezone.utc)
     
-    result = await db.contract_templates.update_one(
-        {"id": template_id},
-        {"$set": template_dict}
-    )
+    # Every save is a new immutable version; existing contracts keep theirs
+    updated = await template_catalog.commit_change(template_id, {"$set": template_dict}, current_user['user_id'])
     
-    if result.matched_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail="Template not found")
     
     await log_audit("template_updated", user_id=current_user['user_id'], 
@@ -5225,12 +8146,13 @@ async def delete_template(
     if current_user.get('role') != 'admin':
         raise HTTPException(status_code=403, detail="Admin access required")
     
-    result = await db.contract_templates.update_one(
-        {"id": template_id},
-        {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}}
+    updated = await template_catalog.commit_change(
+        template_id,
+        {"$set": {"is_active": False, "updated_at": datetime.now(timezone.utc)}},
+        current_user['user_id']
     )
     
-    if result.matched_count == 0:
+    if updated is None:
         raise HTTPException(status_code=404, detail="Template not found")
     
     await log_audit("template_deleted", user_id=current_user['user_id'], 
@@ -5245,7 +8167,7 @@ async def get_all_templates(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Admin access required")
     
     templates = await db.contract_templates.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    return templates
+    return FastJSONResponse(templates)
 
 
 
@@ -5383,8 +8305,15 @@ async def get_user_logs(
     }
 
 @api_router.get("/admin/system/metrics")
-async def get_system_metrics(current_user: dict = Depends(get_current_user)):
-    """Получить системные метрики (только админ)"""
+async def get_system_metrics(
+    history_minutes: int = 0,
+    current_user: dict = Depends(get_current_user)
+):
+    """Получить системные метрики (только админ)
+    
+    Returns the latest background sample; history_minutes (up to
+    METRICS_HISTORY_SECONDS) adds the ring-buffer time series.
+    """
     try:
         if current_user.get('role') != 'admin':
             raise HTTPException(status_code=403, detail="Admin access required")
@@ -5393,152 +8322,23 @@ async def get_system_metrics(current_user: dict = Depends(get_current_user)):
     
     # Always return a valid response, never 500
     try:
-        # Default values
-        cpu_percent = 0
-        memory_info = {"total_gb": 0, "used_gb": 0, "available_gb": 0, "percent": 0}
-        disk_info = {"total_gb": 0, "used_gb": 0, "free_gb": 0, "percent": 0}
-        uptime_days = 0
-        uptime_hours = 0
-        uptime_seconds = 0
-        network_stats = None
-        recent_errors = []
-        db_info = {"size_mb": 0, "collections": 0, "indexes": 0}
-        active_users_count = 0
-        online_users_count = 0
-        status = "healthy"
-        
-        # System metrics (only if psutil is available)
-        if PSUTIL_AVAILABLE and psutil:
-            try:
-                cpu_percent = psutil.cpu_percent(interval=0.1) or 0
-            except Exception:
-                pass
-            
-            try:
-                memory = psutil.virtual_memory()
-                memory_info = {
-                    "total_gb": round(memory.total / (1024**3), 2),
-                    "used_gb": round(memory.used / (1024**3), 2),
-                    "available_gb": round(memory.available / (1024**3), 2),
-                    "percent": memory.percent
-                }
-            except Exception:
-                pass
-            
-            try:
-                disk = psutil.disk_usage('/')
-                disk_info = {
-                    "total_gb": round(disk.total / (1024**3), 2),
-                    "used_gb": round(disk.used / (1024**3), 2),
-                    "free_gb": round(disk.free / (1024**3), 2),
-                    "percent": disk.percent
-                }
-            except Exception:
-                pass
-            
-            try:
-                boot_time = psutil.boot_time()
-                uptime_seconds = time.time() - boot_time
-                uptime_days = int(uptime_seconds // 86400)
-                uptime_hours = int((uptime_seconds % 86400) // 3600)
-            except Exception:
-                pass
-            
-            try:
-                net_io = psutil.net_io_counters()
-                network_stats = {
-                    "bytes_sent": net_io.bytes_sent,
-                    "bytes_recv": net_io.bytes_recv,
-                    "packets_sent": net_io.packets_sent,
-                    "packets_recv": net_io.packets_recv
-                }
-            except Exception:
-                pass
-        else:
-            status = "limited"  # psutil not available
-        
-        # Recent errors from logs
-        try:
-            log_paths = [
-                '/var/log/supervisor/backend.err.log',
-                '/var/log/backend.err.log',
-                'backend.err.log'
-            ]
-            for log_path in log_paths:
-                try:
-                    with open(log_path, 'r') as f:
-                        error_lines = f.readlines()[-100:]
-                        recent_errors = [line.strip() for line in error_lines if 'ERROR' in line or 'Exception' in line][-20:]
-                        break
-                except (FileNotFoundError, PermissionError):
-                    continue
-        except Exception:
-            pass
-        
-        # Database stats
-        try:
-            db_stats = await db.command("dbStats")
-            db_info = {
-                "size_mb": round(db_stats.get('dataSize', 0) / (1024**2), 2),
-                "collections": db_stats.get('collections', 0),
-                "indexes": db_stats.get('indexes', 0)
-            }
-        except Exception:
-            pass
-        
-        # Active users (logged in last 24h)
-        try:
-            yesterday = datetime.now(timezone.utc) - timedelta(days=1)
-            active_users_count = await db.user_logs.count_documents({
-                "action": "login_success",
-                "timestamp": {"$gte": yesterday.isoformat()}
-            })
-        except Exception:
-            pass
-        
-        # Online users (any activity in last 15 minutes)
-        try:
-            fifteen_min_ago = datetime.now(timezone.utc) - timedelta(minutes=15)
-            online_pipeline = [
-                {"$match": {"timestamp": {"$gte": fifteen_min_ago.isoformat()}}},
-                {"$group": {"_id": "$user_id"}},
-                {"$count": "unique_users"}
-            ]
-            online_result = await db.user_logs.aggregate(online_pipeline).to_list(1)
-            online_users_count = online_result[0]['unique_users'] if online_result else 0
-        except Exception:
-            pass
-        
-        return {
-            "status": status,
-            "cpu_percent": cpu_percent,
-            "memory": memory_info,
-            "disk": disk_info,
-            "uptime": {
-                "days": uptime_days,
-                "hours": uptime_hours,
-                "total_seconds": int(uptime_seconds)
-            },
-            "network": network_stats,
-            "database": db_info,
-            "active_users_24h": active_users_count,
-            "online_users": online_users_count,
-            "recent_errors": recent_errors[-20:] if recent_errors else []
-        }
+        snapshot = metrics_sampler.latest
+        if snapshot is None:
+            # Sampler has not completed its first pass yet (just after startup)
+            snapshot = await metrics_sampler.sample()
+        response = dict(snapshot)
+        response["log_sink"] = log_sink.snapshot()
+        if history_minutes > 0:
+            response["history"] = metrics_sampler.history_window(
+                min(history_minutes * 60, METRICS_HISTORY_SECONDS)
+            )
+        return response
     except Exception as e:
         # Absolute fallback - NEVER return 500
-        return {
-            "status": "error",
-            "cpu_percent": 0,
-            "memory": {"total_gb": 0, "used_gb": 0, "available_gb": 0, "percent": 0},
-            "disk": {"total_gb": 0, "used_gb": 0, "free_gb": 0, "percent": 0},
-            "uptime": {"days": 0, "hours": 0, "total_seconds": 0},
-            "network": None,
-            "database": {"size_mb": 0, "collections": 0, "indexes": 0},
-            "active_users_24h": 0,
-            "online_users": 0,
-            "recent_errors": [f"Metrics error: {str(e)}"]
-        }
+        response = _empty_system_snapshot()
+        response["status"] = "error"
+        response["recent_errors"] = [f"Metrics error: {str(e)}"]
+        return response
 
 
     
@@ -5581,7 +8381,7 @@ async def upload_notification_image(
 # FreedomPay Configuration
 FREEDOMPAY_MERCHANT_ID = os.environ.get('FREEDOMPAY_MERCHANT_ID', '581401')
 FREEDOMPAY_SECRET_KEY = os.environ.get('FREEDOMPAY_SECRET_KEY', 'h8pdepQhoWNM0bGT')
-FREEDOMPAY_API_URL = 'https://api.freedompay.kz'
+FREEDOMPAY_API_URL = os.environ.get('FREEDOMPAY_API_URL', 'https://api.freedompay.kz')
 FREEDOMPAY_TESTING_MODE = os.environ.get('FREEDOMPAY_TESTING_MODE', '1')  # 1 = test, 0 = live
 
 def generate_freedompay_signature(script_name: str, params: dict, secret_key: str) -> str:
@@ -5739,7 +8539,6 @@ async def create_payment(
     )
     
     payment_dict = payment.model_dump()
-    payment_dict['created_at'] = payment_dict['created_at'].isoformat() if payment_dict.get('created_at') else None
     await db.payments.insert_one(payment_dict)
     
     # Prepare FreedomPay request
@@ -5880,8 +8679,6 @@ async def payment_result(request: Request):
                 payment_id=payment['id']
             )
             req_dict = request_obj.model_dump()
-            req_dict['created_at'] = req_dict['created_at'].isoformat() if req_dict.get('created_at') else None
-            req_dict['updated_at'] = req_dict['updated_at'].isoformat() if req_dict.get('updated_at') else None
             await db.custom_template_requests.insert_one(req_dict)
             
             # No subscription change for custom_template
@@ -5903,8 +8700,6 @@ async def payment_result(request: Request):
         
         if subscription:
             sub_dict = subscription.model_dump()
-            sub_dict['started_at'] = sub_dict['started_at'].isoformat() if sub_dict.get('started_at') else None
-            sub_dict['expires_at'] = sub_dict['expires_at'].isoformat() if sub_dict.get('expires_at') else None
             
             # Upsert subscription
             await db.subscriptions.update_one(
@@ -5921,17 +8716,17 @@ async def payment_result(request: Request):
             )
         
         # Update payment status
-        expires_at_iso = None
+        subscription_expires_at = None
         if payment['plan_id'] not in ['custom_contracts', 'custom_template']:
-            expires_at_iso = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+            subscription_expires_at = datetime.now(timezone.utc) + timedelta(days=30)
         
         await db.payments.update_one(
             {"id": payment['id']},
             {"$set": {
                 "status": "success",
                 "pg_payment_id": pg_payment_id,
-                "paid_at": datetime.now(timezone.utc).isoformat(),
-                "expires_at": expires_at_iso
+                "paid_at": datetime.now(timezone.utc),
+                "expires_at": subscription_expires_at
             }}
         )
         
@@ -6040,9 +8835,7 @@ async def get_current_subscription(current_user: dict = Depends(get_current_user
     
     # Check if expired
     if subscription.get('expires_at'):
-        expires_at = subscription['expires_at']
-        if isinstance(expires_at, str):
-            expires_at = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+        expires_at = as_utc(subscription['expires_at'])
         
         if expires_at < datetime.now(timezone.utc):
             # Expired - revert to free
@@ -6130,7 +8923,7 @@ async def create_custom_template_request(
             "uploaded_document": uploaded_document,
             "uploaded_document_filename": uploaded_document_filename,
             "status": "in_progress",
-            "updated_at": datetime.now(timezone.utc).isoformat()
+            "updated_at": datetime.now(timezone.utc)
         }}
     )
     
@@ -6191,12 +8984,12 @@ async def update_custom_template_request(
     if not request:
         raise HTTPException(status_code=404, detail="Request not found")
     
-    update_data = {"updated_at": datetime.now(timezone.utc).isoformat()}
+    update_data = {"updated_at": datetime.now(timezone.utc)}
     
     if new_status:
         update_data["status"] = new_status
         if new_status == "completed":
-            update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
+            update_data["completed_at"] = datetime.now(timezone.utc)
     
     if admin_notes is not None:
         update_data["admin_notes"] = admin_notes
@@ -6204,9 +8997,10 @@ async def update_custom_template_request(
     if assigned_template_id:
         update_data["assigned_template_id"] = assigned_template_id
         # Also update the template to be assigned to this user only
-        await db.contract_templates.update_one(
-            {"id": assigned_template_id},
-            {"$addToSet": {"assigned_users": request['user_id']}}
+        await template_catalog.commit_change(
+            assigned_template_id,
+            {"$addToSet": {"assigned_users": request['user_id']}},
+            current_user['user_id']
         )
     
     await db.custom_template_requests.update_one(
@@ -6322,7 +9116,7 @@ async def upload_pdf_contract(
     )
     
     contract_dict = contract.model_dump()
-    await db.contracts.insert_one(contract_dict)
+    await insert_with_unique_retry(db.contracts, contract_dict, "contract_code", generate_contract_code)
     
     # Generate signature link
     signature_link = f"/sign/{contract.id}"
@@ -6340,6 +9134,268 @@ async def upload_pdf_contract(
         "signature_link": signature_link
     }
 
+# ==================== REQUEST PROFILING ====================
+
+class _StackSampler(threading.Thread):
+    """Statistical profiler: samples one thread's Python stack every interval seconds"""
+    
+    def __init__(self, thread_id: int, interval: float):
+        super().__init__(daemon=True)
+        from collections import Counter
+        
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+    
+    def run(self):
+        import sys
+        
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+    
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+    
+    def summary(self, limit: int = 30) -> dict:
+        from collections import Counter
+        
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return {
+            "samples": self.samples,
+            "interval_ms": round(self.interval * 1000, 3),
+            "top_own": [{"function": f, "samples": c} for f, c in own.most_common(limit)],
+            "top_cumulative": [{"function": f, "samples": c} for f, c in total.most_common(limit)],
+            "stacks": [{"stack": st, "samples": c} for st, c in self.stacks.most_common(limit)],
+        }
+
+class RequestProfiler:
+    """Arms profiling for the next N requests of a route, or for requests carrying a signed header.
+    
+    Only one request is profiled at a time (the stack sampler watches the event-loop
+    thread and tracemalloc is process-wide, so concurrent requests share the picture).
+    Arms are per worker process; the signed header works on whichever worker gets it.
+    """
+    
+    HEADER = b"x-profile-token"
+    
+    def __init__(self):
+        self.arms = {}
+        self._busy = False
+    
+    @property
+    def armed(self) -> bool:
+        return bool(self.arms)
+    
+    def arm(self, method: str, route: str, count: int):
+        self.arms[(method, route)] = count
+    
+    def disarm(self, method: str = None, route: str = None):
+        if method is None:
+            self.arms.clear()
+        else:
+            self.arms.pop((method, route), None)
+    
+    def take(self, method: str, route: str) -> bool:
+        key = (method, route)
+        remaining = self.arms.get(key)
+        if not remaining:
+            return False
+        if remaining <= 1:
+            del self.arms[key]
+        else:
+            self.arms[key] = remaining - 1
+        return True
+    
+    @staticmethod
+    def issue_token(expires_at: int) -> str:
+        import hmac
+        
+        digest = hmac.new(JWT_SECRET.encode(), f"profile:{expires_at}".encode(), hashlib.sha256).hexdigest()
+        return f"{expires_at}.{digest}"
+    
+    @classmethod
+    def token_valid(cls, token: str) -> bool:
+        import hmac
+        
+        try:
+            expires_at = int(token.split(".", 1)[0])
+        except (ValueError, IndexError):
+            return False
+        return expires_at >= time.time() and hmac.compare_digest(cls.issue_token(expires_at), token)
+
+request_profiler = RequestProfiler()
+
+class ProfilingMiddleware:
+    """Profiles armed requests; a single dict/header check otherwise"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or request_profiler._busy:
+            await self.app(scope, receive, send)
+            return
+        trigger = None
+        for name, value in scope["headers"]:
+            if name == RequestProfiler.HEADER:
+                if RequestProfiler.token_valid(value.decode('latin-1')):
+                    trigger = "header"
+                break
+        route = None
+        if trigger is None and request_profiler.armed:
+            route = _route_template(scope)
+            if request_profiler.take(scope["method"], route):
+                trigger = "armed"
+        if trigger is None:
+            await self.app(scope, receive, send)
+            return
+        await self._profile(scope, receive, send, trigger, route or _route_template(scope))
+    
+    async def _profile(self, scope, receive, send, trigger: str, route: str):
+        import asyncio
+        import tracemalloc
+        
+        request_profiler._busy = True
+        status_code = [500]
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+        
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        sampler = _StackSampler(threading.get_ident(), PROFILING_SAMPLE_INTERVAL_MS / 1000)
+        started_at = datetime.now(timezone.utc)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            duration = time.perf_counter() - start
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            request_profiler._busy = False
+            
+            allocation_filters = [tracemalloc.Filter(False, tracemalloc.__file__)]
+            allocations = [
+                {
+                    "location": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count_diff
+                }
+                for stat in after.filter_traces(allocation_filters).compare_to(
+                    before.filter_traces(allocation_filters), 'lineno'
+                )[:25]
+            ]
+            report = {
+                "id": str(uuid.uuid4()),
+                "method": scope["method"],
+                "path": scope["path"],
+                "route": route,
+                "trigger": trigger,
+                "status": status_code[0],
+                "duration_ms": round(duration * 1000, 2),
+                "started_at": started_at,
+                "profile": sampler.summary(),
+                "allocations": allocations,
+                "peak_traced_kb": round(peak / 1024, 1),
+                "request_id": request_id_var.get()
+            }
+            logging.info(f"🔬 Profiled {scope['method']} {route}: {report['duration_ms']} ms, {sampler.samples} samples")
+            asyncio.get_event_loop().create_task(_store_profiling_report(report))
+
+async def _store_profiling_report(report: dict):
+    try:
+        await db.profiling_reports.insert_one(report)
+    except Exception as e:
+        logging.error(f"❌ Failed to store profiling report: {str(e)}")
+
+async def ensure_profiling_collection():
+    """Capped collection: old reports roll off automatically"""
+    from pymongo.errors import CollectionInvalid
+    
+    try:
+        await db.create_collection("profiling_reports", capped=True, size=PROFILING_REPORTS_MB * 1024 * 1024)
+    except CollectionInvalid:
+        pass
+    except Exception as e:
+        logging.warning(f"⚠️ Could not create profiling_reports collection: {str(e)}")
+
+class ProfilingArmRequest(BaseModel):
+    route: str
+    method: str = "GET"
+    count: int = Field(default=1, ge=1, le=100)
+
+@api_router.post("/admin/profiling/arm")
+async def arm_request_profiling(data: ProfilingArmRequest, current_user: dict = Depends(get_current_admin)):
+    """Admin: profile the next N requests of a route template, e.g. GET /api/sign/{contract_id}"""
+    method = data.method.upper()
+    if not any(getattr(r, 'path', None) == data.route and method in (getattr(r, 'methods', None) or ()) for r in app.router.routes):
+        raise HTTPException(status_code=404, detail="Route not found")
+    request_profiler.arm(method, data.route, data.count)
+    return {"armed": [{"method": m, "route": r, "remaining": c} for (m, r), c in request_profiler.arms.items()]}
+
+@api_router.delete("/admin/profiling/arm")
+async def disarm_request_profiling(current_user: dict = Depends(get_current_admin)):
+    """Admin: cancel all pending profiling arms"""
+    request_profiler.disarm()
+    return {"armed": []}
+
+@api_router.post("/admin/profiling/token")
+async def create_profiling_token(current_user: dict = Depends(get_current_admin)):
+    """Admin: signed X-Profile-Token header value that profiles any request it is sent with"""
+    expires_at = int(time.time()) + PROFILING_TOKEN_TTL
+    return {
+        "header": "X-Profile-Token",
+        "token": RequestProfiler.issue_token(expires_at),
+        "expires_at": datetime.fromtimestamp(expires_at, timezone.utc).isoformat()
+    }
+
+@api_router.get("/admin/profiling/reports")
+async def list_profiling_reports(limit: int = 50, current_user: dict = Depends(get_current_admin)):
+    """Admin: latest profiling reports (summary only)"""
+    reports = await db.profiling_reports.find(
+        {},
+        {"_id": 0, "id": 1, "method": 1, "path": 1, "route": 1, "trigger": 1, "status": 1,
+         "duration_ms": 1, "started_at": 1, "peak_traced_kb": 1, "profile.samples": 1}
+    ).sort("$natural", -1).to_list(min(limit, 200))
+    return {"reports": reports, "armed": [{"method": m, "route": r, "remaining": c} for (m, r), c in request_profiler.arms.items()]}
+
+@api_router.get("/admin/profiling/reports/{report_id}")
+async def get_profiling_report(report_id: str, current_user: dict = Depends(get_current_admin)):
+    """Admin: full profiling report"""
+    report = await db.profiling_reports.find_one({"id": report_id}, {"_id": 0})
+    if not report:
+        raise HTTPException(status_code=404, detail="Report not found")
+    return report
+
+@api_router.get("/admin/http-cache/stats")
+async def get_http_cache_stats(current_user: dict = Depends(get_current_admin)):
+    """Admin: this worker's ETag hit ratios per route and compression ratios per encoding"""
+    return {**http_cache_stats.snapshot(), "verification_cache": verification_cache.stats()}
+
 # Include router
 app.include_router(api_router)
 
@@ -6351,13 +9407,230 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# ===== REQUEST METRICS =====
+def _route_template(scope) -> str:
+    """Route path template (e.g. /api/contracts/{contract_id}) so labels stay low-cardinality"""
+    from starlette.routing import Match
+    
+    partial = None
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+        if match == Match.PARTIAL and partial is None:
+            partial = route.path
+    return partial or "unmatched"
+
+class RequestMetricsMiddleware:
+    """Pure ASGI middleware: per-route request counts, latency histograms and in-flight gauges"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        labels = (("method", scope["method"]), ("route", _route_template(scope)))
+        status_code = [500]
+        
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status_code[0] = message["status"]
+            await send(message)
+        
+        metrics.inc("http_requests_in_flight", labels)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.inc("http_requests_in_flight", labels, -1)
+            metrics.observe("http_request_duration_seconds", time.perf_counter() - start, labels)
+            metrics.inc("http_requests_total", labels + (("status", str(status_code[0])),))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "image/svg+xml")
+
+class CompressionMiddleware:
+    """Pure ASGI middleware: br/gzip for complete JSON/text bodies of at least COMPRESS_MIN_SIZE.
+    
+    Streaming bodies (PDFs, file downloads) and already-encoded responses pass through untouched.
+    """
+    
+    # Bodies above this are compressed in a worker thread instead of on the event loop
+    THREAD_THRESHOLD = 256 * 1024
+    
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+    
+    @staticmethod
+    def _encoding(scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accepted = {part.split(b";")[0].strip() for part in value.lower().split(b",")}
+                if BROTLI_AVAILABLE and b"br" in accepted:
+                    return "br"
+                if b"gzip" in accepted:
+                    return "gzip"
+                return None
+        return None
+    
+    @staticmethod
+    def _compress(encoding: str, body: bytes) -> bytes:
+        import gzip
+        
+        if encoding == "br":
+            return brotli.compress(body, quality=COMPRESS_BROTLI_QUALITY)
+        return gzip.compress(body, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.minimum_size <= 0:
+            await self.app(scope, receive, send)
+            return
+        encoding = self._encoding(scope)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        pending_start = None
+        
+        async def send_compressed(message):
+            nonlocal pending_start
+            if message["type"] == "http.response.start":
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode('latin-1')
+                if b"content-encoding" in headers or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether the body is complete
+                    pending_start = message
+                return
+            if message["type"] != "http.response.body" or pending_start is None:
+                await send(message)
+                return
+            start, pending_start = pending_start, None
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+            if len(body) > self.THREAD_THRESHOLD:
+                import asyncio
+                compressed = await asyncio.to_thread(self._compress, encoding, body)
+            else:
+                compressed = self._compress(encoding, body)
+            http_cache_stats.record_compression(encoding, len(body), len(compressed))
+            headers = [(k, v) for k, v in start.get("headers", []) if k not in (b"content-length", b"vary")]
+            vary = [v for k, v in start.get("headers", []) if k == b"vary"]
+            headers += [
+                (b"content-encoding", encoding.encode('latin-1')),
+                (b"content-length", str(len(compressed)).encode('latin-1')),
+                (b"vary", b", ".join(vary + [b"Accept-Encoding"])),
+            ]
+            await send({**start, "headers": headers})
+            await send({"type": "http.response.body", "body": compressed})
+        
+        await self.app(scope, receive, send_compressed)
+
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(RequestMetricsMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+class RequestIdMiddleware:
+    """Correlation id per request: from X-Request-ID or generated, echoed in the response"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode('latin-1')[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode('latin-1'))]
+            await send(message)
+        
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+app.add_middleware(RequestIdMiddleware)
+
+async def _handle_metrics_connection(reader, writer):
+    """Minimal HTTP/1.1 responder for GET /metrics on the internal port"""
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.split()
+        path = parts[1].split(b"?")[0] if len(parts) > 1 else b"/"
+        if path == b"/metrics":
+            status_line, body = b"200 OK", metrics.render().encode('utf-8')
+        else:
+            status_line, body = b"404 Not Found", b"Not Found\n"
+        writer.write(
+            b"HTTP/1.1 " + status_line + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            b"Content-Length: " + str(len(body)).encode() + b"\r\n"
+            b"Connection: close\r\n\r\n" + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logging.warning(f"⚠️ Metrics request failed: {str(e)}")
+    finally:
+        writer.close()
+
+_metrics_server = None
+
+
+@app.on_event("startup")
+async def start_background_writers():
+    log_sink.start()
+    await presence.start()
+    metrics_sampler.start()
+    await start_metrics_server()
+    await ensure_profiling_collection()
+    await ensure_unique_indexes()
+    await ensure_date_indexes()
+    await start_date_backfill()
+    await template_catalog.start()
+    await contract_archive.start()
+
+async def start_metrics_server():
+    import asyncio
+    
+    global _metrics_server
+    if METRICS_PORT <= 0 or _metrics_server is not None:
+        return
+    try:
+        _metrics_server = await asyncio.start_server(_handle_metrics_connection, METRICS_HOST, METRICS_PORT)
+        logging.info(f"📈 Prometheus metrics on http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    except OSError as e:
+        # Another worker already owns the port
+        logging.warning(f"⚠️ Metrics port {METRICS_PORT} unavailable: {str(e)}")
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if _metrics_server is not None:
+        _metrics_server.close()
+    await metrics_sampler.stop()
+    await log_sink.stop()
+    await presence.stop()
+    await template_catalog.stop()
+    await contract_archive.stop()
+    if _date_backfill_task is not None and not _date_backfill_task.done():
+        _date_backfill_task.cancel()
+    client.close()
+    if _pdf_section_pool is not None:
+        _pdf_section_pool.shutdown(wait=False, cancel_futures=True)
+    if _log_listener is not None:
+        _log_listener.stop()
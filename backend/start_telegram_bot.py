@@ -127,8 +127,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "otp_code": new_otp_code,
                     "method": "telegram",
                     "telegram_username": username,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+                    "created_at": datetime.now(timezone.utc),
+                    "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
                     "verified": False
                 }
                 
@@ -213,8 +213,8 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     "otp_code": new_otp_code,
                     "method": "telegram",
                     "telegram_username": username,
-                    "created_at": datetime.now(timezone.utc).isoformat(),
-                    "expires_at": (datetime.now(timezone.utc) + timedelta(minutes=10)).isoformat(),
+                    "created_at": datetime.now(timezone.utc),
+                    "expires_at": datetime.now(timezone.utc) + timedelta(minutes=10),
                     "verified": False
                 }
                 
@@ -30,6 +30,9 @@ const Header = ({ showAuth = false, hideLanguageSelector = false }) => {
   const handleLogout = () => {
     localStorage.removeItem('token');
     localStorage.removeItem('user');
+    Object.keys(localStorage)
+      .filter((key) => key.startsWith('2tick_contracts_sync_'))
+      .forEach((key) => localStorage.removeItem(key));
     navigate('/login');
   };
 
@@ -201,7 +201,7 @@ const AdminPage = () => {
       // Fetch stats and users first (critical data)
       const [statsRes, usersRes] = await Promise.all([
         axios.get(`${API}/admin/stats`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/admin/users`, { headers: { Authorization: `Bearer ${token}` } })
+        axios.get(`${API}/admin/users`, { headers: { Authorization: `Bearer ${token}` }, params: { summary: true } })
       ]);
       
       setStats(statsRes.data);
@@ -255,7 +255,8 @@ const AdminPage = () => {
     setRefreshingUsers(true);
     try {
       const response = await axios.get(`${API}/admin/users`, { 
-        headers: { Authorization: `Bearer ${token}` } 
+        headers: { Authorization: `Bearer ${token}` },
+        params: { summary: true }
       });
       setUsers(response.data);
       toast.success('Список обновлён');
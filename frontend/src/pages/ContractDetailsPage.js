@@ -182,7 +182,9 @@ const ContractDetailsPage = () => {
       // Fetch template if contract was created from template
       if (response.data.template_id) {
         try {
-          const templateResponse = await axios.get(`${API}/templates/${response.data.template_id}`);
+          const templateResponse = await axios.get(`${API}/templates/${response.data.template_id}`, {
+            params: { version: response.data.template_version || undefined }
+          });
           setTemplate(templateResponse.data);
         } catch (error) {
           console.error('Failed to fetch template:', error);
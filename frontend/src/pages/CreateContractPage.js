@@ -133,7 +133,8 @@ const CreateContractPage = () => {
     const fetchNextContractNumber = async () => {
       try {
         const response = await axios.get(`${API}/contracts`, {
-          headers: { Authorization: `Bearer ${token}` }
+          headers: { Authorization: `Bearer ${token}` },
+          params: { summary: true }
         });
         const contractCount = response.data.length;
         const nextNumber = `0${contractCount + 1}`;
@@ -752,6 +753,7 @@ Email: ${templateData.tenant_email || '[Email]'}
         content_type: selectedTemplate ? selectedTemplate.content_type : (isHtmlContent ? 'html' : 'plain'),
         source_type: selectedTemplate ? 'template' : 'manual',
         template_id: selectedTemplate ? selectedTemplate.id : undefined,
+        template_version: selectedTemplate ? selectedTemplate.version : undefined,
         placeholder_values: selectedTemplate ? cleanedPlaceholderValues : undefined,
         signer_name: signerName || '',  // Пусто если Сторона А не вводила данные Стороны Б
         signer_phone: signerPhone || '',  // Пусто если Сторона А не вводила данные Стороны Б
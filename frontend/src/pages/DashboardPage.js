@@ -135,13 +135,55 @@ const DashboardPage = () => {
     loadFavoriteTemplates();
   };
 
+  // Local contract cache, kept current through /contracts/changes (only deltas are downloaded)
+  const syncCacheKey = () => {
+    const user = JSON.parse(localStorage.getItem('user') || '{}');
+    return `2tick_contracts_sync_${user.id || 'anonymous'}`;
+  };
+
+  const syncContracts = async () => {
+    const key = syncCacheKey();
+    let cache = null;
+    try {
+      cache = JSON.parse(localStorage.getItem(key) || 'null');
+    } catch (e) {
+      cache = null;
+    }
+    let byId = cache?.contracts || {};
+    let cursor = cache?.cursor;
+    let hasMore = true;
+    while (hasMore) {
+      let response;
+      try {
+        response = await axios.get(`${API}/contracts/changes`, {
+          headers: { Authorization: `Bearer ${token}` },
+          params: cursor ? { since: cursor } : {}
+        });
+      } catch (error) {
+        // Unreadable cursor - fall back to a full sync once
+        if (error.response?.status !== 400 || !cursor) throw error;
+        cursor = null;
+        continue;
+      }
+      const { changed, deleted, reset } = response.data;
+      if (reset) byId = {};
+      changed.forEach((contract) => { byId[contract.id] = contract; });
+      deleted.forEach((id) => { delete byId[id]; });
+      cursor = response.data.cursor;
+      hasMore = response.data.has_more;
+    }
+    try {
+      localStorage.setItem(key, JSON.stringify({ cursor, contracts: byId }));
+    } catch (e) {
+      // Storage full - next visit simply does a full sync
+      localStorage.removeItem(key);
+    }
+    return Object.values(byId).sort((a, b) => new Date(a.created_at) - new Date(b.created_at));
+  };
+
   const fetchContracts = async () => {
     try {
-      const response = await axios.get(`${API}/contracts`, {
-        headers: { Authorization: `Bearer ${token}` }
-      });
-      
-      const contractsList = response.data;
+      const contractsList = await syncContracts();
       setContracts(contractsList);
       
       // Подсчет статистики
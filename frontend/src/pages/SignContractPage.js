@@ -379,7 +379,9 @@ const SignContractPage = () => {
       let unfilledTenantPlaceholders = [];
       if (contractData.template_id) {
         try {
-          const templateResponse = await axios.get(`${API}/templates/${contractData.template_id}`);
+          const templateResponse = await axios.get(`${API}/templates/${contractData.template_id}`, {
+            params: { version: contractData.template_version || undefined }
+          });
           setTemplate(templateResponse.data);
           
           // Check if we have saved state - if yes, use it instead of recalculating
@@ -53,6 +53,18 @@ const TemplatesPage = () => {
     }
   };
 
+  // The list only carries summaries; load the full template (content) for the preview
+  const openPreview = async (template) => {
+    setPreviewTemplate(template);
+    setPreviewLanguage('ru');
+    try {
+      const response = await axios.get(`${API}/templates/${template.id}`);
+      setPreviewTemplate((current) => (current && current.id === template.id ? response.data : current));
+    } catch (error) {
+      toast.error(t('templates.loadError'));
+    }
+  };
+
   const fetchFavorites = async () => {
     const token = localStorage.getItem('token');
     if (!token) return;
@@ -209,10 +221,7 @@ const TemplatesPage = () => {
                 </p>
                 <div className="flex gap-2">
                   <button
-                    onClick={() => {
-                      setPreviewTemplate(template);
-                      setPreviewLanguage('ru');
-                    }}
+                    onClick={() => openPreview(template)}
                     className="flex-1 px-3 py-2 text-sm font-medium text-gray-700 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 hover:border-blue-400 transition-all flex items-center justify-center gap-1"
                   >
                     <Eye className="w-4 h-4 flex-shrink-0" />
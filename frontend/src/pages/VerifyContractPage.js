@@ -39,20 +39,17 @@ const VerifyContractPage = () => {
     const fetchContract = async () => {
       try {
         setLoading(true);
-        // Use public verify endpoint - no auth required
-        const [contractRes, signatureRes] = await Promise.all([
-          axios.get(`${API}/api/verify/${contractId}`).catch(() => null),
-          axios.get(`${API}/api/verify/${contractId}/signature`).catch(() => null)
-        ]);
+        // Use public verify endpoint - no auth required (contract + signature in one call)
+        const response = await axios.get(`${API}/api/verify/${contractId}/full`).catch(() => null);
         
-        if (contractRes?.data) {
-          setContract(contractRes.data);
+        if (response?.data?.contract) {
+          setContract(response.data.contract);
         } else {
           setError(t('verifyContract.notFound'));
         }
         
-        if (signatureRes?.data) {
-          setSignature(signatureRes.data);
+        if (response?.data?.signature) {
+          setSignature(response.data.signature);
         }
       } catch (err) {
         setError(t('verifyContract.loadError'));